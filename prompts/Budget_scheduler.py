@@ -0,0 +1,341 @@
+"""Budget- and deadline-aware scheduling of a strategy run.
+
+Instead of walking the file in order until it finishes or crashes, every
+(definition, property) cell gets a value and the most valuable cells are sent
+first: unlabelled cells, then labelled cells the pipeline doubts. Doubt is one
+minus the `<property>Confidence` column a Distilled_classifier.py output carries,
+or the cell's index in a Disagreement_requery.py cells file (--disagreement).
+A cell is dispatched only while its worst-case cost (prompt plus max_tokens, for
+the label and the justification, scaled up by the duplicate cap with --hedge)
+still fits in --budget-usd next to what is spent (hedged duplicates included)
+and reserved, and only while it can still finish before --deadline. With a
+deadline, concurrency is adjusted from the observed latency so the queue drains
+in time.
+
+A cell's label and justification are committed together (a re-query that
+fails leaves the cell as it was), and the output is rewritten atomically every
+few cells. Stopping (budget, deadline or Ctrl-C)
+therefore leaves a consistent file in the script's layout. Rerunning continues
+from it, like Strategy_runner.py --resume, and cells the report shows as
+re-queried are not doubted again.
+
+    python Budget_scheduler.py --strategy cot --input 161_FrameNet.csv --output 161_CoT_prompting.csv \\
+        --budget-usd 5 --deadline 30m --max-concurrency 32 --rpm 500 --cache response_cache.sqlite
+    python Budget_scheduler.py --strategy cot --input distilled.csv --output distilled.csv --min-doubt 0.3 \\
+        --disagreement disagreement_cells.csv --budget-usd 2
+"""
+import argparse
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import Cost_planner
+import Label_store
+import Llm_client
+import Model_router
+import Strategy_registry
+import Strategy_runner
+
+
+DEFAULT_REPORT = "budget_schedule.csv"
+
+
+def parse_duration(text):
+    """Seconds from "90", "90s", "30m" or "2h"."""
+    text = str(text).strip().lower()
+    scale = {"s": 1, "m": 60, "h": 3600}.get(text[-1:], None)
+    return float(text[:-1]) * scale if scale else float(text)
+
+
+# === Cell values ===
+def doubt_table(strategy, df, disagreement_file=None):
+    """(rows, properties) doubt in [0, 1]: low distilled confidence or high disagreement between outputs."""
+    doubt = np.zeros((len(df), len(strategy.meta_properties)))
+    for j, m in enumerate(strategy.meta_properties):
+        column = f"{m}Confidence"
+        if column in df.columns:
+            confidence = pd.to_numeric(df[column], errors="coerce").to_numpy()
+            doubt[:, j] = np.where(np.isnan(confidence), 0.0, 1.0 - confidence)
+    if disagreement_file:
+        cells = pd.read_csv(disagreement_file, keep_default_na=False)
+        event_types = df[strategy.id_column].astype(str).str.strip()
+        if "Generic_Definition" in cells.columns:
+            # Keyed like the label store, so rows sharing an EventType keep their own index.
+            index = {(Strategy_runner.definition_key(str(e).strip(), str(d).strip()), p): v for e, d, p, v
+                     in zip(cells["EventType"], cells["Generic_Definition"], cells["property"], cells["disagreement"])}
+            definitions = df[strategy.definition_column].fillna("").astype(str).str.strip()
+            keys = [Strategy_runner.definition_key(e, d) for e, d in zip(event_types, definitions)]
+        else:
+            repeated = sorted(event_types[event_types.duplicated()].unique())
+            if repeated:
+                print(f"Warning: {os.path.basename(disagreement_file)} has no Generic_Definition column; "
+                      f"rows for EventType {', '.join(repeated)} share one disagreement index")
+            index = {(str(e).strip(), p): v for e, p, v in zip(cells["EventType"], cells["property"], cells["disagreement"])}
+            keys = list(event_types)
+        for position, key in enumerate(keys):
+            for j, m in enumerate(strategy.meta_properties):
+                doubt[position, j] = max(doubt[position, j], float(index.get((key, m), 0.0)))
+    return doubt
+
+
+def previous_requeries(report_file):
+    """Report rows of doubted cells an earlier run already re-queried."""
+    if not report_file or not os.path.exists(report_file):
+        return pd.DataFrame(columns=["key", "property"])
+    report = pd.read_csv(report_file, dtype={"key": str, "property": str, "status": str, "reason": str})
+    return report[(report["status"] == "done") & (report["reason"] == "doubt")]
+
+
+def schedule_cells(strategy, df, store, doubt, min_doubt=0.5, requeried=()):
+    """Cells worth a call, most valuable first: unlabelled (doubtful ones first), then doubted labels."""
+    keys = [Strategy_runner.row_key(strategy, row) for _, row in df.iterrows()]
+    rows = []
+    for position, key in enumerate(keys):
+        for j, m in enumerate(strategy.meta_properties):
+            if not store.is_labelled(position, m):
+                rows.append({"position": position, "key": key, "property": m, "value": 1.0 + doubt[position, j],
+                             "reason": "unlabelled"})
+            elif doubt[position, j] >= min_doubt and (key, m) not in requeried:
+                rows.append({"position": position, "key": key, "property": m, "value": doubt[position, j],
+                             "reason": "doubt"})
+    cells = pd.DataFrame(rows, columns=["position", "key", "property", "value", "reason"])
+    return cells.sort_values("value", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def worst_case_cost(strategy, definition, meta_property):
+    """Dollar cost of a cell if every reply runs to max_tokens."""
+    requests = [strategy.render_label_request(definition, meta_property)]
+    if strategy.uses_justification:
+        longest = max(strategy.allowed_labels(meta_property), key=len)
+        requests.append(strategy.render_justification_request(definition, meta_property, longest))
+    cost = 0.0
+    for request in requests:
+        model = request.get("model", "gpt-4")
+        prompt = Cost_planner.count_message_tokens(request["messages"], model)
+        cost += Cost_planner.estimate_cost(model, prompt, request.get("max_tokens", 0))
+    return cost
+
+
+# === Spend ===
+class MeteredClient:
+    """Passes calls to an LlmClient and adds the cost of every billed reply (not cached or coalesced).
+
+    With --hedge the losing duplicates are billed too; their cost, recorded by the
+    client's Hedger, is part of `spent`.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.hedger = getattr(client, "hedger", None)
+        self._hedge_cost_before = self.hedger.extra_cost if self.hedger is not None else 0.0
+        self._lock = threading.Lock()
+        self._thread = threading.local()
+        self.reply_cost = 0.0
+        self.calls = 0
+        self.billed_calls = 0
+
+    @property
+    def hedge_cost(self):
+        return self.hedger.extra_cost - self._hedge_cost_before if self.hedger is not None else 0.0
+
+    @property
+    def spent(self):
+        return self.reply_cost + self.hedge_cost
+
+    def reserve_factor(self):
+        """Worst-case cost multiplier per call: up to max_rate of the calls may be sent twice."""
+        return 1.0 + (self.hedger.max_rate if self.hedger is not None else 0.0)
+
+    def thread_spent(self):
+        """Spend of the calls made on the current thread so far."""
+        return getattr(self._thread, "spent", 0.0)
+
+    def complete(self, request, labels=None, hedge_key=None):
+        response = self.client.complete(request, labels=labels, hedge_key=hedge_key)
+        billed = not response.get("cached") and not response.get("coalesced")
+        cost = Cost_planner.estimate_cost(request.get("model", "gpt-4"), response["prompt_tokens"],
+                                          response["completion_tokens"]) if billed else 0.0
+        self._thread.spent = self.thread_spent() + cost
+        with self._lock:
+            self.calls += 1
+            self.billed_calls += int(billed)
+            self.reply_cost += cost
+        return response
+
+
+class ConcurrencyController:
+    """Calls in flight allowed at once: fixed without a deadline, else sized to drain the queue in time."""
+
+    def __init__(self, maximum, minimum=1, deadline=None, headroom=1.2):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.deadline = deadline
+        self.headroom = headroom
+        self.limit = maximum if deadline is None else self.minimum
+        self.latency = None
+        self.history = [self.limit]
+
+    def observe(self, seconds):
+        """Record one cell's wall time (exponentially weighted)."""
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+
+    def update(self, remaining_cells):
+        if self.deadline is None or self.latency is None:
+            return self.limit
+        time_left = max(self.deadline - time.monotonic(), 1e-3)
+        needed = math.ceil(self.headroom * remaining_cells * self.latency / time_left)
+        limit = max(self.minimum, min(self.maximum, needed))
+        if limit != self.limit:
+            self.limit = limit
+            self.history.append(limit)
+        return self.limit
+
+    def can_finish(self):
+        """Whether a cell started now is expected to finish before the deadline."""
+        if self.deadline is None:
+            return True
+        return time.monotonic() + (self.latency or 0.0) <= self.deadline
+
+
+# === Scheduler ===
+def atomic_save(strategy, df, store, justifications, processed, output_file):
+    tmp = f"{output_file}.tmp"
+    Strategy_runner.save(strategy, df, store, justifications, processed, tmp)
+    os.replace(tmp, output_file)
+
+
+def run_scheduled(strategy, df, client, output_file, budget=None, deadline=None, max_concurrency=8,
+                  min_concurrency=1, min_doubt=0.5, disagreement_file=None, report_file=DEFAULT_REPORT, save_every=20):
+    """Label cells by value within the budget and deadline; returns the per-cell report."""
+    start = time.monotonic()
+    merged = Strategy_runner.merge_existing_labels(strategy, df, output_file)
+    print(f"Resumed {merged} cells from {output_file}")
+    store, justifications = Label_store.from_frame(strategy, df)
+    doubt = doubt_table(strategy, df, disagreement_file)
+    earlier = previous_requeries(report_file)
+    cells = schedule_cells(strategy, df, store, doubt, min_doubt, set(zip(earlier["key"], earlier["property"])))
+    positions = cells["position"].tolist()
+    properties = cells["property"].tolist()
+    status = ["not started"] * len(cells)
+    costs = [0.0] * len(cells)
+    print(f"{len(cells)} cells to schedule: {(cells['reason'] == 'unlabelled').sum()} unlabelled, "
+          f"{(cells['reason'] == 'doubt').sum()} doubted (doubt >= {min_doubt})")
+
+    metered = MeteredClient(client)
+    controller = ConcurrencyController(max_concurrency, min_concurrency,
+                                       start + deadline if deadline is not None else None)
+    processed = np.zeros(len(df), dtype=bool)
+    lock = threading.Condition()
+    state = {"active": 0, "reserved": 0.0, "completed": 0, "stop": None}
+    definitions = df[strategy.definition_column].tolist()
+
+    def work(n, estimate):
+        position, m = positions[n], properties[n]
+        began = time.monotonic()
+        spent_before = metered.thread_spent()
+        try:
+            label = Strategy_runner.query_label(strategy, metered, definitions[position], m)
+            justification = None
+            if strategy.uses_justification:
+                justification = Strategy_runner.query_justification(strategy, metered, definitions[position], m,
+                                                                    label)
+            with lock:
+                # Label and justification land together, so every save holds whole cells. A failed
+                # re-query of a doubted cell keeps the label it had; only empty cells record "error".
+                if label != "error" or not store.is_labelled(position, m):
+                    store.set(position, m, label)
+                    if justification is not None:
+                        justifications.set(position, m, justification)
+                processed[position] = True
+                status[n] = "done" if label != "error" else "error"
+                controller.observe(time.monotonic() - began)
+                state["completed"] += 1
+                if state["completed"] % save_every == 0:
+                    atomic_save(strategy, df, store, justifications, processed, output_file)
+        finally:
+            with lock:
+                costs[n] = metered.thread_spent() - spent_before
+                state["active"] -= 1
+                state["reserved"] -= estimate
+                lock.notify_all()
+
+    pool = ThreadPoolExecutor(max_workers=max_concurrency)
+    try:
+        for n in range(len(cells)):
+            estimate = worst_case_cost(strategy, definitions[positions[n]], properties[n]) * metered.reserve_factor()
+            with lock:
+                while state["active"] >= controller.update(len(cells) - n + state["active"]):
+                    lock.wait(0.5)
+                if budget is not None and metered.spent + state["reserved"] + estimate > budget:
+                    state["stop"] = "budget"
+                elif not controller.can_finish():
+                    state["stop"] = "deadline"
+                if state["stop"]:
+                    break
+                state["active"] += 1
+                state["reserved"] += estimate
+                status[n] = "in flight"
+            pool.submit(work, n, estimate)
+    except KeyboardInterrupt:
+        state["stop"] = "interrupted"
+        print("Interrupted; waiting for calls in flight")
+    finally:
+        pool.shutdown(wait=True)
+        with lock:
+            atomic_save(strategy, df, store, justifications, processed, output_file)
+
+    cells["status"] = status
+    cells["cost_usd"] = costs
+    skipped = cells["status"] == "not started"
+    if state["stop"]:
+        cells.loc[skipped, "status"] = f"skipped ({state['stop']})"
+    elapsed = time.monotonic() - start
+    done = cells["status"].isin(["done", "error"]).sum()
+    print(f"{done}/{len(cells)} cells in {Cost_planner.format_duration(elapsed)}, ${metered.spent:.4f} spent "
+          f"({metered.billed_calls} billed of {metered.calls} calls"
+          + (f", ${metered.hedge_cost:.4f} on {metered.hedger.hedges} hedged duplicates" if metered.hedger else "")
+          + ")"
+          + (f" of ${budget:.2f}" if budget is not None else "")
+          + (f"; stopped: {state['stop']}, {int(skipped.sum())} cells left" if state["stop"] else ""))
+    if deadline is not None:
+        history = controller.history
+        print(f"Concurrency {history[0]} -> {history[-1]} (range {min(history)}-{max(history)}, "
+              f"{len(history) - 1} changes), latency per cell {controller.latency or 0:.2f}s")
+    if report_file:
+        # Earlier re-queries stay in the report so the next run does not doubt them again.
+        report = pd.concat([earlier, cells], ignore_index=True) if len(earlier) else cells
+        report.to_csv(report_file, index=False)
+    return cells
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Label the most valuable cells first within a dollar and time budget.")
+    Strategy_runner.add_run_arguments(parser)
+    parser.add_argument("--budget-usd", type=float, help="maximum spend for this run (worst-case reserved per call)")
+    parser.add_argument("--deadline", type=parse_duration, help="wall-clock limit, e.g. 900, 15m or 2h")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--min-concurrency", type=int, default=1)
+    parser.add_argument("--min-doubt", type=float, default=0.5,
+                        help="re-query labelled cells whose doubt (1 - confidence, or disagreement) reaches this")
+    parser.add_argument("--disagreement", help="cells file written by Disagreement_requery.py")
+    parser.add_argument("--save-every", type=int, default=20, help="rewrite the output after this many cells")
+    parser.add_argument("--report", default=DEFAULT_REPORT, help="per-cell order, status and cost")
+    Model_router.add_arguments(parser)
+    args = parser.parse_args()
+
+    strategy = Model_router.route_from_args(args, Strategy_registry.load_strategy(args.strategy))
+    df = strategy.load_definitions(args.input)
+    client = Llm_client.client_from_args(args)
+    run_scheduled(strategy, df, client, args.output or strategy.output_file, args.budget_usd, args.deadline,
+                  args.max_concurrency, args.min_concurrency, args.min_doubt, args.disagreement, args.report,
+                  args.save_every)
+    print(f"Schedule report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
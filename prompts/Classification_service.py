@@ -0,0 +1,360 @@
+"""Local HTTP classification service with dynamic micro-batching.
+
+Keeps the strategies' templates, the response cache and the backend loaded, and
+answers meta-property queries on demand:
+
+    POST /classify   {"definition": "...", "strategy": "cot", "properties": ["Cumulativity"]}
+                     -> {"labels": {"Cumulativity": "cumulative", ...}, "latency_ms": 412.0}
+    GET  /stats      per-request latency percentiles, calls, batch sizes, fallbacks
+    GET  /health
+
+Questions arriving within --batch-window-ms of each other are packed into one
+chat call: questions for the same property share their instructions and list
+only the definitions; the rest are listed in full. The model answers with a
+JSON object. Any question whose answer is missing or not a valid label is
+re-sent on its own, exactly as the strategy script would send it.
+
+    python Classification_service.py --strategy cot --port 8765 --cache response_cache.sqlite
+    curl -s localhost:8765/classify -d '{"definition": "An event where an Agent ..."}'
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import Llm_client
+import Strategy_registry
+
+
+QUESTION_HEADER = "### Question"
+_json_object = re.compile(r"\{.*\}", re.DOTALL)
+
+
+# === Batched prompts ===
+def _common_affixes(texts):
+    """Longest shared prefix and suffix of texts, cut back to line boundaries."""
+    prefix = os.path.commonprefix(texts)
+    prefix = prefix[:prefix.rfind("\n") + 1]
+    rest = [t[len(prefix):] for t in texts]
+    suffix = os.path.commonprefix([t[::-1] for t in rest])[::-1]
+    suffix = suffix[suffix.find("\n"):] if "\n" in suffix else ""
+    return prefix, suffix
+
+
+def batch_request(requests):
+    """Pack single-question requests (same model and system message) into one request."""
+    contents = [r["messages"][-1]["content"] for r in requests]
+    prefix, suffix = _common_affixes(contents)
+    shared = len(prefix) + len(suffix)
+    lines = [f"Answer the {len(requests)} independent questions below. Treat each one on its own."]
+    if len(requests) > 1 and shared > 0.5 * min(len(c) for c in contents):
+        lines.append("Every question uses these instructions, with the text under its header in place of "
+                     "<QUESTION TEXT>:\n")
+        lines.append(f"{prefix}<QUESTION TEXT>{suffix}\n")
+        for k, content in enumerate(contents, 1):
+            lines.append(f"{QUESTION_HEADER} {k}\n{content[len(prefix):len(content) - len(suffix)].strip()}\n")
+    else:
+        for k, content in enumerate(contents, 1):
+            lines.append(f"{QUESTION_HEADER} {k}\n{content.strip()}\n")
+    keys = ", ".join(f'"{k}": "<answer>"' for k in range(1, len(requests) + 1))
+    lines.append(f"Reply with only a JSON object mapping each question number to its answer: {{{keys}}}")
+
+    first = requests[0]
+    batched = {k: v for k, v in first.items() if k != "messages"}
+    batched["messages"] = first["messages"][:-1] + [{"role": "user", "content": "\n".join(lines)}]
+    batched["max_tokens"] = sum(r.get("max_tokens", 20) for r in requests) + 8 * len(requests) + 16
+    return batched
+
+
+def parse_batch_reply(content, count):
+    """Answers by question number (1-based); missing or unreadable ones are None."""
+    answers = [None] * count
+    match = _json_object.search(content or "")
+    if not match:
+        return answers
+    try:
+        parsed = json.loads(match.group(0))
+    except ValueError:
+        return answers
+    if not isinstance(parsed, dict):
+        return answers
+    for key, value in parsed.items():
+        if str(key).strip().isdigit() and 1 <= int(key) <= count and isinstance(value, str):
+            answers[int(key) - 1] = value
+    return answers
+
+
+# === Micro-batching ===
+class Question:
+    def __init__(self, strategy, definition, meta_property):
+        self.strategy = strategy
+        self.definition = definition
+        self.meta_property = meta_property
+        self.request = strategy.render_label_request(definition, meta_property)
+        self.key = Llm_client.request_key(self.request)
+        self.future = Future()
+
+    @property
+    def group(self):
+        """Questions can share a call only when model, decoding parameters and system message match."""
+        params = {k: v for k, v in self.request.items() if k not in ("messages", "max_tokens")}
+        return json.dumps([params, self.request["messages"][:-1]], sort_keys=True)
+
+
+class MicroBatcher:
+    def __init__(self, client, window=0.02, max_batch=8, concurrency=8, memo_size=100000):
+        self.client = client
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+        self.stats = {"questions": 0, "memo_hits": 0, "calls": 0, "batched_calls": 0, "batched_questions": 0,
+                      "fallbacks": 0, "errors": 0}
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def submit(self, strategy, definition, meta_property):
+        question = Question(strategy, definition, meta_property)
+        self._count("questions")
+        with self._lock:
+            if question.key in self._memo:
+                self._memo.move_to_end(question.key)
+                self.stats["memo_hits"] += 1
+                question.future.set_result(self._memo[question.key])
+                return question.future
+        self._pending.put(question)
+        return question.future
+
+    def _remember(self, question, label):
+        with self._lock:
+            self._memo[question.key] = label
+            if len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        question.future.set_result(label)
+
+    def _collect(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            for call in self._plan(batch):
+                self._pool.submit(self._send, call)
+
+    def _plan(self, batch):
+        """Split collected questions into calls: same-property questions first, then per definition."""
+        calls = []
+        groups = {}
+        for question in batch:
+            groups.setdefault(question.group, []).append(question)
+        for questions in groups.values():
+            by_property = {}
+            for question in questions:
+                by_property.setdefault(question.meta_property, []).append(question)
+            leftovers = []
+            for same in by_property.values():
+                if len(same) > 1:
+                    calls += [same[k:k + self.max_batch] for k in range(0, len(same), self.max_batch)]
+                else:
+                    leftovers += same
+            calls += [leftovers[k:k + self.max_batch] for k in range(0, len(leftovers), self.max_batch)]
+        return calls
+
+    def _send(self, questions):
+        try:
+            if len(questions) == 1:
+                self._answer_single(questions[0])
+                return
+            self._count("batched_calls")
+            self._count("batched_questions", len(questions))
+            self._count("calls")
+            try:
+                response = self.client.complete(batch_request([q.request for q in questions]))
+                answers = parse_batch_reply(response["content"], len(questions))
+            except Exception as e:
+                print(f"[Batch] Error for {len(questions)} questions: {e}")
+                answers = [None] * len(questions)
+            for question, answer in zip(questions, answers):
+                label = question.strategy.parse_label(answer) if answer is not None else None
+                if label in question.strategy.allowed_labels(question.meta_property):
+                    self._remember(question, label)
+                else:
+                    self._count("fallbacks")
+                    self._answer_single(question)
+        except Exception as e:
+            for question in questions:
+                if not question.future.done():
+                    question.future.set_exception(e)
+
+    def _answer_single(self, question):
+        self._count("calls")
+        try:
+            response = self.client.complete(question.request)
+        except Exception as e:
+            # Same outcome as the scripts: the cell is labelled "error" (and is not memoised).
+            print(f"[Label:{question.meta_property}] Error for definition: {e}")
+            self._count("errors")
+            question.future.set_result("error")
+            return
+        self._remember(question, question.strategy.parse_label(response["content"]))
+
+
+# === Latency ===
+class LatencyStats:
+    def __init__(self, window=10000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.requests += 1
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self._latencies, dtype=float) * 1000
+        if len(latencies) == 0:
+            return {"requests": self.requests}
+        p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+        return {"requests": self.requests, "window": len(latencies), "mean_ms": latencies.mean(),
+                "p50_ms": p50, "p90_ms": p90, "p95_ms": p95, "p99_ms": p99, "max_ms": latencies.max()}
+
+
+# === HTTP ===
+class ClassificationService:
+    def __init__(self, batcher, default_strategy="cot"):
+        self.batcher = batcher
+        self.default_strategy = default_strategy
+        self.latency = LatencyStats()
+        Strategy_registry.load_strategy(default_strategy)
+
+    def classify(self, payload):
+        start = time.perf_counter()
+        if not isinstance(payload, dict):
+            raise ValueError("the request body must be a JSON object")
+        definition = payload.get("definition")
+        if not isinstance(definition, str) or not definition.strip():
+            raise ValueError("'definition' must be a non-empty string")
+        name = payload.get("strategy")
+        if name is None:
+            strategy = Strategy_registry.load_strategy(self.default_strategy)
+        elif isinstance(name, str) and name.lower() in Strategy_registry.STRATEGY_SCRIPTS:
+            # Only registered names: load_strategy also runs script paths, which a client must not choose.
+            strategy = Strategy_registry.load_strategy(name)
+        else:
+            raise ValueError(f"'strategy' must be one of {', '.join(Strategy_registry.strategy_names())}")
+        properties = payload.get("properties") or strategy.meta_properties
+        if not isinstance(properties, list) or not all(isinstance(m, str) for m in properties):
+            raise ValueError("'properties' must be a list of property names")
+        unknown = [m for m in properties if m not in strategy.meta_properties]
+        if unknown:
+            raise ValueError(f"Unknown properties: {', '.join(unknown)}")
+        futures = {m: self.batcher.submit(strategy, definition, m) for m in properties}
+        labels = {m: future.result() for m, future in futures.items()}
+        elapsed = time.perf_counter() - start
+        self.latency.record(elapsed)
+        return {"strategy": strategy.name, "labels": labels, "latency_ms": round(elapsed * 1000, 1)}
+
+    def stats(self):
+        stats = dict(self.latency.summary(), **self.batcher.stats)
+        stats["questions_per_call"] = (stats["questions"] - stats["memo_hits"]) / max(stats["calls"], 1)
+        cache = self.batcher.client.cache
+        if cache is not None:
+            stats.update(cache_hits=cache.hits, cache_misses=cache.misses)
+        single_flight = self.batcher.client.single_flight
+        if single_flight is not None:
+            stats.update(coalesced=single_flight.hits)
+        key_pool = self.batcher.client.key_pool
+        if key_pool is not None:
+            stats["keys"] = key_pool.utilisation().to_dict(orient="records")
+        hedger = self.batcher.client.hedger
+        if hedger is not None:
+            stats.update(hedger.stats())
+        return stats
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body, default=float).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._reply(200, service.stats())
+            elif self.path == "/health":
+                self._reply(200, {"status": "ok"})
+            else:
+                self._reply(404, {"error": f"no route {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/classify":
+                self._reply(404, {"error": f"no route {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                self._reply(200, service.classify(payload))
+            except (ValueError, KeyError) as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve meta-property classification over HTTP with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--strategy", default="cot", help="strategy used when a request names none")
+    parser.add_argument("--batch-window-ms", type=float, default=20.0,
+                        help="how long to wait for more questions before sending a call")
+    parser.add_argument("--max-batch", type=int, default=8, help="most questions packed into one call (1 disables)")
+    parser.add_argument("--concurrency", type=int, default=8, help="calls in flight at once")
+    Llm_client.add_client_arguments(parser)
+    args = parser.parse_args()
+
+    batcher = MicroBatcher(Llm_client.client_from_args(args), args.batch_window_ms / 1000.0, args.max_batch,
+                           args.concurrency)
+    service = ClassificationService(batcher, args.strategy)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Serving {args.strategy} on http://{args.host}:{args.port} (POST /classify, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
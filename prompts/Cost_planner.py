@@ -0,0 +1,259 @@
+"""Dry-run planner: size a prompting run before launching it.
+
+Renders the real prompts of a strategy over a dataset, tokenizes them locally
+and estimates request count, tokens, dollar cost and wall time for both the
+interactive API and the Batch API. No API call is made.
+
+    python Cost_planner.py --strategy selfgenerated --input MAVEN_Generic_Defintion_DataSet.csv
+    python Cost_planner.py --strategy all --rpm 500 --tpm 30000 --concurrency 8
+"""
+import argparse
+import json
+import random
+import re
+
+import Strategy_registry
+
+
+# === Prices in USD per 1K tokens (input, output) ===
+MODEL_PRICING = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+BATCH_DISCOUNT = 0.5
+
+# === Default rate limits (requests/min, tokens/min) ===
+MODEL_LIMITS = {
+    "gpt-4": (500, 10000),
+    "gpt-4-32k": (500, 10000),
+    "gpt-4-turbo": (500, 30000),
+    "gpt-4o": (500, 30000),
+    "gpt-4o-mini": (500, 200000),
+    "gpt-3.5-turbo": (3500, 200000),
+}
+
+# === Latency model: seconds = base + per_token * output tokens ===
+MODEL_LATENCY = {
+    "gpt-4": (0.8, 0.05),
+    "gpt-4-32k": (0.8, 0.05),
+    "gpt-4-turbo": (0.6, 0.025),
+    "gpt-4o": (0.4, 0.012),
+    "gpt-4o-mini": (0.3, 0.008),
+    "gpt-3.5-turbo": (0.3, 0.01),
+}
+
+# The scripts call time.sleep(1) after every property of every row.
+SCRIPT_SLEEP_SECONDS = 1.0
+
+
+# === Local tokenization ===
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encodings = {}
+_approx_pattern = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text, model="gpt-4"):
+    """Token count with tiktoken when installed, otherwise a word-piece approximation."""
+    if tiktoken is not None:
+        if model not in _encodings:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+        return len(_encodings[model].encode(text))
+    return sum(1 + len(piece) // 8 for piece in _approx_pattern.findall(text))
+
+
+def count_message_tokens(messages, model="gpt-4"):
+    # Chat format overhead: 3 tokens per message plus 3 to prime the reply.
+    return 3 + sum(3 + count_tokens(m["role"], model) + count_tokens(m["content"], model) for m in messages)
+
+
+def tokenizer_name():
+    return "tiktoken" if tiktoken is not None else "approximate (install tiktoken for exact counts)"
+
+
+# === Cost and time ===
+def model_pricing(model):
+    if model in MODEL_PRICING:
+        return MODEL_PRICING[model]
+    # Dated snapshots such as gpt-4-0613 share the base model's price.
+    for name in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICING[name]
+    raise KeyError(f"No pricing for model '{model}'. Known: {', '.join(MODEL_PRICING)}")
+
+
+def estimate_cost(model, input_tokens, output_tokens, batch=False):
+    input_price, output_price = model_pricing(model)
+    cost = input_tokens / 1000 * input_price + output_tokens / 1000 * output_price
+    return cost * (BATCH_DISCOUNT if batch else 1.0)
+
+
+def estimate_latency(model, output_tokens):
+    base, per_token = MODEL_LATENCY.get(model, MODEL_LATENCY["gpt-4"])
+    return base + per_token * output_tokens
+
+
+def estimate_wall_time(requests, tokens_per_request, latency, concurrency, rpm, tpm):
+    """Seconds to drain `requests` when bound by concurrency, RPM or TPM, whichever is tightest."""
+    if requests == 0:
+        return 0.0
+    throughput = min(concurrency / latency, rpm / 60.0, tpm / 60.0 / max(tokens_per_request, 1))
+    return requests / throughput
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}min"
+    return f"{seconds / 3600:.1f}h"
+
+
+# === Planning ===
+def plan_strategy(strategy, df, model=None, rpm=None, tpm=None, concurrency=1, latency=None,
+                  sample=None, batch_threshold_hours=1.0, seed=0):
+    params = strategy.params
+    model = model or params["model"]
+    default_rpm, default_tpm = MODEL_LIMITS.get(model, MODEL_LIMITS["gpt-4"])
+    rpm = rpm or default_rpm
+    tpm = tpm or default_tpm
+
+    definitions = df[strategy.definition_column].astype(str).tolist()
+    n_rows = len(definitions)
+    if sample and sample < n_rows:
+        definitions = random.Random(seed).sample(definitions, sample)
+    scale = n_rows / max(len(definitions), 1)
+
+    calls = ["label"]
+    if strategy.uses_justification:
+        calls.append("justification")
+
+    totals = {"requests": 0, "input_tokens": 0, "output_tokens_low": 0, "output_tokens_high": 0}
+    per_request_latency = []
+    for kind in calls:
+        for meta_property in strategy.meta_properties:
+            labels = strategy.allowed_labels(meta_property)
+            longest_label = max(labels, key=len)
+            if kind == "label":
+                render = lambda definition: strategy.render_label_request(definition, meta_property)
+            else:
+                render = lambda definition: strategy.render_justification_request(definition, meta_property,
+                                                                                  longest_label)
+            input_tokens = sum(count_message_tokens(render(definition)["messages"], model) for definition in definitions)
+            # Taken from a rendered request rather than the last row, so an empty dataset gives a zero plan.
+            max_tokens = render("")["max_tokens"]
+            if kind == "label":
+                low = min(max_tokens, min(count_tokens(label, model) for label in labels))
+            else:
+                low = min(max_tokens, 30)
+            totals["requests"] += n_rows
+            totals["input_tokens"] += input_tokens * scale
+            totals["output_tokens_low"] += low * n_rows
+            totals["output_tokens_high"] += max_tokens * n_rows
+            per_request_latency.append((n_rows, estimate_latency(model, max_tokens)))
+
+    requests = totals["requests"]
+    input_tokens = int(round(totals["input_tokens"]))
+    output_low = totals["output_tokens_low"]
+    output_high = totals["output_tokens_high"]
+    mean_latency = sum(n * l for n, l in per_request_latency) / max(requests, 1)
+    if latency is not None:
+        mean_latency = latency
+    # OpenAI counts max_tokens against the TPM limit, so use the upper bound.
+    tokens_per_request = (input_tokens + output_high) / max(requests, 1)
+
+    interactive_seconds = estimate_wall_time(requests, tokens_per_request, mean_latency, concurrency, rpm, tpm)
+    script_seconds = n_rows * len(strategy.meta_properties) * (len(calls) * mean_latency + SCRIPT_SLEEP_SECONDS)
+    interactive_cost = (estimate_cost(model, input_tokens, output_low), estimate_cost(model, input_tokens, output_high))
+    batch_cost = (estimate_cost(model, input_tokens, output_low, batch=True),
+                  estimate_cost(model, input_tokens, output_high, batch=True))
+    recommendation = "batch" if interactive_seconds > batch_threshold_hours * 3600 else "interactive"
+
+    return {
+        "strategy": strategy.name,
+        "model": model,
+        "definitions": n_rows,
+        "tokenized_definitions": len(definitions),
+        "requests": requests,
+        "input_tokens": input_tokens,
+        "output_tokens": [output_low, output_high],
+        "cost_usd": [round(c, 4) for c in interactive_cost],
+        "batch_cost_usd": [round(c, 4) for c in batch_cost],
+        "rpm": rpm,
+        "tpm": tpm,
+        "concurrency": concurrency,
+        "mean_latency_s": round(mean_latency, 3),
+        "wall_time_s": round(interactive_seconds, 1),
+        "script_wall_time_s": round(script_seconds, 1),
+        "recommendation": recommendation,
+    }
+
+
+def print_plan(plan):
+    low, high = plan["cost_usd"]
+    batch_low, batch_high = plan["batch_cost_usd"]
+    print(f"=== {plan['strategy']} ({plan['model']}) ===")
+    print(f"  definitions:        {plan['definitions']}"
+          + (f" (tokenized sample of {plan['tokenized_definitions']})"
+             if plan["tokenized_definitions"] != plan["definitions"] else ""))
+    print(f"  requests:           {plan['requests']}")
+    print(f"  input tokens:       {plan['input_tokens']}")
+    print(f"  output tokens:      {plan['output_tokens'][0]} - {plan['output_tokens'][1]}")
+    print(f"  cost (interactive): ${low:.2f} - ${high:.2f}")
+    print(f"  cost (batch API):   ${batch_low:.2f} - ${batch_high:.2f}")
+    print(f"  wall time:          {format_duration(plan['wall_time_s'])} at concurrency {plan['concurrency']}, "
+          f"{plan['rpm']} RPM, {plan['tpm']} TPM")
+    print(f"  script wall time:   {format_duration(plan['script_wall_time_s'])} (serial loop with sleep(1))")
+    print(f"  recommendation:     {plan['recommendation']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate cost and wall time of a prompting run without calling any API.")
+    parser.add_argument("--strategy", action="append", required=True,
+                        help=f"strategy name or script path, repeatable, or 'all' ({', '.join(Strategy_registry.strategy_names())})")
+    parser.add_argument("--input", help="dataset CSV (defaults to the file the strategy script reads)")
+    parser.add_argument("--model", help="override the script's model")
+    parser.add_argument("--rpm", type=int, help="requests per minute limit")
+    parser.add_argument("--tpm", type=int, help="tokens per minute limit")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency", type=float, help="mean seconds per request (default: per-model estimate)")
+    parser.add_argument("--sample", type=int, help="tokenize only this many definitions and extrapolate")
+    parser.add_argument("--batch-threshold-hours", type=float, default=1.0,
+                        help="recommend the Batch API when the interactive run would take longer than this")
+    parser.add_argument("--json", help="also write the plans to this JSON file")
+    args = parser.parse_args()
+
+    names = Strategy_registry.strategy_names() if "all" in args.strategy else args.strategy
+    print(f"Tokenizer: {tokenizer_name()}")
+    plans = []
+    for name in names:
+        strategy = Strategy_registry.load_strategy(name)
+        try:
+            df = strategy.load_definitions(args.input)
+        except FileNotFoundError as e:
+            print(f"[{name}] Skipped, input not found: {e.filename}")
+            continue
+        plan = plan_strategy(strategy, df, model=args.model, rpm=args.rpm, tpm=args.tpm,
+                             concurrency=args.concurrency, latency=args.latency, sample=args.sample,
+                             batch_threshold_hours=args.batch_threshold_hours)
+        print_plan(plan)
+        plans.append(plan)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(plans, f, indent=2)
+        print(f"Plans saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
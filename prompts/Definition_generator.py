@@ -0,0 +1,313 @@
+"""Generate Generic_Definition text in bulk from FrameNet frame definitions.
+
+The prompting scripts read only `Generic_Definition`, which for the 161 event
+types was written by hand from the frames' FrameNet definitions. This stage
+writes it with the model instead. Frames come either from a dataset in the
+Human_annotated_dataset.csv layout (EventType, Corresponding Frame(s),
+FrameNetDefinitions) or straight from FrameNet's frame/ directory, one event
+type per frame. Event types with the same frames share one request, and every
+frame's text is parsed once. Requests run concurrently through Llm_client's
+cache and rate limiter. Hand-written definitions serve as few-shot examples,
+never for their own frames.
+
+The output keeps the four input columns plus Generic_Definition and is written
+in ISO-8859-1, as the scripts read it, so it can be passed straight to
+Strategy_runner.py --input. Groups already defined in an existing output are
+not asked again, so an interrupted run resumes. Frames the model judges not to
+describe an event go to --skipped.
+
+    python Definition_generator.py --framenet-dir fndata-1.7/frame --exclude Human_annotated_dataset.csv \\
+        --output FrameNet_generated.csv --concurrency 16 --rpm 500 --cache response_cache.sqlite
+    python Definition_generator.py --input Human_annotated_dataset.csv --output 161_generated.csv --backend mock
+    python Strategy_runner.py --strategy cot --input FrameNet_generated.csv --output FrameNet_generated_cot.csv
+"""
+import argparse
+import glob
+import html
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import Frame_propagation
+import Hierarchy_verifier
+import Llm_client
+import Strategy_registry
+
+
+DEFAULT_EXAMPLES = "Human_annotated_dataset.csv"
+FRAMES_COLUMN = Frame_propagation.FRAMES_COLUMN
+SOURCE_COLUMN = "FrameNetDefinitions"
+NOT_AN_EVENT = "NOT_AN_EVENT"
+SYSTEM_MESSAGE = "You are an ontology expert writing generic definitions of event types from FrameNet frames."
+
+_frame_header = re.compile(r"\[([^\]]+)\]")
+_tag = re.compile(r"<[^>]+>")
+_example = re.compile(r"<ex>(.*?)</ex>", re.DOTALL)
+# The scripts read ISO-8859-1; typographic characters outside it are written as their ASCII forms.
+_latin1 = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-",
+                         "…": "..."})
+
+
+# === Frame sources ===
+def event_type_name(frame):
+    """EventType for a frame of its own: Activity_ready_state -> ActivityReadyState."""
+    return "".join(part[:1].upper() + part[1:] for part in re.split(r"[\s_-]+", frame.strip()) if part)
+
+
+def framenet_text(raw):
+    """Plain text of a FrameNet <definition>: markup dropped, example sentences quoted."""
+    text = html.unescape(raw or "")
+    text = _example.sub(lambda m: f" '{_tag.sub('', m.group(1)).strip()}' ", text)
+    return re.sub(r"\s+", " ", _tag.sub("", text)).strip()
+
+
+def read_framenet_dir(path):
+    """One row per frame file in FrameNet's frame/ directory."""
+    rows = []
+    for filename in sorted(glob.glob(os.path.join(path, "*.xml"))):
+        root = ET.parse(filename).getroot()
+        name = root.get("name")
+        definition = next((e.text for e in root if e.tag.endswith("definition")), "")
+        if name:
+            rows.append({"EventType": event_type_name(name), FRAMES_COLUMN: name.replace("_", " "),
+                         SOURCE_COLUMN: f"[{name}] {framenet_text(definition)}"})
+    return pd.DataFrame(rows, columns=["EventType", FRAMES_COLUMN, SOURCE_COLUMN])
+
+
+def read_dataset(path):
+    df = pd.read_csv(Strategy_registry.resolve_data_path(path), encoding="ISO-8859-1", dtype=str).fillna("")
+    missing = [c for c in (FRAMES_COLUMN, SOURCE_COLUMN) if c not in df.columns]
+    if missing:
+        raise KeyError(f"{path} lacks {', '.join(missing)}")
+    if "EventType" not in df.columns:
+        df.insert(0, "EventType", [event_type_name(Frame_propagation.split_frames(v)[0]) for v in df[FRAMES_COLUMN]])
+    return df
+
+
+def split_definitions(text, frames):
+    """frame -> its definition, from a FrameNetDefinitions cell holding one "[Frame] ..." part per frame."""
+    parts = _frame_header.split(text or "")
+    found = {}
+    for name, body in zip(parts[1::2], parts[2::2]):
+        found.setdefault(Hierarchy_verifier.normalize_frame(name), f"[{name}] {body.strip()}")
+    if not found and len(frames) == 1 and (text or "").strip():
+        found[frames[0]] = text.strip()
+    return found
+
+
+# === Groups ===
+def frame_groups(df):
+    """Distinct frame sets in df: {group: row positions}, plus the text of every frame (and frame set) seen."""
+    groups = {}
+    texts = {}
+    for position, (frames_value, source) in enumerate(zip(df[FRAMES_COLUMN], df[SOURCE_COLUMN])):
+        frames = Frame_propagation.split_frames(frames_value)
+        if not frames:
+            continue
+        for frame, text in split_definitions(source, frames).items():
+            texts.setdefault(frame, text)
+        # The whole cell, for frame sets whose headers do not match their frame names.
+        texts.setdefault(tuple(sorted(set(frames))), (source or "").strip())
+        groups.setdefault(tuple(sorted(set(frames))), []).append(position)
+    return groups, texts
+
+
+def covered_frames(paths):
+    frames = set()
+    for path in paths:
+        df = pd.read_csv(Strategy_registry.resolve_data_path(path), encoding="ISO-8859-1", dtype=str)
+        for value in df.get(FRAMES_COLUMN, pd.Series(dtype=str)).fillna(""):
+            frames.update(Frame_propagation.split_frames(value))
+    return frames
+
+
+def existing_definitions(path):
+    """group -> definition from an earlier output, so a rerun only asks for what is missing."""
+    if not path or not os.path.exists(path):
+        return {}
+    df = pd.read_csv(path, encoding="ISO-8859-1", dtype=str).fillna("")
+    done = {}
+    for frames_value, definition in zip(df.get(FRAMES_COLUMN, []), df.get("Generic_Definition", [])):
+        frames = Frame_propagation.split_frames(frames_value)
+        if frames and definition.strip():
+            done[tuple(sorted(set(frames)))] = definition
+    return done
+
+
+def skipped_groups(path):
+    """Frame sets an earlier run judged not to be events."""
+    if not path or not os.path.exists(path):
+        return []
+    df = pd.read_csv(path, encoding="ISO-8859-1", dtype=str).fillna("")
+    return [tuple(sorted(set(Frame_propagation.split_frames(v)))) for v in df.get(FRAMES_COLUMN, [])]
+
+
+# === Prompts ===
+def load_examples(path, count):
+    """(frame set, frame text, hand-written definition) triples spread evenly over the example file."""
+    if not path or count <= 0:
+        return []
+    df = read_dataset(path)
+    df = df[df["Generic_Definition"].str.strip() != ""]
+    step = max(len(df) // (2 * count), 1)
+    examples = []
+    for _, row in df.iloc[::step].iterrows():
+        frames = Frame_propagation.split_frames(row[FRAMES_COLUMN])
+        source = " ".join(split_definitions(row[SOURCE_COLUMN], frames).values()) or row[SOURCE_COLUMN]
+        examples.append((set(frames), source, row["Generic_Definition"].strip()))
+    return examples
+
+
+def shorten(text, limit=300):
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " ..."
+
+
+def render_request(group, texts, examples, count=3, model="gpt-4", temperature=0.2, max_tokens=120):
+    """Chat request for one frame set; examples about any of its frames are left out."""
+    chosen = [e for e in examples if not e[0] & set(group)][:count]
+    lines = ["Write one generic definition of the event type described by the FrameNet frame definition(s) below.",
+             "Start with \"An event where\" (or \"An event in which\"), name the frame elements that take part "
+             "(Agent, Theme, Goal, ...) with capitals, keep it to one sentence, and leave out example sentences "
+             "and lexical units.",
+             f"If the frames do not describe an event (only an entity, a property or a relation), reply with "
+             f"{NOT_AN_EVENT}.", ""]
+    for frames, source, definition in chosen:
+        lines += [f"Frame definition(s): {shorten(source)}", f"Generic definition: {definition}", ""]
+    if all(frame in texts for frame in group):
+        frame_text = " ".join(texts[frame] for frame in group)
+    else:
+        frame_text = texts.get(tuple(group)) or ", ".join(group)
+    lines += [f"Frame definition(s): {frame_text}", "Generic definition:"]
+    return {
+        "model": model,
+        "messages": [{"role": "system", "content": SYSTEM_MESSAGE}, {"role": "user", "content": "\n".join(lines)}],
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+
+
+def parse_definition(content):
+    """The definition sentence of a reply, None for NOT_AN_EVENT, "" for an empty reply."""
+    text = (content or "").strip()
+    if NOT_AN_EVENT in text:
+        return None
+    text = next((line.strip() for line in text.splitlines() if line.strip()), "")
+    text = re.sub(r"^(generic definition|definition)\s*:\s*", "", text, flags=re.IGNORECASE)
+    return text.strip().strip("\"'").strip()
+
+
+# === Generation ===
+def generate(groups, texts, client, examples, concurrency=8, on_result=None, **request_options):
+    """Ask for every group concurrently; returns {group: definition, None (not an event) or "" (failed)}."""
+    results = {}
+    lock = threading.Lock()
+
+    def work(group):
+        try:
+            response = client.complete(render_request(group, texts, examples, **request_options))
+            return group, parse_definition(response["content"])
+        except Exception as e:
+            print(f"[Definition] Error for {', '.join(group)}: {e}")
+            return group, ""
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in as_completed([pool.submit(work, group) for group in groups]):
+            group, definition = future.result()
+            with lock:
+                results[group] = definition
+                if on_result is not None:
+                    on_result(results)
+    return results
+
+
+def build_dataset(df, groups, definitions):
+    """df's rows with Generic_Definition filled per group; rows of non-event groups are split off."""
+    out = df.copy()
+    out["Generic_Definition"] = ""
+    keep = pd.Series(True, index=out.index)
+    for group, positions in groups.items():
+        definition = definitions.get(group, "")
+        if definition is None:
+            keep.iloc[positions] = False
+        else:
+            out.iloc[positions, out.columns.get_loc("Generic_Definition")] = definition
+    columns = ["EventType", FRAMES_COLUMN, SOURCE_COLUMN, "Generic_Definition"]
+    return out.loc[keep, columns], out.loc[~keep, columns[:3]]
+
+
+def write_latin1(df, path):
+    df = df.apply(lambda column: column.map(lambda v: v.translate(_latin1) if isinstance(v, str) else v))
+    df.to_csv(path, index=False, encoding="ISO-8859-1", errors="replace")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Generic_Definition text from FrameNet frame definitions.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help=f"dataset with EventType, `{FRAMES_COLUMN}` and {SOURCE_COLUMN}")
+    source.add_argument("--framenet-dir", help="FrameNet frame/ directory (one XML file per frame)")
+    parser.add_argument("--output", default="FrameNet_generated.csv")
+    parser.add_argument("--skipped", default="FrameNet_not_events.csv", help="frames judged not to be events")
+    parser.add_argument("--exclude", nargs="*", default=[], help="datasets whose frames are already covered")
+    parser.add_argument("--frames", nargs="*", help="only these frames")
+    parser.add_argument("--limit", type=int, help="only the first N frame groups (for a trial run)")
+    parser.add_argument("--examples", default=DEFAULT_EXAMPLES, help="hand-written definitions used as examples")
+    parser.add_argument("--example-count", type=int, default=3)
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--max-tokens", type=int, default=120)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--save-every", type=int, default=50, help="rewrite the output after this many answers")
+    Llm_client.add_client_arguments(parser)
+    args = parser.parse_args()
+
+    df = read_framenet_dir(args.framenet_dir) if args.framenet_dir else read_dataset(args.input)
+    covered = covered_frames(args.exclude)
+    wanted = {Hierarchy_verifier.normalize_frame(f) for f in args.frames} if args.frames else None
+    if covered or wanted:
+        frames = df[FRAMES_COLUMN].map(Frame_propagation.split_frames)
+        df = df[frames.map(lambda fs: not covered & set(fs) and (wanted is None or bool(wanted & set(fs))))]
+        df = df.reset_index(drop=True)
+    groups, texts = frame_groups(df)
+    if args.limit:
+        groups = dict(list(groups.items())[:args.limit])
+        df = df.iloc[sorted(p for positions in groups.values() for p in positions)].reset_index(drop=True)
+        groups, texts = frame_groups(df)
+
+    definitions = existing_definitions(args.output)
+    definitions.update({group: None for group in skipped_groups(args.skipped)})
+    todo = [group for group in groups if definitions.get(group, "") == ""]
+    print(f"{len(df)} event types, {len(groups)} distinct frame sets over {len(set(f for g in groups for f in g))} frames; "
+          f"{len(groups) - len(todo)} already defined, {len(todo)} to generate")
+
+    def save(results):
+        merged = dict(definitions)
+        merged.update(results)
+        dataset, skipped = build_dataset(df, groups, merged)
+        write_latin1(dataset, args.output)
+        write_latin1(skipped, args.skipped)
+        return dataset, skipped
+
+    def checkpoint(results):
+        if len(results) % args.save_every == 0:
+            save(results)
+
+    client = Llm_client.client_from_args(args)
+    examples = load_examples(args.examples, args.example_count)
+    results = generate(todo, texts, client, examples, args.concurrency, checkpoint, count=args.example_count,
+                       model=args.model, temperature=args.temperature, max_tokens=args.max_tokens)
+    dataset, skipped = save(results)
+    failed = (dataset["Generic_Definition"] == "").sum()
+    print(f"Saved {len(dataset)} event types to {args.output} ({failed} without a definition, rerun to retry); "
+          f"{len(skipped)} non-event frames to {args.skipped}")
+    if client.cache is not None:
+        print(f"Cache: {client.cache.hits} hits, {client.cache.misses} misses")
+    if client.single_flight is not None and client.single_flight.hits:
+        print(client.single_flight.summary())
+
+
+if __name__ == "__main__":
+    main()
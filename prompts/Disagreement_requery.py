@@ -0,0 +1,180 @@
+"""Re-query only the cells the existing strategy outputs disagree on.
+
+Aligns every available output (as Ensemble.py does) and scores each
+(definition, property) cell by the normalised entropy of its votes: 0 when all
+strategies agree, 1 when the votes are spread evenly over every label. Missing
+or unusable votes count as an extra "no answer" outcome, so thinly covered cells
+rank higher too. The most disputed cells are re-asked with a chosen strategy,
+optionally with several samples and another model, until the call budget is
+spent. Each new answer counts as many votes as there are outputs, so the
+re-query decides the cell and the old votes only settle a split between
+samples; --answer-weight gives the answers less say.
+
+    python Disagreement_requery.py --budget 200 --strategy cot --samples 3 --temperature 0.7 --model gpt-4o
+    python Disagreement_requery.py --budget 0      # only report the disagreement index
+"""
+import argparse
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import Ensemble
+import Llm_client
+import Strategy_registry
+
+
+# === Disagreement index ===
+def disagreement(votes, k):
+    """Normalised vote entropy per cell for (S, N) codes; INVALID votes form their own outcome."""
+    counts = np.stack([(votes == c).sum(axis=0) for c in range(k)] + [(votes == Ensemble.INVALID).sum(axis=0)])
+    p = counts / votes.shape[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        entropy = -np.where(p > 0, p * np.log(p), 0.0).sum(axis=0)
+    return entropy / math.log(min(k + 1, votes.shape[0])) if votes.shape[0] > 1 else np.zeros(votes.shape[1])
+
+
+def cell_table(aligned):
+    rows = []
+    for m in aligned.meta_properties:
+        votes = aligned.votes[m]
+        k = len(aligned.vocabularies[m])
+        index = disagreement(votes, k)
+        majority = Ensemble.weighted_vote(votes, np.ones(votes.shape[0]), k)
+        gold = aligned.gold.get(m)
+        for n in range(votes.shape[1]):
+            rows.append({"position": n, "EventType": aligned.event_types[n],
+                         "Generic_Definition": aligned.definitions[n], "property": m,
+                         "disagreement": index[n], "valid_votes": int((votes[:, n] != Ensemble.INVALID).sum()),
+                         "majority": aligned.vocabularies[m][majority[n]],
+                         "gold": aligned.vocabularies[m][gold[n]] if gold is not None and gold[n] >= 0 else ""})
+    return pd.DataFrame(rows).sort_values(["disagreement", "valid_votes"], ascending=[False, True], kind="stable")
+
+
+# === Re-query ===
+def sample_requests(strategy, definition, meta_property, samples, overrides):
+    """One request per sample; samples differ by the `user` field so a response cache keeps them apart."""
+    requests = []
+    for k in range(samples):
+        request = strategy.render_label_request(definition, meta_property)
+        request.update(overrides)
+        if samples > 1:
+            request["user"] = f"requery-sample-{k}"
+        requests.append(request)
+    return requests
+
+
+def requery(aligned, cells, strategy, client, budget, samples=1, overrides=None, threshold=0.0, concurrency=8):
+    """Ask `strategy` about the most disputed cells within `budget` calls; returns {(position, property): [labels]}."""
+    selected = cells[cells["disagreement"] > threshold].head(budget // max(samples, 1))
+    jobs = []
+    for position, m in zip(selected["position"], selected["property"]):
+        for request in sample_requests(strategy, aligned.definitions[position], m, samples, overrides or {}):
+            jobs.append((position, m, request))
+    print(f"Re-querying {len(selected)} cells ({len(jobs)} calls) with {strategy.name}")
+
+    def work(job):
+        position, m, request = job
+        try:
+            return position, m, strategy.parse_label(client.complete(request)["content"])
+        except Exception as e:
+            print(f"[Label:{m}] Error for definition: {e}")
+            return position, m, "error"
+
+    answers = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for position, m, label in pool.map(work, jobs):
+            answers.setdefault((position, m), []).append(label)
+    return selected, answers
+
+
+def apply_answers(aligned, answers, weight=None):
+    """Labels after the re-query: each valid answer adds `weight` votes (default: one per output).
+
+    Cells without a valid answer keep the plain majority of the outputs.
+    """
+    out = pd.DataFrame({"EventType": aligned.event_types, "Generic_Definition": aligned.definitions})
+    for m in aligned.meta_properties:
+        votes = aligned.votes[m]
+        vocabulary = aligned.vocabularies[m]
+        k = len(vocabulary)
+        labels = Ensemble.weighted_vote(votes, np.ones(votes.shape[0]), k)
+        scores = Ensemble.one_hot(votes, k).sum(axis=0)
+        for (position, prop), answered in answers.items():
+            if prop != m:
+                continue
+            extra = Ensemble.one_hot(Ensemble.encode(answered, vocabulary)[:, None], k)[:, 0].sum(axis=0)
+            if extra.any():
+                answer_weight = votes.shape[0] if weight is None else weight
+                labels[position] = (scores[position] + answer_weight * extra).argmax()
+        out[m] = np.array(vocabulary, dtype=object)[labels]
+        out[f"{m}Disagreement"] = disagreement(votes, k).round(3)
+    return out
+
+
+def gold_report(aligned, before, after, selected):
+    rows = []
+    for m in aligned.meta_properties:
+        gold = aligned.gold.get(m)
+        if gold is None:
+            continue
+        vocabulary = aligned.vocabularies[m]
+        mask = gold != Ensemble.INVALID
+        touched = np.zeros(len(gold), dtype=bool)
+        touched[selected.loc[selected["property"] == m, "position"].to_numpy()] = True
+        b = Ensemble.encode(before[m].values, vocabulary)
+        a = Ensemble.encode(after[m].values, vocabulary)
+        touched &= mask
+        rows.append({"property": m, "requeried": int(touched.sum()),
+                     "majority_accuracy": (b[mask] == gold[mask]).mean(),
+                     "after_accuracy": (a[mask] == gold[mask]).mean(),
+                     "requeried_before": (b[touched] == gold[touched]).mean() if touched.any() else float("nan"),
+                     "requeried_after": (a[touched] == gold[touched]).mean() if touched.any() else float("nan")})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spend extra LLM calls only on cells the strategies disagree on.")
+    parser.add_argument("--outputs", nargs="+", help="label CSVs (default: every 161_* output in Prompt_output/)")
+    parser.add_argument("--gold", default=Ensemble.DEFAULT_GOLD, help="gold labels for the before/after report")
+    parser.add_argument("--budget", type=int, default=100, help="maximum number of new calls")
+    parser.add_argument("--threshold", type=float, default=0.0, help="only cells whose index exceeds this")
+    parser.add_argument("--strategy", default="cot", help="strategy asked again about disputed cells")
+    parser.add_argument("--samples", type=int, default=1, help="answers per cell (use with --temperature > 0)")
+    parser.add_argument("--model", help="model override, e.g. a bigger model than the strategy's own")
+    parser.add_argument("--temperature", type=float, help="temperature override")
+    parser.add_argument("--answer-weight", type=float,
+                        help="votes each new answer counts as (default: the number of outputs, so it decides the cell)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cells", default="disagreement_cells.csv", help="per-cell disagreement index")
+    parser.add_argument("--output", default="161_requery.csv")
+    Llm_client.add_client_arguments(parser)
+    args = parser.parse_args()
+
+    paths = [Strategy_registry.resolve_data_path(p) for p in args.outputs] if args.outputs else Ensemble.default_output_files()
+    aligned = Ensemble.load_aligned(paths, args.gold)
+    cells = cell_table(aligned)
+    cells.to_csv(args.cells, index=False)
+    disputed = cells[cells["disagreement"] > args.threshold]
+    print(f"{len(aligned.names)} outputs, {len(cells)} cells: {len(disputed)} disputed "
+          f"({len(disputed) / max(len(cells), 1):.1%}); index saved to {args.cells}")
+    print(disputed.groupby("property")["disagreement"].agg(["count", "mean"]).to_string(float_format=lambda v: f"{v:.3f}"))
+
+    before = apply_answers(aligned, {})
+    if args.budget <= 0:
+        return
+    overrides = {k: v for k, v in {"model": args.model, "temperature": args.temperature}.items() if v is not None}
+    strategy = Strategy_registry.load_strategy(args.strategy)
+    selected, answers = requery(aligned, cells, strategy, Llm_client.client_from_args(args), args.budget,
+                                args.samples, overrides, args.threshold, args.concurrency)
+    after = apply_answers(aligned, answers, args.answer_weight)
+    after.to_csv(args.output, index=False)
+    changed = sum((before[m] != after[m]).sum() for m in aligned.meta_properties)
+    print(f"{changed} labels changed; saved to {args.output}")
+    if aligned.gold:
+        print(gold_report(aligned, before, after, selected).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
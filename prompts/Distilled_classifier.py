@@ -0,0 +1,338 @@
+"""Distil LLM labels into fast CPU classifiers, one per meta-property.
+
+Features are hashed word unigrams and bigrams plus character trigrams of the
+definition text; each property gets a multinomial logistic regression trained
+in NumPy on a teacher strategy's labels for every definition it labelled. Gold
+labels only score the cross-validated predictions and calibrate, per property,
+the confidence threshold above which the distilled labels are as accurate as
+the teacher (--targets both or gold also trains on them). Prediction is a
+sparse dot product, so bulk labelling runs at tens of thousands of definitions
+per second. Predictions below the threshold (or --min-confidence) are routed
+back to the LLM through Strategy_runner.
+
+    python Distilled_classifier.py train --teacher 161_CoT_prompting.csv --model distilled_cot.npz
+    python Distilled_classifier.py predict --model distilled_cot.npz --input big_corpus.csv --output big_corpus_labels.csv \\
+        --min-confidence 0.8 --strategy cot --backend openai
+"""
+import argparse
+import json
+import re
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+import Ensemble
+import Llm_client
+import Online_accuracy
+import Strategy_registry
+import Strategy_runner
+
+
+HASH_BITS = 18
+_word = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+# === Features ===
+_word_features = {}
+
+
+def word_features(word, mask):
+    """Hashed unigram and character trigrams of a word, plus the word's hash for bigrams (memoised)."""
+    cached = _word_features.get(word)
+    if cached is None:
+        if len(_word_features) > 1000000:
+            _word_features.clear()
+        padded = f"<{word}>"
+        hashes = [zlib.crc32(f"w:{word}".encode("utf-8")) & mask]
+        hashes += [zlib.crc32(f"c:{padded[k:k + 3]}".encode("utf-8")) & mask for k in range(len(padded) - 2)]
+        cached = _word_features[word] = (hashes, zlib.crc32(f"b:{word}".encode("utf-8")))
+    return cached
+
+
+def featurize(texts, bits=HASH_BITS):
+    """Sparse rows as (indptr, indices, values): hashed feature counts, L2-normalised per row.
+
+    Features are word unigrams, word bigrams and character trigrams within words.
+    """
+    mask = (1 << bits) - 1
+    indices = []
+    lengths = []
+    for text in texts:
+        start = len(indices)
+        previous = None
+        for word in _word.findall(text.lower()) if isinstance(text, str) else ():
+            hashes, word_hash = word_features(word, mask)
+            indices.extend(hashes)
+            if previous is not None:
+                indices.append(((previous * 0x9E3779B1) ^ word_hash) & mask)
+            previous = word_hash
+        lengths.append(len(indices) - start)
+    # Count repeated features per row in one vectorised pass.
+    rows = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+    keys, counts = np.unique((rows << bits) | np.array(indices, dtype=np.int64), return_counts=True)
+    indptr = np.searchsorted(keys >> bits, np.arange(len(lengths) + 1))
+    counts = counts.astype(np.float32)
+    norms = np.zeros(len(lengths), dtype=np.float32)
+    nonempty = np.flatnonzero(np.diff(indptr))
+    if len(nonempty):
+        norms[nonempty] = np.sqrt(np.add.reduceat(counts * counts, indptr[nonempty]))
+    values = counts / np.repeat(np.where(norms > 0, norms, 1.0), np.diff(indptr))
+    return indptr, keys & mask, values
+
+
+def _rows(indptr):
+    return np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+
+def logits(features, weights, bias):
+    indptr, indices, values = features
+    out = np.zeros((len(indptr) - 1, weights.shape[1]), dtype=np.float32)
+    nonempty = np.flatnonzero(np.diff(indptr))
+    if len(nonempty):
+        out[nonempty] = np.add.reduceat(weights[indices] * values[:, None], indptr[nonempty], axis=0)
+    return out + bias
+
+
+def softmax(z):
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def subset(features, rows):
+    indptr, indices, values = features
+    starts, ends = indptr[rows], indptr[rows + 1]
+    take = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)]) if len(rows) else np.array([], dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(ends - starts)]), indices[take], values[take]
+
+
+# === Training ===
+def fit(features, targets, k, bits=HASH_BITS, l2=1e-4, iterations=300, learning_rate=0.5):
+    """Multinomial logistic regression by full-batch Adam on sparse features.
+
+    Training runs over the hashed features that occur in the data only, then
+    scatters the weights into the full hash space.
+    """
+    indptr, indices, values = features
+    active, compact = np.unique(indices, return_inverse=True)
+    local = (indptr, compact, values)
+    n = len(targets)
+    weights = np.zeros((len(active), k), dtype=np.float32)
+    bias = np.zeros(k, dtype=np.float32)
+    y = np.eye(k, dtype=np.float32)[targets]
+    rows = _rows(indptr)
+    # Entries grouped by feature, so each feature's gradient is one segment sum.
+    order = np.argsort(compact, kind="stable")
+    segments = np.searchsorted(compact[order], np.arange(len(active)))
+    moments = [np.zeros_like(weights), np.zeros_like(weights), np.zeros_like(bias), np.zeros_like(bias)]
+    for t in range(1, iterations + 1):
+        error = (softmax(logits(local, weights, bias)) - y) / n
+        grad_w = np.add.reduceat((error[rows] * values[:, None])[order], segments, axis=0)
+        grad_w += l2 * weights
+        grad_b = error.sum(axis=0)
+        for param, grad, m, v in ((weights, grad_w, moments[0], moments[1]), (bias, grad_b, moments[2], moments[3])):
+            m *= 0.9
+            m += 0.1 * grad
+            v *= 0.999
+            v += 0.001 * grad * grad
+            param -= learning_rate * (m / (1 - 0.9 ** t)) / (np.sqrt(v / (1 - 0.999 ** t)) + 1e-8)
+    full = np.zeros((1 << bits, k), dtype=np.float32)
+    full[active] = weights
+    return full, bias
+
+
+def training_targets(df, teacher, gold, meta_property, vocabulary, source):
+    """Codes per row from the teacher and/or gold labels (gold wins), INVALID when neither is usable."""
+    codes = np.full(len(df), Ensemble.INVALID, dtype=np.int8)
+    if source in ("teacher", "both") and teacher is not None:
+        codes = Ensemble.encode(teacher[meta_property].values, vocabulary)
+    if source in ("gold", "both") and gold is not None and meta_property in gold:
+        gold_codes = Ensemble.encode(gold[meta_property].values, vocabulary)
+        codes = np.where(gold_codes != Ensemble.INVALID, gold_codes, codes)
+    return codes
+
+
+def calibrate_threshold(confidence, correct, target):
+    """Lowest confidence at which the predictions above it reach the target accuracy (above 1: none do)."""
+    order = np.argsort(-confidence, kind="stable")
+    accuracy = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    reaching = np.flatnonzero(accuracy >= target)
+    return float(confidence[order][reaching[-1]]) if len(reaching) else 1.01
+
+
+class DistilledModel:
+    def __init__(self, vocabularies, weights, biases, bits=HASH_BITS, teacher="", thresholds=None):
+        self.vocabularies = vocabularies
+        self.weights = weights
+        self.biases = biases
+        self.bits = bits
+        self.teacher = teacher
+        self.thresholds = thresholds or {}
+
+    @property
+    def meta_properties(self):
+        return list(self.vocabularies)
+
+    def predict(self, texts):
+        """{property: (labels, confidence)} for a list of definitions."""
+        features = featurize(texts, self.bits)
+        out = {}
+        for m in self.meta_properties:
+            p = softmax(logits(features, self.weights[m], self.biases[m]))
+            out[m] = (np.array(self.vocabularies[m], dtype=object)[p.argmax(axis=1)], p.max(axis=1))
+        return out
+
+    def save(self, path):
+        arrays = {}
+        for m in self.meta_properties:
+            # Only hashed features seen in training carry weight; store them sparsely.
+            used = np.flatnonzero(np.abs(self.weights[m]).sum(axis=1))
+            arrays[f"{m}_rows"] = used
+            arrays[f"{m}_weights"] = self.weights[m][used]
+            arrays[f"{m}_bias"] = self.biases[m]
+        meta = {"vocabularies": self.vocabularies, "bits": self.bits, "teacher": self.teacher,
+                "thresholds": self.thresholds}
+        np.savez_compressed(path, meta=json.dumps(meta), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        meta = json.loads(str(data["meta"]))
+        weights, biases = {}, {}
+        for m, vocabulary in meta["vocabularies"].items():
+            w = np.zeros((1 << meta["bits"], len(vocabulary)), dtype=np.float32)
+            w[data[f"{m}_rows"]] = data[f"{m}_weights"]
+            weights[m] = w
+            biases[m] = data[f"{m}_bias"]
+        return cls(meta["vocabularies"], weights, biases, meta["bits"], meta["teacher"], meta.get("thresholds"))
+
+
+def train(strategy, teacher_file, gold_file, source="teacher", folds=5, seed=0, target_accuracy=None, **fit_args):
+    """Fit on every definition of the teacher output; gold scores the held-out folds and sets the thresholds.
+
+    The routing threshold of a property is the lowest confidence whose held-out
+    gold accuracy reaches target_accuracy (default: the teacher's own).
+    """
+    if teacher_file and source != "gold":
+        path = Strategy_registry.resolve_data_path(teacher_file)
+        df = Strategy_registry.read_output(path).drop_duplicates(subset=strategy.dedupe_columns).reset_index(drop=True)
+    else:
+        df = strategy.load_definitions(gold_file)
+    gold = Online_accuracy.load_gold(strategy, df, gold_file)
+    teacher = Online_accuracy.load_reference(strategy, df, teacher_file) if teacher_file else None
+    texts = df[strategy.definition_column].tolist()
+    features = featurize(texts)
+    vocabularies = {m: strategy.allowed_labels(m) for m in strategy.meta_properties}
+    weights, biases, thresholds, rows = {}, {}, {}, []
+    assignment = np.random.default_rng(seed).permutation(len(df)) % folds
+    for m, vocabulary in vocabularies.items():
+        k = len(vocabulary)
+        targets = training_targets(df, teacher, gold, m, vocabulary, source)
+        gold_codes = Ensemble.encode(gold[m].values, vocabulary)
+        teacher_codes = Ensemble.encode(teacher[m].values, vocabulary) if teacher is not None else None
+
+        # Cross-validation: held-out definitions contribute neither teacher nor gold labels.
+        predicted = np.full(len(df), Ensemble.INVALID, dtype=np.int8)
+        confidence = np.zeros(len(df), dtype=np.float32)
+        for fold in range(folds):
+            train_rows = np.flatnonzero((assignment != fold) & (targets != Ensemble.INVALID))
+            test_rows = np.flatnonzero(assignment == fold)
+            w, b = fit(subset(features, train_rows), targets[train_rows], k, **fit_args)
+            p = softmax(logits(subset(features, test_rows), w, b))
+            predicted[test_rows] = p.argmax(axis=1)
+            confidence[test_rows] = p.max(axis=1)
+        scored = gold_codes != Ensemble.INVALID
+        row = {"property": m, "training_rows": int((targets != Ensemble.INVALID).sum()), "gold_rows": int(scored.sum()),
+               "distilled_accuracy": (predicted[scored] == gold_codes[scored]).mean()}
+        target = target_accuracy
+        if teacher_codes is not None:
+            row["teacher_accuracy"] = (teacher_codes[scored] == gold_codes[scored]).mean()
+            row["agreement_with_teacher"] = (predicted[teacher_codes != Ensemble.INVALID]
+                                             == teacher_codes[teacher_codes != Ensemble.INVALID]).mean()
+            target = row["teacher_accuracy"] if target is None else target
+        correct = predicted[scored] == gold_codes[scored]
+        thresholds[m] = calibrate_threshold(confidence[scored], correct, 0.8 if target is None else target)
+        confident = confidence[scored] >= thresholds[m]
+        row["threshold"] = thresholds[m]
+        row["gold_coverage"] = confident.mean() if scored.any() else float("nan")
+        row["accuracy_above_threshold"] = correct[confident].mean() if confident.any() else float("nan")
+        row["coverage"] = (confidence >= thresholds[m]).mean()
+        rows.append(row)
+
+        usable = np.flatnonzero(targets != Ensemble.INVALID)
+        weights[m], biases[m] = fit(subset(features, usable), targets[usable], k, **fit_args)
+    model = DistilledModel(vocabularies, weights, biases, teacher=teacher_file or "", thresholds=thresholds)
+    return model, pd.DataFrame(rows)
+
+
+# === Bulk labelling ===
+def predict_frame(model, strategy, df, min_confidence=None):
+    """Fill df with distilled labels; cells below min_confidence (default: the model's thresholds) stay empty."""
+    start = time.perf_counter()
+    predictions = model.predict(df[strategy.definition_column].tolist())
+    elapsed = time.perf_counter() - start
+    routed = 0
+    for m, (labels, confidence) in predictions.items():
+        keep = confidence >= (model.thresholds.get(m, 0.0) if min_confidence is None else min_confidence)
+        df[m] = np.where(keep, labels, "")
+        df[f"{m}Confidence"] = confidence.round(3)
+        routed += int((~keep).sum())
+    print(f"Distilled {len(df)} definitions in {elapsed:.2f}s ({len(df) / max(elapsed, 1e-9):,.0f} per second); "
+          f"{routed} cells below {'the calibrated thresholds' if min_confidence is None else min_confidence}")
+    return df, routed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and apply distilled per-property classifiers.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="fit on a teacher output, report CV accuracy against gold")
+    train_parser.add_argument("--strategy", default="cot", help="strategy whose label vocabularies are used")
+    train_parser.add_argument("--teacher", default="161_CoT_prompting.csv", help="teacher output file")
+    train_parser.add_argument("--gold", default=Ensemble.DEFAULT_GOLD)
+    train_parser.add_argument("--targets", choices=["teacher", "gold", "both"], default="teacher",
+                              help="labels to learn; gold is otherwise used only for evaluation and thresholds")
+    train_parser.add_argument("--target-accuracy", type=float,
+                              help="gold accuracy the routing thresholds must keep (default: the teacher's)")
+    train_parser.add_argument("--folds", type=int, default=5)
+    train_parser.add_argument("--iterations", type=int, default=300)
+    train_parser.add_argument("--l2", type=float, default=1e-4)
+    train_parser.add_argument("--model", default="distilled.npz")
+    train_parser.add_argument("--report", help="write the accuracy table to this CSV")
+
+    predict_parser = subparsers.add_parser("predict", help="label a dataset, routing low-confidence cells to the LLM")
+    Strategy_runner.add_run_arguments(predict_parser)
+    predict_parser.add_argument("--model", default="distilled.npz")
+    predict_parser.add_argument("--min-confidence", type=float,
+                                help="cells below this go to the LLM (default: the thresholds calibrated in training; "
+                                     "0 never calls the LLM)")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        strategy = Strategy_registry.load_strategy(args.strategy)
+        model, report = train(strategy, args.teacher, args.gold, args.targets, args.folds,
+                              target_accuracy=args.target_accuracy, iterations=args.iterations, l2=args.l2)
+        model.save(args.model)
+        print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        if args.report:
+            report.to_csv(args.report, index=False)
+        print(f"Model saved to {args.model}")
+        return
+
+    strategy = Strategy_registry.load_strategy(args.strategy)
+    model = DistilledModel.load(args.model)
+    df = strategy.load_definitions(args.input)
+    output = args.output or f"distilled_{strategy.name}.csv"
+    df, routed = predict_frame(model, strategy, df, args.min_confidence)
+    # Written first so an interrupted LLM pass resumes with the distilled labels in place.
+    df.to_csv(output, index=False)
+    if routed:
+        Strategy_runner.run_strategy(strategy, df, Llm_client.client_from_args(args), output, sleep=args.sleep,
+                                     resume=True)
+    print(f"Labels saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Ensemble of existing strategy outputs, without any API call.
+
+Loads any set of label files from Prompt_output/, aligns them on EventType and
+combines their votes per property in three ways:
+- majority: plain vote count;
+- weighted: votes weighted by each strategy's log-odds accuracy on the gold set;
+- stacked: a per-property multinomial logistic regression on the one-hot votes.
+The learned methods are scored by k-fold cross-validation against the gold
+annotations, then refit on all gold rows to label every definition.
+
+    python Ensemble.py --method stacked --output 161_ensemble.csv
+    python Ensemble.py --outputs 161_CoT_prompting.csv 161_FewShot_prompting.csv --method weighted
+"""
+import argparse
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+import Label_normalizer
+import Online_accuracy
+import Strategy_registry
+
+
+OUTPUT_DIR = os.path.join(Strategy_registry.REPO_ROOT, "Prompt_output")
+DEFAULT_GOLD = "Human_annotated_dataset.csv"
+METHODS = ("majority", "weighted", "stacked")
+INVALID = -1
+
+
+# === Loading and alignment ===
+def default_output_files():
+    """Label files of the 161-definition FrameNet runs (the input file itself has no labels)."""
+    files = []
+    for path in sorted(glob.glob(os.path.join(OUTPUT_DIR, "161_*.csv"))):
+        columns = Strategy_registry.read_output(path).columns
+        if any(m in columns or f"{m}_LLM" in columns for m in Strategy_registry.META_PROPERTIES):
+            files.append(path)
+    return files
+
+
+def output_name(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name[4:] if name.startswith("161_") else name
+
+
+def label_vocabularies():
+    return Label_normalizer.label_vocabularies()
+
+
+def encode(values, vocabulary):
+    """Map labels to int8 codes (position in vocabulary), INVALID for anything else."""
+    lookup = {label: code for code, label in enumerate(vocabulary)}
+    labels = pd.Series(values, dtype=object).map(lambda v: v.strip().lower() if isinstance(v, str) else v)
+    return labels.map(lookup).fillna(INVALID).to_numpy(dtype=np.int8)
+
+
+class AlignedLabels:
+    """Votes of S strategies on N definitions, one int8 (S, N) matrix per property."""
+
+    def __init__(self, names, event_types, definitions, votes, gold, vocabularies):
+        self.names = names
+        self.event_types = event_types
+        self.definitions = definitions
+        self.votes = votes
+        self.gold = gold
+        self.vocabularies = vocabularies
+
+    @property
+    def meta_properties(self):
+        return list(self.votes)
+
+
+def read_label_file(path):
+    frame = Strategy_registry.read_output(path)
+    if "EventType" not in frame.columns and "Event Type" in frame.columns:
+        frame = frame.rename(columns={"Event Type": "EventType"})
+    return frame
+
+
+def repeated_event_types(frame, path):
+    """EventTypes that name more than one row, with a warning (the 161 set has two "Expressing publicly")."""
+    repeated = frame.loc[frame["EventType"].duplicated(), "EventType"].unique().tolist()
+    if repeated:
+        print(f"Warning: {os.path.basename(path)} has several rows for EventType {', '.join(map(str, repeated))}")
+    return repeated
+
+
+def index_rows(frame, path, by_definition):
+    """Index rows by (EventType, Generic_Definition), or by (EventType, occurrence) without definitions."""
+    repeated_event_types(frame, path)
+    if by_definition:
+        second = frame["Generic_Definition"].fillna("").astype(str).str.strip()
+    else:
+        second = frame.groupby("EventType").cumcount()
+    frame = frame.set_index(pd.MultiIndex.from_arrays([frame["EventType"], second]))
+    duplicated = frame.index.duplicated()
+    if duplicated.any():
+        print(f"Warning: {os.path.basename(path)}: {duplicated.sum()} repeated rows ignored")
+    return frame[~duplicated]
+
+
+def load_aligned(paths, gold_file=None, normalize=False):
+    """Votes of every output on the definitions they share; normalize maps raw responses with Label_normalizer.
+
+    Rows are matched on EventType and Generic_Definition (on EventType and the
+    order of its rows when a file has no definitions), so an EventType with two
+    definitions keeps both.
+    """
+    vocabularies = label_vocabularies()
+    raw = {output_name(path): (path, read_label_file(path)) for path in paths}
+    by_definition = all("Generic_Definition" in frame.columns for _, frame in raw.values())
+    frames = {name: index_rows(frame, path, by_definition) for name, (path, frame) in raw.items()}
+    keys = None
+    for frame in frames.values():
+        keys = frame.index if keys is None else keys.intersection(frame.index, sort=False)
+    first = next(iter(frames.values()))
+    event_types = keys.get_level_values(0).tolist()
+    definitions = first.loc[keys, "Generic_Definition"].tolist() if by_definition else [""] * len(keys)
+
+    votes = {}
+    for m, vocabulary in vocabularies.items():
+        matcher = Label_normalizer.PropertyMatcher(vocabulary) if normalize else None
+        rows = []
+        for frame in frames.values():
+            column = Online_accuracy.prediction_columns(frame, [m]).get(m)
+            values = frame.loc[keys, column].values if column else [None] * len(keys)
+            if matcher and column:
+                values = Label_normalizer.normalize_values(values, matcher)[0].values
+            rows.append(encode(values, vocabulary))
+        votes[m] = np.vstack(rows)
+
+    gold = {}
+    if gold_file:
+        gold_path = Strategy_registry.resolve_data_path(gold_file)
+        gold_frame = pd.read_csv(gold_path, encoding="ISO-8859-1", dtype=str)
+        gold_frame = index_rows(gold_frame, gold_path, by_definition and "Generic_Definition" in gold_frame.columns)
+        columns = Online_accuracy.gold_columns(gold_frame, list(vocabularies))
+        gold_frame = gold_frame.reindex(keys)
+        for m, column in columns.items():
+            gold[m] = encode(gold_frame[column].values, vocabularies[m])
+    return AlignedLabels(list(frames), event_types, definitions, votes, gold, vocabularies)
+
+
+# === Voting ===
+def one_hot(votes, k):
+    """(S, N) codes -> (S, N, k) one-hot; INVALID votes are all zeros."""
+    eye = np.vstack([np.eye(k, dtype=np.float32), np.zeros((1, k), dtype=np.float32)])
+    return eye[np.where(votes == INVALID, k, votes)]
+
+
+def weighted_vote(votes, weights, k, prior=None):
+    """Sum of per-strategy weights for each class; ties go to the larger prior."""
+    scores = np.einsum("snk,s->nk", one_hot(votes, k), weights)
+    if prior is not None:
+        scores = scores + 1e-6 * prior
+    return scores.argmax(axis=1).astype(np.int8)
+
+
+def class_prior(gold, k):
+    valid = gold[gold != INVALID]
+    return np.bincount(valid, minlength=k) / max(len(valid), 1)
+
+
+def accuracy_weights(votes, gold, smoothing=1.0):
+    """Log-odds of each strategy's accuracy on rows with gold labels."""
+    mask = gold != INVALID
+    correct = (votes[:, mask] == gold[mask]).sum(axis=1)
+    accuracy = (correct + smoothing) / (mask.sum() + 2 * smoothing)
+    return np.log(accuracy / (1 - accuracy))
+
+
+# === Stacking ===
+def stack_features(votes, k):
+    s, n = votes.shape
+    features = one_hot(votes, k).transpose(1, 0, 2).reshape(n, s * k)
+    return np.hstack([features, np.ones((n, 1), dtype=np.float32)])
+
+
+def fit_softmax(features, targets, k, l2=0.01, iterations=500, learning_rate=0.5):
+    weights = np.zeros((features.shape[1], k), dtype=np.float64)
+    y = np.eye(k)[targets]
+    n = len(targets)
+    for _ in range(iterations):
+        logits = features @ weights
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        gradient = features.T @ (probabilities - y) / n + l2 * weights
+        weights -= learning_rate * gradient
+    return weights
+
+
+def predict_softmax(features, weights):
+    return (features @ weights).argmax(axis=1).astype(np.int8)
+
+
+# === Ensemble per property ===
+def fit_predict(method, votes, gold, k, train):
+    """Fit `method` on the `train` columns (rows with gold labels) and predict every column."""
+    prior = class_prior(gold[train], k)
+    if method == "majority":
+        return weighted_vote(votes, np.ones(votes.shape[0]), k, prior)
+    if method == "weighted":
+        return weighted_vote(votes, accuracy_weights(votes[:, train], gold[train]), k, prior)
+    features = stack_features(votes, k)
+    return predict_softmax(features, fit_softmax(features[train], gold[train], k))
+
+
+def cross_validated(method, votes, gold, k, folds=5, seed=0):
+    labelled = np.flatnonzero(gold != INVALID)
+    assignment = np.random.default_rng(seed).permutation(len(labelled)) % folds
+    predictions = np.full(len(gold), INVALID, dtype=np.int8)
+    for fold in range(folds):
+        held_out = labelled[assignment == fold]
+        train = labelled[assignment != fold]
+        predictions[held_out] = fit_predict(method, votes, gold, k, train)[held_out]
+    return predictions
+
+
+def evaluate(aligned, folds=5, seed=0):
+    rows = []
+    for m in aligned.meta_properties:
+        gold = aligned.gold.get(m)
+        if gold is None:
+            continue
+        mask = gold != INVALID
+        votes = aligned.votes[m]
+        k = len(aligned.vocabularies[m])
+        for s, name in enumerate(aligned.names):
+            rows.append({"property": m, "method": name, "accuracy": (votes[s, mask] == gold[mask]).mean()})
+        for method in METHODS:
+            predictions = cross_validated(method, votes, gold, k, folds, seed)
+            rows.append({"property": m, "method": f"ensemble:{method}", "accuracy": (predictions[mask] == gold[mask]).mean()})
+    return pd.DataFrame(rows).pivot(index="method", columns="property", values="accuracy")
+
+
+def build_ensemble(aligned, method):
+    out = pd.DataFrame({"EventType": aligned.event_types, "Generic_Definition": aligned.definitions})
+    for m in aligned.meta_properties:
+        votes = aligned.votes[m]
+        vocabulary = aligned.vocabularies[m]
+        k = len(vocabulary)
+        gold = aligned.gold.get(m, np.full(votes.shape[1], INVALID, dtype=np.int8))
+        train = np.flatnonzero(gold != INVALID)
+        if method != "majority" and len(train) == 0:
+            raise ValueError(f"Method '{method}' needs gold labels for {m}")
+        predictions = fit_predict(method, votes, gold, k, train)
+        out[m] = np.array(vocabulary, dtype=object)[predictions]
+        out[f"{m}Agreement"] = (votes == predictions).mean(axis=0).round(3)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Combine existing strategy outputs into an ensemble labelling.")
+    parser.add_argument("--outputs", nargs="+", help="label CSVs (default: every 161_* output in Prompt_output/)")
+    parser.add_argument("--gold", default=DEFAULT_GOLD, help="gold labels for weights and evaluation")
+    parser.add_argument("--method", choices=METHODS, default="stacked")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds for the accuracy report")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="161_ensemble.csv")
+    parser.add_argument("--normalize", action="store_true",
+                        help="map malformed responses to labels with Label_normalizer before voting")
+    args = parser.parse_args()
+
+    paths = [Strategy_registry.resolve_data_path(p) for p in args.outputs] if args.outputs else default_output_files()
+    aligned = load_aligned(paths, args.gold, args.normalize)
+    print(f"Aligned {len(aligned.event_types)} event types across {len(aligned.names)} outputs: "
+          f"{', '.join(aligned.names)}")
+    if aligned.gold:
+        print("Accuracy against gold (ensembles: cross-validated):")
+        print(evaluate(aligned, args.folds, args.seed).to_string(float_format=lambda v: f"{v:.3f}"))
+    build_ensemble(aligned, args.method).to_csv(args.output, index=False)
+    print(f"Ensemble ({args.method}) saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
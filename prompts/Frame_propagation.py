@@ -0,0 +1,261 @@
+"""Pre-fill labels from FrameNet frames that are already consistently labelled.
+
+Human_annotated_dataset.csv maps each EventType to its FrameNet frame(s). This
+stage indexes frame -> labelled event types, using the gold annotations and any
+previous outputs, and proposes a prior label for every cell of a new dataset
+whose frames agree on that property. Priors are checked on a random sample
+with the strategy's own model first; if they hold up, the remaining proposed
+cells are pre-filled (or, with --cheap-model, confirmed by a cheaper model)
+and Strategy_runner resumes over the rest, querying only what is left.
+
+    python Frame_propagation.py --strategy cot --input new_frames.csv --output new_frames_cot.csv \\
+        --labels 161_CoT_prompting.csv 161_FewShot_prompting.csv --verify-rate 0.1
+    python Frame_propagation.py --strategy direct --evaluate    # leave-one-out precision on the gold set
+"""
+import argparse
+import random
+from collections import Counter
+
+import pandas as pd
+
+import Hierarchy_verifier
+import Llm_client
+import Online_accuracy
+import Parameter_sweep
+import Strategy_registry
+import Strategy_runner
+
+
+DEFAULT_GOLD = "Human_annotated_dataset.csv"
+FRAMES_COLUMN = "Corresponding Frame(s)"
+
+
+# === Frame index ===
+def split_frames(value):
+    if not isinstance(value, str):
+        return []
+    return [Hierarchy_verifier.normalize_frame(f) for f in value.split(",") if f.strip()]
+
+
+class FrameIndex:
+    """Frames of each event type and the labels each event type has been given."""
+
+    def __init__(self, meta_properties):
+        self.meta_properties = meta_properties
+        self.frames_of = {}
+        self.event_types_of = {}
+        self.votes = {}
+        self.gold = set()
+
+    def add_frames(self, event_type, frames):
+        for frame in frames:
+            if frame not in self.frames_of.setdefault(event_type, []):
+                self.frames_of[event_type].append(frame)
+                self.event_types_of.setdefault(frame, set()).add(event_type)
+
+    def add_related(self, frame_pairs):
+        """Treat directly related frames (e.g. FrameNet Inheritance) as sharing their event types."""
+        for a, b in frame_pairs:
+            a, b = Hierarchy_verifier.normalize_frame(a), Hierarchy_verifier.normalize_frame(b)
+            for event_type in list(self.event_types_of.get(a, ())):
+                self.event_types_of.setdefault(b, set()).add(event_type)
+            for event_type in list(self.event_types_of.get(b, ())):
+                self.event_types_of.setdefault(a, set()).add(event_type)
+
+    def add_labels(self, event_type, labels, gold=False):
+        """Record one source's labels; gold labels replace and then outrank every output."""
+        if event_type in self.gold and not gold:
+            return
+        if gold and event_type not in self.gold:
+            self.gold.add(event_type)
+            self.votes.pop(event_type, None)
+        counts = self.votes.setdefault(event_type, {m: Counter() for m in self.meta_properties})
+        for m in self.meta_properties:
+            label = Online_accuracy.normalize_gold(labels.get(m))
+            if label and label != "error":
+                counts[m][label] += 1
+
+    def label_of(self, event_type, meta_property):
+        counts = self.votes.get(event_type, {}).get(meta_property)
+        if not counts:
+            return None
+        return counts.most_common(1)[0][0]
+
+    def prior(self, frames, meta_property, exclude=None):
+        """(label, support, agreement) over the labelled event types sharing any of `frames`."""
+        event_types = set()
+        for frame in frames:
+            event_types |= self.event_types_of.get(frame, set())
+        event_types.discard(exclude)
+        labels = Counter(self.label_of(e, meta_property) for e in event_types)
+        labels.pop(None, None)
+        if not labels:
+            return None, 0, 0.0
+        label, count = labels.most_common(1)[0]
+        support = sum(labels.values())
+        return label, support, count / support
+
+
+def build_index(strategy, frames_file=DEFAULT_GOLD, gold_file=DEFAULT_GOLD, label_files=(), relations=None,
+                relation="Inheritance"):
+    index = FrameIndex(strategy.meta_properties)
+    frames = pd.read_csv(Strategy_registry.resolve_data_path(frames_file), encoding="ISO-8859-1")
+    for event_type, value in zip(frames["EventType"], frames[FRAMES_COLUMN]):
+        index.add_frames(str(event_type).strip(), split_frames(value))
+    if relations:
+        index.add_related(Hierarchy_verifier.load_frame_relations(relations, relation))
+    for path in label_files:
+        table = Hierarchy_verifier.load_label_table(path)
+        for event_type, row in table.iterrows():
+            index.add_labels(event_type.strip(), row.to_dict())
+    if gold_file:
+        gold = pd.read_csv(Strategy_registry.resolve_data_path(gold_file), encoding="ISO-8859-1", dtype=str)
+        columns = Online_accuracy.gold_columns(gold, strategy.meta_properties)
+        for _, row in gold.iterrows():
+            index.add_labels(str(row["EventType"]).strip(), {m: row[c] for m, c in columns.items()}, gold=True)
+    return index
+
+
+def row_frames(index, df, i, event_type):
+    if FRAMES_COLUMN in df.columns:
+        frames = split_frames(df.at[i, FRAMES_COLUMN])
+        if frames:
+            return frames
+    return index.frames_of.get(str(event_type).strip(), [])
+
+
+# === Proposals ===
+def propose(strategy, df, index, min_support=1, min_agreement=1.0, leave_one_out=False):
+    """One row per unlabelled cell whose frames agree on a label."""
+    rows = []
+    for i, row in df.iterrows():
+        event_type = str(row[strategy.id_column]).strip()
+        frames = row_frames(index, df, i, event_type)
+        for m in strategy.meta_properties:
+            if Strategy_runner.is_labelled(df.at[i, m]):
+                continue
+            label, support, agreement = index.prior(frames, m, exclude=event_type if leave_one_out else None)
+            if label and support >= min_support and agreement >= min_agreement:
+                rows.append({"index": i, "EventType": event_type, "property": m, "prior": label,
+                             "support": support, "agreement": agreement, "frames": ", ".join(frames)})
+    return pd.DataFrame(rows, columns=["index", "EventType", "property", "prior", "support", "agreement", "frames"])
+
+
+def fill_cell(strategy, df, i, meta_property, label, note):
+    df.at[i, "EventType"] = df.at[i, strategy.id_column]
+    df.at[i, meta_property] = label
+    if strategy.uses_justification:
+        df.at[i, f"{meta_property}Justification"] = note
+
+
+def propagate(strategy, df, index, client, output_file, verify_rate=0.1, min_verified=0.8, cheap_model=None,
+              min_support=1, min_agreement=1.0, sleep=1.0, seed=0):
+    proposals = propose(strategy, df, index, min_support, min_agreement)
+    print(f"{len(proposals)} of {len(df) * len(strategy.meta_properties)} cells have a consistent frame prior")
+    proposals["action"] = "queried"
+    proposals["label"] = ""
+
+    # Check a sample of priors against the strategy's own answer before trusting the rest.
+    rng = random.Random(seed)
+    sample = [k for k in proposals.index if rng.random() < verify_rate]
+    if proposals.shape[0] and not sample:
+        sample = [rng.choice(list(proposals.index))]
+    agree = 0
+    for k in sample:
+        i, m = proposals.at[k, "index"], proposals.at[k, "property"]
+        definition = df.at[i, strategy.definition_column]
+        label = Strategy_runner.query_label(strategy, client, definition, m)
+        justification = (Strategy_runner.query_justification(strategy, client, definition, m, label)
+                         if strategy.uses_justification else "")
+        fill_cell(strategy, df, i, m, label, justification)
+        proposals.loc[k, ["action", "label"]] = ["verified", label]
+        agree += label == proposals.at[k, "prior"]
+    low, high = Online_accuracy.wilson_interval(agree, len(sample))
+    if sample:
+        print(f"Priors verified on {len(sample)} cells: {agree / len(sample):.3f} agree (95% CI {low:.3f}-{high:.3f})")
+
+    if low < min_verified:
+        print(f"Lower bound {low:.3f} is below {min_verified}; querying every remaining cell.")
+    else:
+        for k in proposals.index[proposals["action"] == "queried"]:
+            i, m, prior = proposals.at[k, "index"], proposals.at[k, "property"], proposals.at[k, "prior"]
+            note = (f"Propagated from frame(s) {proposals.at[k, 'frames']}: {proposals.at[k, 'support']} "
+                    f"labelled event type(s), agreement {proposals.at[k, 'agreement']:.2f}.")
+            if cheap_model:
+                label, _ = Parameter_sweep.run_cell(client, strategy, {"model": cheap_model},
+                                                    df.at[i, strategy.definition_column], m)
+                if label != prior:
+                    proposals.at[k, "label"] = label
+                    continue
+                proposals.at[k, "action"] = "confirmed"
+                note += f" Confirmed by {cheap_model}."
+            else:
+                proposals.at[k, "action"] = "prefilled"
+            proposals.at[k, "label"] = prior
+            fill_cell(strategy, df, i, m, prior, note)
+
+    counts = proposals["action"].value_counts().to_dict()
+    print(f"Prefilled {counts.get('prefilled', 0)}, confirmed {counts.get('confirmed', 0)}, "
+          f"verified {counts.get('verified', 0)}; running the strategy on the remaining cells")
+    df = Strategy_runner.run_strategy(strategy, df, client, output_file, sleep=sleep, resume=True)
+    queried = proposals["action"] == "queried"
+    proposals.loc[queried, "label"] = [df.at[i, m] for i, m in proposals.loc[queried, ["index", "property"]].values]
+    return df, proposals
+
+
+# === Offline evaluation ===
+def evaluate(strategy, index, gold_file=DEFAULT_GOLD, min_support=1, min_agreement=1.0):
+    """Leave-one-out coverage and precision of frame priors over the gold set."""
+    df = strategy.load_definitions(gold_file)
+    gold = Online_accuracy.load_gold(strategy, df, gold_file)
+    for m in strategy.meta_properties:
+        df[m] = ""
+    proposals = propose(strategy, df, index, min_support, min_agreement, leave_one_out=True)
+    rows = []
+    for m in strategy.meta_properties:
+        part = proposals[proposals["property"] == m]
+        correct = sum(gold.at[i, m] == prior for i, prior in zip(part["index"], part["prior"]))
+        low, high = Online_accuracy.wilson_interval(correct, len(part))
+        rows.append({"property": m, "coverage": len(part) / max(gold[m].notna().sum(), 1), "proposed": len(part),
+                     "precision": correct / len(part) if len(part) else float("nan"), "ci_low": low, "ci_high": high})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fill labels from consistently labelled FrameNet frames.")
+    Strategy_runner.add_run_arguments(parser)
+    parser.add_argument("--gold", default=DEFAULT_GOLD, help="gold labels indexed by frame ('' to skip)")
+    parser.add_argument("--frames", default=DEFAULT_GOLD, help=f"dataset mapping EventType to `{FRAMES_COLUMN}`")
+    parser.add_argument("--labels", nargs="*", default=[], help="previous output files to index")
+    parser.add_argument("--frame-relations", help="also pool related frames (frRelation.xml or two-column CSV)")
+    parser.add_argument("--relation", default="Inheritance")
+    parser.add_argument("--min-support", type=int, default=1, help="labelled event types needed for a prior")
+    parser.add_argument("--min-agreement", type=float, default=1.0, help="share of them that must agree")
+    parser.add_argument("--verify-rate", type=float, default=0.1, help="share of priors checked with the full model")
+    parser.add_argument("--min-verified", type=float, default=0.8,
+                        help="use priors only if the verified agreement's lower 95%% bound reaches this")
+    parser.add_argument("--cheap-model", help="confirm priors with this model instead of trusting them outright")
+    parser.add_argument("--report", default="frame_propagation.csv", help="per-cell proposals and outcomes")
+    parser.add_argument("--evaluate", action="store_true", help="only report leave-one-out precision on the gold set")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    strategy = Strategy_registry.load_strategy(args.strategy)
+    index = build_index(strategy, args.frames, args.gold, args.labels, args.frame_relations, args.relation)
+    if args.evaluate:
+        report = evaluate(strategy, index, args.gold or DEFAULT_GOLD, args.min_support, args.min_agreement)
+        print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        return
+
+    df = strategy.load_definitions(args.input)
+    client = Llm_client.client_from_args(args)
+    _, proposals = propagate(strategy, df, index, client, args.output or strategy.output_file,
+                             verify_rate=args.verify_rate, min_verified=args.min_verified,
+                             cheap_model=args.cheap_model, min_support=args.min_support,
+                             min_agreement=args.min_agreement, sleep=args.sleep, seed=args.seed)
+    proposals.to_csv(args.report, index=False)
+    print(f"Proposals saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
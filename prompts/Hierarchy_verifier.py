@@ -0,0 +1,388 @@
+"""Verify a perdurant subsumption hierarchy against meta-property labels.
+
+Each event type's four labels are packed into one bitset (one bit per label
+value). For every subsumption edge parent -> child the child's bits are checked
+against the labels its parent forbids under the inheritance rules below. The
+forbidden sets are also propagated down the hierarchy in topological order, so
+a violation through unlabelled intermediate types is caught too. All checks
+are vectorised over edges, and relabelling a few types re-verifies only their
+descendants.
+
+Edges come from a Parent,Child CSV, or from FrameNet frame-to-frame relations
+(frRelation.xml or a SuperFrame,SubFrame CSV) mapped onto event types through
+the `Corresponding Frame(s)` column of Human_annotated_dataset.csv.
+
+    python Hierarchy_verifier.py --labels 161_ensemble.csv --edges event_hierarchy.csv
+    python Hierarchy_verifier.py --labels Human_annotated_dataset.csv --frame-relations frRelation.xml
+    python Hierarchy_verifier.py --benchmark 500000
+"""
+import argparse
+import re
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+import Ensemble
+import Online_accuracy
+import Strategy_registry
+
+
+# === Inheritance rules: parent label -> child labels it forbids ===
+# If child is subsumed by parent, every child instance is a parent instance.
+INHERITANCE_RULES = {
+    "Cumulativity": {
+        # Two child instances sum to a child (hence parent) instance.
+        "anti-cumulative": ["cumulative"],
+    },
+    "Homeomericity": {
+        # Every temporal part of a child instance would be a parent instance.
+        "anti-homeomeric": ["homeomeric"],
+    },
+    "TemporalExtent": {
+        "atomic": ["durative"],
+        "durative": ["atomic"],
+    },
+    "Agentivity": {
+        # Child instances lacking intentional initiation would be parent instances.
+        "agentive": ["non-agentive", "anti-agentive"],
+        # Child instances with intentional initiation would be parent instances.
+        "anti-agentive": ["agentive", "non-agentive"],
+    },
+}
+
+
+# === Label bitsets ===
+class LabelEncoding:
+    def __init__(self, vocabularies):
+        self.vocabularies = vocabularies
+        self.bit = {}
+        self.property_mask = {}
+        position = 0
+        for m, vocabulary in vocabularies.items():
+            mask = 0
+            for label in vocabulary:
+                self.bit[(m, label)] = 1 << position
+                mask |= 1 << position
+                position += 1
+            self.property_mask[m] = mask
+        if position > 16:
+            raise ValueError("Label vocabulary does not fit a 16-bit set")
+        self.width = position
+        # forbidden[b] = child bits forbidden by a parent whose label bitset is b.
+        self.forbidden = np.zeros(1 << position, dtype=np.uint16)
+        for bits in range(1 << position):
+            mask = 0
+            for m, rules in INHERITANCE_RULES.items():
+                for parent_label, child_labels in rules.items():
+                    if bits & self.bit[(m, parent_label)]:
+                        for child_label in child_labels:
+                            mask |= self.bit[(m, child_label)]
+            self.forbidden[bits] = mask
+
+    def encode_row(self, labels):
+        bits = 0
+        for m, label in labels.items():
+            if isinstance(label, str):
+                bits |= self.bit.get((m, label.strip().lower()), 0)
+        return bits
+
+    def decode(self, bits, meta_property):
+        for label in self.vocabularies[meta_property]:
+            if bits & self.bit[(meta_property, label)]:
+                return label
+        return ""
+
+
+# === Hierarchy ===
+def _csr(sources, targets, n):
+    """Adjacency in compressed form: neighbours of node v are targets[start[v]:start[v + 1]]."""
+    order = np.argsort(sources, kind="stable")
+    return np.searchsorted(sources[order], np.arange(n + 1)), targets[order]
+
+
+def _neighbours(start, adjacent, nodes):
+    """All neighbours of `nodes`, with repeats, without a Python loop over nodes."""
+    counts = start[nodes + 1] - start[nodes]
+    if counts.sum() == 0:
+        return adjacent[:0]
+    offsets = np.repeat(start[nodes] - np.cumsum(counts) + counts, counts)
+    return adjacent[offsets + np.arange(counts.sum())]
+
+
+class HierarchyVerifier:
+    def __init__(self, event_types, parents, children, label_bits, encoding):
+        """event_types: node names; parents/children: int arrays of edge endpoints; label_bits: uint16 per node."""
+        self.event_types = list(event_types)
+        self.index = {name: i for i, name in enumerate(self.event_types)}
+        self.parents = np.asarray(parents, dtype=np.int64)
+        self.children = np.asarray(children, dtype=np.int64)
+        self.bits = np.asarray(label_bits, dtype=np.uint16)
+        self.encoding = encoding
+        n = len(self.event_types)
+        self._down = _csr(self.parents, self.children, n)
+        self._up = _csr(self.children, self.parents, n)
+        self.level, self.cyclic = self._topological_levels()
+        self.inherited = np.zeros(n, dtype=np.uint16)
+        self._propagate(np.ones(len(self.parents), dtype=bool))
+
+    # --- topology ---
+    def _topological_levels(self):
+        """Kahn's algorithm, one vectorised step per level. Returns levels (-1 when unordered) and cycle members."""
+        n = len(self.event_types)
+        indegree = np.bincount(self.children, minlength=n)
+        level = np.full(n, -1, dtype=np.int64)
+        frontier = np.flatnonzero(indegree == 0)
+        depth = 0
+        while len(frontier):
+            level[frontier] = depth
+            reached = _neighbours(*self._down, frontier)
+            np.subtract.at(indegree, reached, 1)
+            candidates = np.unique(reached)
+            frontier = candidates[(indegree[candidates] == 0) & (level[candidates] == -1)]
+            depth += 1
+        # Nodes never reached lie on a cycle or below one; peel off the sinks to keep the cycles.
+        remaining = level == -1
+        while True:
+            inner = remaining[self.parents] & remaining[self.children]
+            sinks = remaining & (np.bincount(self.parents[inner], minlength=n) == 0)
+            if not sinks.any():
+                break
+            remaining &= ~sinks
+        return level, np.flatnonzero(remaining)
+
+    def _propagate(self, edge_mask):
+        """Push forbidden child labels down the selected edges, parents level by level."""
+        edges = np.flatnonzero(edge_mask & (self.level[self.parents] >= 0) & (self.level[self.children] >= 0))
+        if len(edges) == 0:
+            return
+        parent_levels = self.level[self.parents[edges]]
+        order = np.argsort(parent_levels, kind="stable")
+        edges, parent_levels = edges[order], parent_levels[order]
+        boundaries = np.flatnonzero(np.diff(parent_levels)) + 1
+        for group in np.split(edges, boundaries):
+            p, c = self.parents[group], self.children[group]
+            np.bitwise_or.at(self.inherited, c, self.inherited[p] | self.encoding.forbidden[self.bits[p]])
+
+    def descendants(self, nodes):
+        """`nodes` and everything below them."""
+        seen = np.zeros(len(self.event_types), dtype=bool)
+        frontier = np.unique(np.asarray(nodes, dtype=np.int64))
+        while len(frontier):
+            seen[frontier] = True
+            reached = np.unique(_neighbours(*self._down, frontier))
+            frontier = reached[~seen[reached]]
+        return np.flatnonzero(seen)
+
+    # --- verification ---
+    def check(self):
+        """Vectorised check of the whole hierarchy.
+
+        Returns violating edge indices with their conflicting child bits, and the
+        nodes whose labels conflict only with a non-adjacent ancestor, with theirs.
+        """
+        conflict = self.encoding.forbidden[self.bits[self.parents]] & self.bits[self.children]
+        edges = np.flatnonzero(conflict)
+        direct = np.zeros(len(self.event_types), dtype=np.uint16)
+        np.bitwise_or.at(direct, self.children[edges], conflict[edges])
+        indirect_conflict = self.inherited & self.bits & ~direct
+        nodes = np.flatnonzero(indirect_conflict)
+        return edges, conflict[edges], nodes, indirect_conflict[nodes]
+
+    def verify(self):
+        return self._report(*self.check())
+
+    def update_labels(self, changes):
+        """Apply {event_type: {property: label}} and re-propagate below the changed types only.
+
+        Returns the number of types whose inherited constraints were recomputed.
+        """
+        changed = []
+        for event_type, labels in changes.items():
+            node = self.index[event_type]
+            bits = int(self.bits[node])
+            for m, label in labels.items():
+                bits &= ~self.encoding.property_mask[m] & 0xFFFF
+                bits |= self.encoding.bit.get((m, label.strip().lower()), 0)
+            self.bits[node] = bits
+            changed.append(node)
+        # A changed label alters what its descendants inherit, never what its ancestors do.
+        affected = self.descendants(_neighbours(*self._down, np.array(changed, dtype=np.int64)))
+        is_affected = np.zeros(len(self.event_types), dtype=bool)
+        is_affected[affected] = True
+        self.inherited[affected] = 0
+        self._propagate(is_affected[self.children])
+        return len(affected)
+
+    def _report(self, edges, edge_conflict, nodes, node_conflict):
+        rows = []
+        for e, conflict in zip(edges, edge_conflict):
+            p, c = self.parents[e], self.children[e]
+            for m, mask in self.encoding.property_mask.items():
+                if conflict & mask:
+                    rows.append({"kind": "edge", "parent": self.event_types[p], "child": self.event_types[c],
+                                 "property": m, "parent_label": self.encoding.decode(self.bits[p], m),
+                                 "child_label": self.encoding.decode(self.bits[c], m)})
+        for c, conflict in zip(nodes, node_conflict):
+            for m, mask in self.encoding.property_mask.items():
+                if conflict & mask:
+                    ancestor = self._culprit(c, int(conflict) & mask)
+                    rows.append({"kind": "inherited", "parent": self.event_types[ancestor] if ancestor >= 0 else "",
+                                 "child": self.event_types[c], "property": m,
+                                 "parent_label": self.encoding.decode(self.bits[ancestor], m) if ancestor >= 0 else "",
+                                 "child_label": self.encoding.decode(self.bits[c], m)})
+        for c in self.cyclic:
+            rows.append({"kind": "cycle", "parent": "", "child": self.event_types[c], "property": "",
+                         "parent_label": "", "child_label": ""})
+        return pd.DataFrame(rows, columns=["kind", "parent", "child", "property", "parent_label", "child_label"])
+
+    def _culprit(self, node, mask):
+        """Nearest ancestor whose own label forbids `mask` (only used for reporting)."""
+        seen = np.zeros(len(self.event_types), dtype=bool)
+        frontier = np.array([node], dtype=np.int64)
+        while len(frontier):
+            seen[frontier] = True
+            above = np.unique(_neighbours(*self._up, frontier))
+            hits = above[(self.encoding.forbidden[self.bits[above]] & mask) != 0]
+            if len(hits):
+                return int(hits[0])
+            frontier = above[~seen[above]]
+        return -1
+
+
+# === Loading ===
+def normalize_frame(name):
+    return re.sub(r"[\s_]+", "_", name.strip()).lower()
+
+
+def load_label_table(path):
+    """EventType-indexed labels, one column per property (<property>_LLM preferred, as in the outputs)."""
+    path = Strategy_registry.resolve_data_path(path)
+    frame = Ensemble.read_label_file(path)
+    # A hierarchy node is an EventType; with several definitions the first row's labels stand for it.
+    Ensemble.repeated_event_types(frame, path)
+    frame = frame.drop_duplicates(subset=["EventType"]).set_index("EventType")
+    columns = Online_accuracy.prediction_columns(frame, Strategy_registry.META_PROPERTIES)
+    return frame[list(columns.values())].rename(columns={c: m for m, c in columns.items()})
+
+
+def load_edges(path):
+    edges = Strategy_registry.read_output(Strategy_registry.resolve_data_path(path))
+    columns = {c.lower(): c for c in edges.columns}
+    parent = columns.get("parent", edges.columns[0])
+    child = columns.get("child", edges.columns[1])
+    return list(zip(edges[parent].str.strip(), edges[child].str.strip()))
+
+
+def load_frame_relations(path, relation="Inheritance"):
+    """(super_frame, sub_frame) pairs from FrameNet's frRelation.xml or a two-column CSV."""
+    if path.endswith(".xml"):
+        pairs = []
+        for element in ET.parse(path).iter():
+            if element.tag.endswith("frameRelationType") and element.get("name") != relation:
+                continue
+            for rel in element.iter():
+                if rel.tag.endswith("frameRelation") and rel.get("superFrameName"):
+                    pairs.append((rel.get("superFrameName"), rel.get("subFrameName")))
+        return pairs
+    return load_edges(path)
+
+
+def frame_index(dataset_path):
+    """frame -> event types, from the `Corresponding Frame(s)` column."""
+    df = pd.read_csv(Strategy_registry.resolve_data_path(dataset_path), encoding="ISO-8859-1")
+    index = {}
+    for event_type, frames in zip(df["EventType"], df["Corresponding Frame(s)"].fillna("")):
+        for frame in frames.split(","):
+            if frame.strip():
+                index.setdefault(normalize_frame(frame), set()).add(str(event_type).strip())
+    return index
+
+
+def event_edges_from_frames(frame_pairs, index):
+    edges = set()
+    for super_frame, sub_frame in frame_pairs:
+        for parent in index.get(normalize_frame(super_frame), ()):
+            for child in index.get(normalize_frame(sub_frame), ()):
+                if parent != child:
+                    edges.add((parent, child))
+    return sorted(edges)
+
+
+def build_verifier(labels, edges):
+    encoding = LabelEncoding(Ensemble.label_vocabularies())
+    names = list(dict.fromkeys(list(labels.index.str.strip()) + [n for edge in edges for n in edge]))
+    index = {name: i for i, name in enumerate(names)}
+    bits = np.zeros(len(names), dtype=np.uint16)
+    for event_type, row in labels.iterrows():
+        bits[index[event_type.strip()]] = encoding.encode_row(row.to_dict())
+    parents = np.array([index[p] for p, _ in edges], dtype=np.int64)
+    children = np.array([index[c] for _, c in edges], dtype=np.int64)
+    return HierarchyVerifier(names, parents, children, bits, encoding)
+
+
+# === Synthetic benchmark ===
+def benchmark(n_edges, seed=0):
+    rng = np.random.default_rng(seed)
+    n_nodes = max(n_edges // 2, 2)
+    encoding = LabelEncoding(Ensemble.label_vocabularies())
+    # Edges always point from a lower to a higher id, so the graph is a DAG.
+    a = rng.integers(0, n_nodes - 1, n_edges)
+    b = a + 1 + (rng.random(n_edges) * (n_nodes - 1 - a)).astype(np.int64)
+    bits = np.zeros(n_nodes, dtype=np.uint16)
+    for m, vocabulary in encoding.vocabularies.items():
+        choice = rng.integers(0, len(vocabulary), n_nodes)
+        bits |= np.array([encoding.bit[(m, label)] for label in vocabulary], dtype=np.uint16)[choice]
+    start = time.perf_counter()
+    verifier = HierarchyVerifier([f"E{i}" for i in range(n_nodes)], a, b, bits, encoding)
+    edges, _, nodes, _ = verifier.check()
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    node = int(rng.integers(0, n_nodes))
+    affected = verifier.update_labels({f"E{node}": {"TemporalExtent": "atomic"}})
+    verifier.check()
+    updated = time.perf_counter() - start
+    print(f"{n_nodes} types, {n_edges} edges, {verifier.level.max() + 1} levels: full verification {built:.2f}s "
+          f"({len(edges)} violating edges, {len(nodes)} inherited violations); relabelling one type "
+          f"re-propagated {affected} descendants in {updated:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check subsumption edges against meta-property inheritance rules.")
+    parser.add_argument("--labels", default="Human_annotated_dataset.csv", help="label table with EventType column")
+    parser.add_argument("--edges", help="Parent,Child CSV of event-type subsumption edges")
+    parser.add_argument("--frame-relations", help="FrameNet frRelation.xml or SuperFrame,SubFrame CSV")
+    parser.add_argument("--relation", default="Inheritance", help="frame relation type read from frRelation.xml")
+    parser.add_argument("--frames-from", default="Human_annotated_dataset.csv",
+                        help="dataset mapping EventType to `Corresponding Frame(s)`")
+    parser.add_argument("--output", default="hierarchy_violations.csv")
+    parser.add_argument("--benchmark", type=int, metavar="EDGES", help="time a random hierarchy of this many edges")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return
+    if not args.edges and not args.frame_relations:
+        parser.error("give --edges or --frame-relations")
+
+    labels = load_label_table(args.labels)
+    edges = []
+    if args.edges:
+        edges += load_edges(args.edges)
+    if args.frame_relations:
+        edges += event_edges_from_frames(load_frame_relations(args.frame_relations, args.relation),
+                                         frame_index(args.frames_from))
+    start = time.perf_counter()
+    verifier = build_verifier(labels, edges)
+    violations = verifier.verify()
+    elapsed = time.perf_counter() - start
+    print(f"Verified {len(edges)} edges over {len(verifier.event_types)} event types in {elapsed:.3f}s")
+    if len(violations):
+        print(violations.groupby(["kind", "property"]).size().to_string())
+    violations.to_csv(args.output, index=False)
+    print(f"{len(violations)} violations saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
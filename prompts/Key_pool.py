@@ -0,0 +1,294 @@
+"""Pool of API keys and endpoints, each with its own request and token limits.
+
+Llm_client sends each call through the key with the most headroom left in its
+requests-per-minute and tokens-per-minute buckets, so the aggregate throughput
+grows with the number of keys. A key that answers 429 is taken out of rotation
+for its Retry-After time (or an exponential back-off) and the call moves to
+another key, up to --key-pool-retries times per call before the 429 is raised
+as the scripts would see it. A key that fails authentication or has run out of
+quota (OpenAI's 429 "insufficient_quota") is benched for much longer. Per key
+utilisation (calls, tokens, share of its limits, errors) is reported at the end
+of a run.
+
+The pool file is a JSON list; secrets are best read from the environment:
+
+    [{"name": "main", "api_key_env": "OPENAI_API_KEY", "rpm": 200, "tpm": 40000},
+     {"name": "azure-eu", "api_key_env": "AZURE_OPENAI_KEY", "api_base": "https://eu.example.com/",
+      "api_type": "azure", "api_version": "2023-05-15", "rpm": 300}]
+
+    python Strategy_runner.py --strategy cot --key-pool keys.json
+    python Key_pool.py --keys 1 2 4 --rpm 600 --requests 100 --rate-limit-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+import pandas as pd
+
+
+# Keyword arguments legacy openai.ChatCompletion.create accepts per call.
+CREDENTIAL_FIELDS = ("api_key", "api_base", "api_type", "api_version", "organization")
+RATE_LIMIT_STATUS = (429,)
+AUTH_STATUS = (401, 403)
+
+
+def error_kind(error):
+    """'rate_limit', 'auth' or None for an exception raised by the backend (an exhausted quota counts as auth)."""
+    status = getattr(error, "http_status", None) or getattr(error, "status_code", None)
+    name = type(error).__name__
+    if getattr(error, "code", None) == "insufficient_quota" or "insufficient_quota" in str(error):
+        return "auth"
+    if status in RATE_LIMIT_STATUS or name == "RateLimitError":
+        return "rate_limit"
+    if status in AUTH_STATUS or name in ("AuthenticationError", "PermissionError", "PermissionDeniedError"):
+        return "auth"
+    return None
+
+
+def retry_after(error):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+# === Keys ===
+class PoolKey:
+    """One credential or endpoint: its buckets, its cooldown and its counters."""
+
+    def __init__(self, name, rpm, tpm=None, credentials=None):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.credentials = {k: v for k, v in (credentials or {}).items() if v}
+        self._requests = float(rpm)
+        self._tokens = float(tpm) if tpm else 0.0
+        self._updated = time.monotonic()
+        self.initial = (self._requests, self._tokens)
+        self.cooldown_until = 0.0
+        self.auth_failed = False
+        self.failures = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.rate_limited = 0
+        self.auth_errors = 0
+        self.errors = 0
+
+    @classmethod
+    def from_config(cls, entry, share=1.0):
+        credentials = {field: entry.get(field) for field in CREDENTIAL_FIELDS}
+        if entry.get("api_key_env"):
+            credentials["api_key"] = os.environ.get(entry["api_key_env"])
+            if not credentials["api_key"]:
+                raise ValueError(f"Key '{entry.get('name')}': environment variable {entry['api_key_env']} is not set")
+        tpm = entry.get("tpm")
+        return cls(entry.get("name") or entry.get("api_base") or "key", max(1, int(entry["rpm"] * share)),
+                   max(1, int(tpm * share)) if tpm else None, credentials)
+
+    def refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def headroom(self, tokens):
+        """Smallest fraction of a bucket left after the call, or None if it does not fit now."""
+        if self._requests < 1 or (self.tpm and self._tokens < tokens):
+            return None
+        left = (self._requests - 1) / self.rpm
+        if self.tpm:
+            left = min(left, (self._tokens - tokens) / self.tpm)
+        return left
+
+    def wait(self, tokens, now):
+        """Seconds until the call would fit."""
+        wait = max(self.cooldown_until - now, 0.0)
+        if self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+        return wait
+
+    def take(self, tokens):
+        self._requests -= 1
+        self._tokens -= tokens
+
+
+# === Pool ===
+class KeyPool:
+    """Routes calls to the key with the most headroom; see the module docstring."""
+
+    def __init__(self, keys, cooldown=20.0, max_cooldown=300.0, auth_cooldown=900.0, max_retries=8):
+        if not keys:
+            raise ValueError("A key pool needs at least one key")
+        self.keys = list(keys)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.auth_cooldown = auth_cooldown
+        self.max_retries = max_retries
+        self._condition = threading.Condition()
+        self._started = None
+
+    @classmethod
+    def from_file(cls, path, share=1.0, max_retries=8):
+        """Pool from a JSON list of keys; share scales every limit (for processes splitting the keys)."""
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        return cls([PoolKey.from_config(entry, share) for entry in entries], max_retries=max_retries)
+
+    def acquire(self, tokens=0):
+        """Block until some key can take the call; charge it and return it."""
+        with self._condition:
+            if self._started is None:
+                self._started = time.monotonic()
+                for key in self.keys:
+                    key.refill(self._started)
+                    key.initial = (key._requests, key._tokens)
+            while True:
+                now = time.monotonic()
+                if all(key.auth_failed and key.cooldown_until > now for key in self.keys):
+                    raise RuntimeError("Every key in the pool failed authentication")
+                best, best_headroom = None, None
+                for key in self.keys:
+                    key.refill(now)
+                    if key.cooldown_until > now:
+                        continue
+                    # A call larger than a whole token bucket fits once that bucket is full.
+                    headroom = key.headroom(min(tokens, key.tpm) if key.tpm else 0)
+                    if headroom is not None and (best is None or headroom > best_headroom):
+                        best, best_headroom = key, headroom
+                if best is not None:
+                    best.take(min(tokens, best.tpm) if best.tpm else 0)
+                    best.calls += 1
+                    return best
+                wait = min(key.wait(min(tokens, key.tpm) if key.tpm else 0, now) for key in self.keys)
+                self._condition.wait(max(wait, 0.001))
+
+    def release(self, key, result=None, error=None):
+        """Record the outcome of a call on key; errors that point at the key bench it."""
+        with self._condition:
+            if error is None:
+                key.failures = 0
+                key.auth_failed = False
+                if result:
+                    key.prompt_tokens += result.get("prompt_tokens", 0)
+                    key.completion_tokens += result.get("completion_tokens", 0)
+                return None
+            kind = error_kind(error)
+            if kind == "rate_limit":
+                key.rate_limited += 1
+                key.failures += 1
+                pause = retry_after(error) or min(self.cooldown * 2 ** min(key.failures - 1, 30), self.max_cooldown)
+                key.cooldown_until = time.monotonic() + pause
+            elif kind == "auth":
+                key.auth_errors += 1
+                key.auth_failed = True
+                key.cooldown_until = time.monotonic() + self.auth_cooldown
+            else:
+                key.errors += 1
+            self._condition.notify_all()
+            return kind
+
+    def call(self, send, tokens=0):
+        """send(key) on the best key; on 429 or auth errors try again on another key.
+
+        Other errors propagate unchanged, as they would without a pool. A call
+        that has been rate limited max_retries times raises its last 429. When
+        every key has failed authentication the last error is raised, and later
+        calls fail at once until a benched key is back.
+        """
+        rate_limited = 0
+        while True:
+            key = self.acquire(tokens)
+            try:
+                result = send(key)
+            except Exception as e:
+                kind = self.release(key, error=e)
+                rate_limited += kind == "rate_limit"
+                if (kind is None or (kind == "auth" and all(k.auth_failed for k in self.keys))
+                        or rate_limited > self.max_retries):
+                    raise
+                continue
+            self.release(key, result)
+            return result
+
+    # --- reporting ---
+    def utilisation(self):
+        minutes = (time.monotonic() - self._started) / 60.0 if self._started is not None else 0.0
+        now = time.monotonic()
+        rows = []
+        total = max(sum(key.calls for key in self.keys), 1)
+        for key in self.keys:
+            tokens = key.prompt_tokens + key.completion_tokens
+            rows.append({
+                "key": key.name, "calls": key.calls, "share": key.calls / total,
+                # Capacity so far: what the bucket held at the start plus the refill since.
+                "rpm_used": key.calls / max(key.initial[0] + key.rpm * minutes, 1.0),
+                "tpm_used": tokens / max(key.initial[1] + key.tpm * minutes, 1.0) if key.tpm else None,
+                "prompt_tokens": key.prompt_tokens, "completion_tokens": key.completion_tokens,
+                "rate_limited": key.rate_limited, "auth_errors": key.auth_errors, "errors": key.errors,
+                "cooling_down_s": round(max(key.cooldown_until - now, 0.0), 1)})
+        return pd.DataFrame(rows)
+
+    def summary(self):
+        table = self.utilisation()
+        return (f"Key pool: {table['calls'].sum()} calls over {len(self.keys)} keys\n"
+                + table.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+# === Throughput check ===
+class SimulatedRateLimit(Exception):
+    http_status = 429
+    headers = {}
+
+
+def simulate(num_keys, rpm, requests, latency, rate_limit_rate, concurrency, seed=0):
+    """Calls per second through a pool of num_keys simulated keys of rpm each."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = KeyPool([PoolKey(f"key{k}", rpm) for k in range(num_keys)], cooldown=1.0)
+    # Start from empty buckets, as in a busy run, so the first burst does not hide the limits.
+    for key in pool.keys:
+        key._requests = 0.0
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def send(key):
+        time.sleep(latency)
+        with lock:
+            limited = rng.random() < rate_limit_rate
+        if limited:
+            raise SimulatedRateLimit()
+        return {"prompt_tokens": 100, "completion_tokens": 5}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(lambda _: pool.call(send), range(requests)))
+    return requests / (time.perf_counter() - start), pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of a key pool with simulated keys.")
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 2, 4], help="pool sizes to compare")
+    parser.add_argument("--rpm", type=int, default=600, help="requests per minute of each simulated key")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per call")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    for num_keys in args.keys:
+        throughput, pool = simulate(num_keys, args.rpm, args.requests, args.latency, args.rate_limit_rate,
+                                    args.concurrency)
+        print(f"{num_keys} keys x {args.rpm} rpm: {throughput * 60:.0f} calls/min")
+        print(pool.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Post-hoc normalisation of raw label responses, without any API call.
+
+The scripts store whatever the model answered after .strip().lower(): bolded
+labels, "trivially homeomeric", trailing punctuation or a whole sentence. This
+maps every cell of an output file to a canonical label of its property:
+- markdown, quotes and trailing punctuation are stripped and whitespace is
+  collapsed; exact labels are then looked up directly;
+- otherwise one compiled pattern per property finds label words and their
+  aliases ("non-cumulative", "not agentive", "instantaneous", ...). The first
+  label in the text wins ("anti-cumulative, not cumulative" is anti-cumulative);
+- a negation right before the label ("is not homeomeric") gives the opposite
+  label;
+- answers that decline to classify ("cannot be determined") are unparseable.
+Cells that are still unparseable are set to "error", which Strategy_runner.py
+--resume queries again, and listed in the report. Matching runs once per
+distinct response with pandas string methods, so a file costs a few regex
+passes over its unique values.
+
+    python Label_normalizer.py 161_CoT_prompting.csv
+    python Label_normalizer.py 161_analogical.csv --output 161_analogical.csv --report analogical_requery.csv
+"""
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+import Online_accuracy
+import Strategy_registry
+
+
+UNPARSEABLE = "error"
+
+# Other spellings of each label; negated forms are handled by NEGATIONS.
+ALIASES = {
+    "anti-cumulative": ["anticumulative", "anti cumulative", "non-cumulative", "noncumulative", "non cumulative"],
+    "anti-homeomeric": ["antihomeomeric", "anti homeomeric", "non-homeomeric", "nonhomeomeric", "non homeomeric",
+                        "heteromeric"],
+    "atomic": ["instantaneous", "punctual", "momentary"],
+    "durative": ["durational", "non-atomic", "nonatomic"],
+    "non-agentive": ["nonagentive", "non agentive", "unagentive"],
+    "anti-agentive": ["antiagentive", "anti agentive"],
+}
+# Label meant by "not <label>".
+NEGATIONS = {
+    "cumulative": "anti-cumulative", "anti-cumulative": "cumulative",
+    "homeomeric": "anti-homeomeric", "anti-homeomeric": "homeomeric",
+    "durative": "atomic", "atomic": "durative",
+    "agentive": "non-agentive", "non-agentive": "agentive", "anti-agentive": "agentive",
+}
+NEGATION = r"(?:not|never|isn't|isn’t|rather than|instead of)\s+(?:an?\s+|purely\s+|strictly\s+)?"
+ABSTENTION = (r"cannot be (?:determined|classified)|can't be (?:determined|classified)|impossible to (?:determine|classify)"
+              r"|unable to (?:determine|classify)|not possible to (?:determine|classify)|insufficient information"
+              r"|does not (?:specify|provide)|not enough information|\bneither\b.*\bnor\b")
+
+
+# === Matching ===
+def clean(raw):
+    """Lower-case, strip markdown, quotes and trailing punctuation, and collapse whitespace."""
+    text = raw.astype(str).str.lower()
+    text = text.str.replace(r"[*_`#>\"“”‘]+", " ", regex=True)
+    text = text.str.replace(r"\s+", " ", regex=True).str.strip()
+    return text.str.strip(" .,;:!?'()[]{}-")
+
+
+class PropertyMatcher:
+    """Compiled alias and negation pattern for one property's vocabulary."""
+
+    def __init__(self, vocabulary):
+        self.vocabulary = list(vocabulary)
+        self.canonical = {label: label for label in self.vocabulary}
+        for label in self.vocabulary:
+            for alias in ALIASES.get(label, []):
+                self.canonical[alias] = label
+        self.negated = {form: NEGATIONS[label] for form, label in self.canonical.items()
+                        if NEGATIONS.get(label) in self.vocabulary}
+        # Longest forms first, so "anti-cumulative" is not read as "cumulative".
+        forms = sorted(self.canonical, key=len, reverse=True)
+        self.alternation = "|".join(re.escape(form).replace(r"\ ", r"\s+") for form in forms)
+        self.pattern = re.compile(rf"(?P<neg>\b{NEGATION})?(?<![\w-])(?P<form>{self.alternation})(?![\w-])")
+        self.abstention = re.compile(ABSTENTION)
+
+    def match(self, text):
+        """Canonical label per cleaned text (Series), NaN where nothing usable is found."""
+        exact = text.map(self.canonical)
+        todo = exact.isna()
+        if not todo.any():
+            return exact
+        found = text[todo].str.extract(self.pattern)
+        form = found["form"].str.replace(r"\s+", " ", regex=True)
+        label = form.map(self.canonical)
+        negated = found["neg"].notna()
+        label[negated] = form[negated].map(self.negated)
+        label[text[todo].str.contains(self.abstention)] = np.nan
+        exact[todo] = label
+        return exact
+
+
+def normalize_values(raw, matcher):
+    """(labels, status) for a Series of raw cells: status is exact, normalized, unparseable or empty."""
+    raw = pd.Series(raw, dtype=object)
+    empty = raw.isna() | (raw.astype(str).str.strip() == "")
+    codes, uniques = pd.factorize(raw.where(~empty, ""))
+    unique_text = clean(pd.Series(uniques, dtype=object))
+    unique_labels = matcher.match(unique_text).to_numpy(dtype=object)
+    labels = pd.Series(unique_labels[codes], index=raw.index, dtype=object)
+    exact = raw.astype(str).str.strip().str.lower().isin(matcher.vocabulary)
+    status = np.where(empty, "empty", np.where(exact, "exact", np.where(labels.notna(), "normalized", "unparseable")))
+    return labels, pd.Series(status, index=raw.index)
+
+
+def label_vocabularies():
+    strategy = Strategy_registry.load_strategy("direct")
+    return {m: strategy.allowed_labels(m) for m in strategy.meta_properties}
+
+
+def normalize_frame(frame, vocabularies=None, id_column=None):
+    """Normalise every prediction column of an output frame in place; returns the per-cell report."""
+    vocabularies = vocabularies or label_vocabularies()
+    id_column = id_column or next((c for c in ("EventType", "Event Type") if c in frame.columns), None)
+    reports = []
+    for m, column in Online_accuracy.prediction_columns(frame, list(vocabularies)).items():
+        labels, status = normalize_values(frame[column], PropertyMatcher(vocabularies[m]))
+        reports.append(pd.DataFrame({
+            "row": frame.index, "id": frame[id_column] if id_column else frame.index, "property": m,
+            "raw": frame[column], "label": labels.fillna(UNPARSEABLE), "status": status}))
+        keep = status == "empty"
+        frame[column] = labels.fillna(UNPARSEABLE).where(~keep, frame[column])
+    if not reports:
+        return pd.DataFrame(columns=["row", "id", "property", "raw", "label", "status"])
+    return pd.concat(reports, ignore_index=True)
+
+
+def summary(report):
+    return report.groupby(["property", "status"]).size().unstack(fill_value=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Map raw label responses in output files to canonical labels.")
+    parser.add_argument("outputs", nargs="+", help="output CSVs (looked up in Prompt_output/ if not found)")
+    parser.add_argument("--output", help="normalised file (one input only; default <name>_normalized.csv)")
+    parser.add_argument("--report", help="CSV of changed and unparseable cells (default <name>_normalization.csv)")
+    parser.add_argument("--dry-run", action="store_true", help="report only, write nothing")
+    args = parser.parse_args()
+    if args.output and len(args.outputs) > 1:
+        parser.error("--output needs a single input file")
+
+    vocabularies = label_vocabularies()
+    for name in args.outputs:
+        path = Strategy_registry.resolve_data_path(name)
+        frame = Strategy_registry.read_output(path)
+        report = normalize_frame(frame, vocabularies)
+        base = os.path.splitext(os.path.basename(path))[0]
+        print(f"{os.path.basename(path)}: {len(frame)} rows")
+        print(summary(report).to_string())
+        changed = report[report["status"].isin(["normalized", "unparseable"])]
+        for _, cell in changed.iterrows():
+            print(f"  {cell['id']} {cell['property']}: {str(cell['raw'])[:70]!r} -> {cell['label']}")
+        if args.dry_run:
+            continue
+        output = args.output or f"{base}_normalized.csv"
+        report_file = args.report or f"{base}_normalization.csv"
+        frame.to_csv(output, index=False)
+        changed.drop(columns="row").to_csv(report_file, index=False)
+        requery = (changed["status"] == "unparseable").sum()
+        print(f"Saved {output}; {len(changed)} changed cells ({requery} to re-query) listed in {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Compact in-memory labels for large runs.
+
+A LabelStore keeps one int8 code per (definition, property) in a NumPy array,
+with each property's vocabulary taken from the strategy's footer block, instead
+of Python strings in pandas object columns. Replies outside the vocabulary
+(free text, "error") keep their exact text in a small side table, so a store
+round-trips to the scripts' CSV layout unchanged. Justifications live in a
+separate JustificationStore that reads its source columns only when first used.
+
+    python Label_store.py --strategy cot --input 161_CoT_prompting.csv --rows 2000000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import Strategy_registry
+import Strategy_runner
+
+
+UNSET = -1
+OTHER = -2
+
+
+def vocabularies_of(strategy):
+    return {m: strategy.allowed_labels(m) for m in strategy.meta_properties}
+
+
+class LabelStore:
+    """int8 codes, one row per definition and one column per property."""
+
+    def __init__(self, vocabularies, keys=()):
+        self.meta_properties = list(vocabularies)
+        self.vocabularies = vocabularies
+        self._column = {m: j for j, m in enumerate(self.meta_properties)}
+        self._lookup = [{label: code for code, label in enumerate(vocabularies[m])} for m in self.meta_properties]
+        # Decoding table per property: vocabulary, then "" for UNSET (index -1) and a placeholder for OTHER (-2).
+        self._decode = [np.array(list(vocabularies[m]) + [None, ""], dtype=object) for m in self.meta_properties]
+        self.keys = []
+        self._row = {}
+        self.codes = np.full((0, len(self.meta_properties)), UNSET, dtype=np.int8)
+        self.other = {}
+        self.append(keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # --- rows ---
+    def append(self, keys):
+        """Add rows for definition keys (amortised growth, as a list would). A repeated key maps to its first row."""
+        keys = list(keys)
+        if not keys:
+            return
+        needed = len(self.keys) + len(keys)
+        if needed > len(self.codes):
+            grown = np.full((max(needed, 2 * len(self.codes)), len(self.meta_properties)), UNSET, dtype=np.int8)
+            grown[:len(self.keys)] = self.codes[:len(self.keys)]
+            self.codes = grown
+        for key in keys:
+            self._row.setdefault(key, len(self.keys))
+            self.keys.append(key)
+
+    def row_of(self, key):
+        return self._row[key]
+
+    # --- cells ---
+    def encode(self, meta_property, label):
+        if not isinstance(label, str) or label == "":
+            return UNSET
+        return self._lookup[self._column[meta_property]].get(label, OTHER)
+
+    def set(self, row, meta_property, label):
+        j = self._column[meta_property]
+        code = self.encode(meta_property, label)
+        self.codes[row, j] = code
+        if code == OTHER:
+            self.other[(row, j)] = label
+        else:
+            self.other.pop((row, j), None)
+
+    def get(self, row, meta_property):
+        j = self._column[meta_property]
+        code = self.codes[row, j]
+        if code == OTHER:
+            return self.other[(row, j)]
+        return self._decode[j][code]
+
+    def is_labelled(self, row, meta_property):
+        """Same rule as Strategy_runner.is_labelled: set and not "error"."""
+        j = self._column[meta_property]
+        code = self.codes[row, j]
+        return code >= 0 or (code == OTHER and self.other[(row, j)] != "error")
+
+    # --- columns ---
+    def set_column(self, meta_property, values):
+        j = self._column[meta_property]
+        labels = pd.Series(values, dtype=object)
+        codes = labels.map(self._lookup[j]).to_numpy(dtype=float)
+        empty = labels.map(lambda v: not isinstance(v, str) or v == "").to_numpy(dtype=bool)
+        codes = np.where(empty, UNSET, np.where(np.isnan(codes), OTHER, codes)).astype(np.int8)
+        self.codes[:len(codes), j] = codes
+        for row in np.flatnonzero(codes == OTHER):
+            self.other[(int(row), j)] = labels.iat[row]
+
+    def column(self, meta_property):
+        """Decoded labels of every row as an object array."""
+        j = self._column[meta_property]
+        codes = self.codes[:len(self.keys), j]
+        values = self._decode[j][codes]
+        for (row, column), text in self.other.items():
+            if column == j:
+                values[row] = text
+        return values
+
+    def labelled_mask(self):
+        """(rows, properties) bool array of labelled cells."""
+        mask = self.codes[:len(self.keys)] >= 0
+        for (row, j), text in self.other.items():
+            mask[row, j] = text != "error"
+        return mask
+
+    def memory_bytes(self):
+        return self.codes[:len(self.keys)].nbytes + sum(sys.getsizeof(t) for t in self.other.values())
+
+
+class JustificationStore:
+    """Sparse row -> text per property, read from its source columns only on first access."""
+
+    def __init__(self, meta_properties, source=None):
+        self.meta_properties = list(meta_properties)
+        self._source = source
+        self._texts = None
+
+    @property
+    def loaded(self):
+        return self._texts is not None
+
+    def _load(self):
+        if self._texts is None:
+            self._texts = {m: {} for m in self.meta_properties}
+            if self._source is not None:
+                for m in self.meta_properties:
+                    column = f"{m}Justification"
+                    if column in self._source.columns:
+                        for row, text in enumerate(self._source[column].to_numpy()):
+                            if isinstance(text, str) and text != "":
+                                self._texts[m][row] = text
+                self._source = None
+        return self._texts
+
+    def set(self, row, meta_property, text):
+        self._load()[meta_property][row] = text
+
+    def get(self, row, meta_property):
+        return self._load()[meta_property].get(row, "")
+
+    def column(self, meta_property, rows):
+        """Texts of every row; before first access, the source column as it was."""
+        column = f"{meta_property}Justification"
+        if self._texts is None and self._source is not None and column in self._source.columns:
+            return self._source[column].to_numpy()
+        values = np.full(rows, "", dtype=object)
+        for row, text in self._load()[meta_property].items():
+            values[row] = text
+        return values
+
+
+# === DataFrame bridge ===
+def from_frame(strategy, df):
+    """Store for df's rows (in file order), seeded with any labels df already holds."""
+    keys = [Strategy_runner.definition_key(e, d)
+            for e, d in zip(df[strategy.id_column], df[strategy.definition_column])]
+    store = LabelStore(vocabularies_of(strategy), keys)
+    for m in strategy.meta_properties:
+        if m in df.columns:
+            store.set_column(m, df[m].to_numpy())
+    # Its own copy of the justification columns, so the runner can drop them from df.
+    columns = [f"{m}Justification" for m in strategy.meta_properties if f"{m}Justification" in df.columns]
+    return store, JustificationStore(strategy.meta_properties, df[columns])
+
+
+def write_frame(store, justifications, df, layout=None):
+    """Copy the stores back into df's label (and, once touched, justification) columns.
+
+    Columns that were dropped from df go back to their position in layout, the
+    column order df had before.
+    """
+    values = {}
+    for m in store.meta_properties:
+        values[m] = store.column(m)
+        if justifications is not None and (justifications.loaded or f"{m}Justification" not in df.columns):
+            values[f"{m}Justification"] = justifications.column(m, len(df))
+    layout = layout or list(df.columns)
+    missing = [c for c in values if c not in df.columns]
+    for column in sorted(missing, key=lambda c: layout.index(c) if c in layout else len(layout)):
+        df.insert(min(layout.index(column), len(df.columns)) if column in layout else len(df.columns),
+                  column, values.pop(column))
+    for column, column_values in values.items():
+        df[column] = column_values
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the label store with object columns on a large copy.")
+    parser.add_argument("--strategy", default="cot")
+    parser.add_argument("--input", default="161_CoT_prompting.csv", help="labelled output to replicate")
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    strategy = Strategy_registry.load_strategy(args.strategy)
+    base = Strategy_registry.read_output(Strategy_registry.resolve_data_path(args.input))
+    df = base.iloc[np.arange(args.rows) % len(base)].reset_index(drop=True)
+    df[strategy.definition_column] = df[strategy.definition_column] + pd.Series(np.arange(args.rows)).astype(str)
+    frame_bytes = sum(df[m].memory_usage(deep=True, index=False) for m in strategy.meta_properties)
+
+    start = time.perf_counter()
+    store, _ = from_frame(strategy, df)
+    built = time.perf_counter() - start
+    rows = np.random.default_rng(0).integers(0, args.rows, 100000)
+    labels = [strategy.allowed_labels(m) for m in strategy.meta_properties]
+
+    start = time.perf_counter()
+    for k, row in enumerate(rows):
+        j = k % len(labels)
+        store.set(int(row), strategy.meta_properties[j], labels[j][k % len(labels[j])])
+    store_update = (time.perf_counter() - start) / len(rows)
+    start = time.perf_counter()
+    for k, row in enumerate(rows[:10000]):
+        j = k % len(labels)
+        df.at[int(row), strategy.meta_properties[j]] = labels[j][k % len(labels[j])]
+    frame_update = (time.perf_counter() - start) / 10000
+
+    print(f"{args.rows} rows x {len(strategy.meta_properties)} properties")
+    print(f"  object columns: {frame_bytes / 1e6:.1f} MB, {frame_update * 1e6:.1f} us per df.at update")
+    print(f"  label store:    {store.memory_bytes() / 1e6:.1f} MB, {store_update * 1e6:.1f} us per update "
+          f"(built in {built:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
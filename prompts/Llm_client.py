@@ -0,0 +1,618 @@
+"""Chat-completion client shared by the pipeline tools.
+
+Requests are the exact `openai.ChatCompletion.create` keyword arguments that
+Strategy_registry renders from the prompting scripts. The "openai" backend sends
+them unchanged; the "mock" backend answers offline with a deterministic valid
+label so runs can be rehearsed without an API key. An optional on-disk
+response cache and a shared rate limiter sit in front of either backend, and
+identical requests in flight at the same time are sent only once. With a
+Key_pool, each call goes out on the key or endpoint with the most headroom.
+With a Hedger, a call still outstanding after the observed p95 latency of its
+kind gets a duplicate and the first reply wins.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+import Cost_planner
+import Key_pool
+import Label_normalizer
+
+
+def request_key(request):
+    """Stable hash of a request (model, messages and decoding parameters)."""
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# === Offline backend ===
+_valid_answers = re.compile(r"Valid answers are one of:\s*\n-\s*([^\n]+)")
+_question_header = re.compile(r"^### Question (\d+)$", re.MULTILINE)
+
+
+def _mock_label(text, digest):
+    matches = _valid_answers.findall(text)
+    if not matches:
+        return None
+    labels = [label.strip() for label in matches[-1].split(",")]
+    return labels[digest % len(labels)]
+
+
+def mock_completion(request, latency=0.0):
+    prompt = request["messages"][-1]["content"]
+    digest = int(request_key(request)[:8], 16)
+    parts = _question_header.split(prompt)
+    if len(parts) > 1:
+        # Batched questions (Classification_service): answer each one in a JSON object.
+        answers = {}
+        for number, section in zip(parts[1::2], parts[2::2]):
+            answers[number] = _mock_label(section, digest + int(number)) or _mock_label(parts[0], digest + int(number))
+        content = json.dumps(answers)
+    else:
+        content = _mock_label(prompt, digest) or "Mock justification for offline runs."
+    if latency:
+        time.sleep(latency)
+    model = request.get("model", "gpt-4")
+    return {
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {
+            "prompt_tokens": Cost_planner.count_message_tokens(request["messages"], model),
+            "completion_tokens": Cost_planner.count_tokens(content, model),
+        },
+    }
+
+
+_filler = ("The definition describes the event at a level of abstraction where this reading is the most "
+           "natural one, and the remaining considerations do not change the classification.").split()
+
+
+def mock_stream(request, latency=0.0):
+    """Mock reply as a stream: the label, then an explanation that runs to max_tokens.
+
+    The latency is spread over max_tokens chunks, as a model that keeps talking would.
+    """
+    content = mock_completion(request)["choices"][0]["message"]["content"]
+    words = content.split(" ") + ["\n\nExplanation:"] + _filler * 10
+    chunks = [w if k == 0 else " " + w for k, w in enumerate(words)][:max(request.get("max_tokens", 20), 1)]
+    for chunk in chunks:
+        if latency:
+            time.sleep(latency / len(chunks))
+        yield chunk
+
+
+# === Streaming label matcher ===
+class LabelMatcher:
+    """Finds the first allowed label in text that arrives in pieces.
+
+    Labels are read as Label_normalizer reads a whole reply: at word boundaries
+    where hyphens are part of words, so "anti-cumulative" never yields
+    "cumulative"; with aliases; and with a negation right before a label giving
+    the opposite one ("is not cumulative" is anti-cumulative). A label is not
+    accepted until the next character (or the end of the stream) shows the word
+    is complete, and never from a reply that declines to classify: once a cue of
+    declining ("neither", "none", "cannot", ...) has arrived, the whole reply is
+    read and judged at the end, as a non-streamed reply would be.
+    """
+
+    ABSTENTION_CUE = re.compile(r"\b(?:neither|none|cannot|can't|can’t|unable|impossible|insufficient|not possible"
+                                r"|not enough|does not (?:specify|provide))\b")
+
+    def __init__(self, labels):
+        self.labels = sorted({label.lower() for label in labels}, key=len, reverse=True)
+        self._matcher = Label_normalizer.PropertyMatcher(self.labels)
+        self._complete = re.compile(rf"(?P<neg>\b{Label_normalizer.NEGATION})?(?<![\w-])"
+                                    rf"(?P<form>{self._matcher.alternation})(?=[^\w-])")
+        self.text = ""
+
+    def _label(self, pattern):
+        text = self.text.lower()
+        match = pattern.search(text)
+        if match is None or self._matcher.abstention.search(text):
+            return None
+        form = re.sub(r"\s+", " ", match.group("form"))
+        if match.group("neg"):
+            return self._matcher.negated.get(form)
+        return self._matcher.canonical[form]
+
+    def feed(self, chunk):
+        """Add a chunk; return the label once it is unambiguous, else None."""
+        self.text += chunk
+        if self.ABSTENTION_CUE.search(self.text.lower()):
+            return None
+        return self._label(self._complete)
+
+    def finish(self):
+        """At end of stream a label may end the text."""
+        return self._label(self._matcher.pattern)
+
+
+class StreamStats:
+    """Time to first label against total stream time, over all streamed calls."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.early_stops = 0
+        self.no_label = 0
+        self.first_label_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def record(self, first_label_latency, latency, stopped_early):
+        with self._lock:
+            self.streams += 1
+            self.early_stops += int(stopped_early)
+            if first_label_latency is None:
+                self.no_label += 1
+            else:
+                self.first_label_seconds += first_label_latency
+            self.total_seconds += latency
+
+    def summary(self):
+        labelled = max(self.streams - self.no_label, 1)
+        return (f"Streamed {self.streams} calls: {self.early_stops} cancelled at the first label, "
+                f"{self.no_label} without a label; mean time to first label "
+                f"{self.first_label_seconds / labelled:.3f}s, mean total {self.total_seconds / max(self.streams, 1):.3f}s")
+
+
+# === Response cache ===
+class ResponseCache:
+    """SQLite-backed map from request_key to response, safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, content TEXT, "
+            "prompt_tokens INTEGER, completion_tokens INTEGER, created_at REAL)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, prompt_tokens, completion_tokens FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"content": row[0], "prompt_tokens": row[1], "completion_tokens": row[2]}
+
+    def put(self, key, model, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, result["content"], result["prompt_tokens"], result["completion_tokens"], time.time()))
+            self._conn.commit()
+
+
+# === Single flight ===
+class SingleFlight:
+    """Shares one call between concurrent callers with the same key.
+
+    The first caller for a key runs the call; callers arriving while it is in
+    flight wait for its result (or its exception) instead of sending their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.calls = 0
+        self.hits = 0
+
+    def do(self, key, func):
+        """(result, shared): shared is True when another caller's call supplied the result."""
+        with self._lock:
+            future = self._pending.get(key)
+            leader = future is None
+            if leader:
+                future = self._pending[key] = Future()
+                self.calls += 1
+            else:
+                self.hits += 1
+        if not leader:
+            return future.result(), True
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def summary(self):
+        return (f"Coalesced {self.hits} of {self.calls + self.hits} requests into identical ones already "
+                f"in flight")
+
+
+# === Rate limiting ===
+class RateLimiter:
+    """Token buckets for requests per minute and tokens per minute, shared by all threads.
+
+    Either limit may be None; an unset limit never holds a call back.
+    """
+
+    def __init__(self, rpm, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm) if rpm else float("inf")
+        self._tokens = float(tpm) if tpm else 0.0
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _take(self, tokens):
+        self._refill()
+        if self._requests >= 1 and self._tokens >= tokens:
+            self._requests -= 1
+            self._tokens -= tokens
+            return True
+        return False
+
+    def acquire(self, tokens=0):
+        # A request larger than the whole bucket would never fit; let it through once the bucket is full.
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        with self._condition:
+            while True:
+                if self._take(tokens):
+                    return
+                wait = (1 - self._requests) * 60.0 / self.rpm if self._requests < 1 else 0.0
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+                self._condition.wait(max(wait, 0.001))
+
+    def try_acquire(self, tokens=0):
+        """Take a request slot only if one is free now."""
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        with self._condition:
+            return self._take(tokens)
+
+
+def request_token_estimate(request):
+    """Tokens a request counts against a TPM limit: prompt plus max_tokens."""
+    model = request.get("model", "gpt-4")
+    return Cost_planner.count_message_tokens(request["messages"], model) + request.get("max_tokens", 0)
+
+
+# === Hedging ===
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty sequence."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+class Hedger:
+    """When to send a duplicate of a slow call, and what hedging gained and cost.
+
+    Latencies are kept per kind of call (for example strategy and property),
+    over the last `window` replies. Once a kind has `min_samples`, a call that
+    has been outstanding longer than its `quantile` latency gets a duplicate,
+    as long as duplicates stay under `max_rate` of all calls. Each call's
+    primary request is timed to the end even when the duplicate wins, so the
+    report compares the p99 callers saw with the p99 they would have seen
+    without hedging.
+    """
+
+    def __init__(self, quantile=0.95, max_rate=0.05, min_samples=20, window=500):
+        self.quantile = quantile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.extra_cost = 0.0
+        self.observed = []
+        self.unhedged = []
+
+    def delay(self, kind):
+        """Seconds to wait before hedging a call of this kind, or None while there is too little history."""
+        with self._lock:
+            self.calls += 1
+            latencies = self._latencies.get(kind)
+            if latencies is None or len(latencies) < self.min_samples:
+                return None
+            return percentile(latencies, self.quantile)
+
+    def allow(self, reserve=None):
+        """Claim a duplicate if the extra-request cap (and reserve(), e.g. a free rate-limit slot) allows one."""
+        with self._lock:
+            if self.hedges + 1 > self.max_rate * self.calls or (reserve is not None and not reserve()):
+                return False
+            self.hedges += 1
+            return True
+
+    def record_latency(self, kind, latency):
+        with self._lock:
+            latencies = self._latencies.setdefault(kind, [])
+            latencies.append(latency)
+            del latencies[:-self.window]
+
+    def record_call(self, observed, hedge_won):
+        with self._lock:
+            self.observed.append(observed)
+            self.hedge_wins += int(hedge_won)
+
+    def record_primary(self, latency):
+        with self._lock:
+            self.unhedged.append(latency)
+
+    def record_extra(self, model, result):
+        """The losing request of a hedged call is paid for on top."""
+        cost = Cost_planner.estimate_cost(model, result["prompt_tokens"], result["completion_tokens"])
+        with self._lock:
+            self.extra_cost += cost
+
+    def summary(self):
+        with self._lock:
+            if not self.observed:
+                return "Hedging: no calls"
+            p99 = percentile(self.observed, 0.99)
+            base = percentile(self.unhedged, 0.99) if self.unhedged else p99
+            pending = len(self.observed) - len(self.unhedged)
+            return (f"Hedged {self.hedges} of {self.calls} calls ({self.hedges / max(self.calls, 1):.1%}, cap "
+                    f"{self.max_rate:.0%}), duplicate first in {self.hedge_wins}; p99 latency {p99:.3f}s vs "
+                    f"{base:.3f}s unhedged{f' ({pending} primaries still running)' if pending > 0 else ''}; "
+                    f"extra cost ${self.extra_cost:.4f}")
+
+    def stats(self):
+        with self._lock:
+            return {"hedges": self.hedges, "hedge_wins": self.hedge_wins, "hedge_extra_cost_usd": self.extra_cost,
+                    "p99_s": percentile(self.observed, 0.99) if self.observed else None,
+                    "p99_unhedged_s": percentile(self.unhedged, 0.99) if self.unhedged else None}
+
+
+def run_in_thread(func):
+    """Future of func() run on its own daemon thread, so an abandoned request never blocks a pool."""
+    future = Future()
+
+    def target():
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+class LlmClient:
+    def __init__(self, backend="openai", api_key=None, mock_latency=0.0, cache=None, rate_limiter=None, stream=False,
+                 coalesce=True, key_pool=None, hedger=None, mock_slow_rate=0.0, mock_slow_factor=10.0):
+        if backend not in ("openai", "mock"):
+            raise ValueError(f"Unknown backend '{backend}'")
+        self.backend = backend
+        self.mock_latency = mock_latency
+        self.mock_slow_rate = mock_slow_rate
+        self.mock_slow_factor = mock_slow_factor
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.stream = stream
+        self.stream_stats = StreamStats()
+        self.single_flight = SingleFlight() if coalesce else None
+        self.key_pool = key_pool
+        self.hedger = hedger
+        self._openai = None
+        if backend == "openai":
+            import openai
+            openai.api_key = api_key or os.environ.get("OPENAI_API_KEY", openai.api_key)
+            self._openai = openai
+
+    def complete(self, request, labels=None, hedge_key=None):
+        """Send one request and return content, token usage and latency. Errors propagate.
+
+        Cache hits come back with "cached": True and are not rate limited. A
+        request identical to one already in flight waits for that call and comes
+        back with "coalesced": True. When the client streams and the allowed
+        `labels` are given, the stream is cancelled at the first label, which
+        becomes the content, and the result also carries "first_label_latency".
+        With hedging, `hedge_key` names the kind of call whose latencies set the
+        hedging delay (default: the model), and a call that was duplicated comes
+        back with "hedged": True.
+        """
+        streaming = self.stream and bool(labels)
+        # A streamed reply is only the label, so it is keyed apart from full replies.
+        key = request_key(dict(request, stream_labels=sorted(labels)) if streaming else request)
+        if self.single_flight is None:
+            return self._complete(request, labels, streaming, key, hedge_key)
+        start = time.perf_counter()
+        result, shared = self.single_flight.do(key, lambda: self._complete(request, labels, streaming, key, hedge_key))
+        if shared:
+            return dict(result, latency=time.perf_counter() - start, coalesced=True)
+        return result
+
+    def _complete(self, request, labels, streaming, key, hedge_key=None):
+        if self.cache is not None:
+            start = time.perf_counter()
+            cached = self.cache.get(key)
+            if cached is not None:
+                return dict(cached, latency=time.perf_counter() - start, cached=True)
+        tokens = request_token_estimate(request)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(tokens)
+        if self.hedger is not None:
+            result = self._send_hedged(request, labels, streaming, tokens, hedge_key or request.get("model"))
+        else:
+            result = self._dispatch(request, labels, streaming, tokens)
+        if self.cache is not None:
+            self.cache.put(key, request.get("model"), result)
+        return result
+
+    def _dispatch(self, request, labels, streaming, tokens, cancel=None):
+        """One request on the backend, through the key pool if there is one."""
+        if streaming:
+            send = lambda pool_key: self._send_stream(request, labels, pool_key, cancel)
+        else:
+            send = lambda pool_key: self._send(request, pool_key)
+        if self.key_pool is not None:
+            return self.key_pool.call(send, tokens)
+        return send(None)
+
+    def _send_hedged(self, request, labels, streaming, tokens, kind):
+        """Send the request; if it outlives the kind's hedging delay, race a duplicate against it.
+
+        The loser is closed if it is a stream; a plain request cannot be aborted
+        mid-flight, so it is left to finish on its thread and its cost is counted.
+        """
+        hedger = self.hedger
+        model = request.get("model", "gpt-4")
+        start = time.perf_counter()
+        cancels = [threading.Event(), threading.Event()]
+
+        def attempt(index):
+            try:
+                result = self._dispatch(request, labels, streaming, tokens, cancels[index])
+                hedger.record_latency(kind, result["latency"])
+                return result
+            finally:
+                if index == 0:
+                    hedger.record_primary(time.perf_counter() - start)
+
+        def charge_loser(future):
+            if future.exception() is None:
+                hedger.record_extra(model, future.result())
+
+        futures = [run_in_thread(lambda: attempt(0))]
+        delay = hedger.delay(kind)
+        if delay is not None and not wait(futures, timeout=delay).done:
+            reserve = (lambda: self.rate_limiter.try_acquire(tokens)) if self.rate_limiter is not None else None
+            if hedger.allow(reserve):
+                futures.append(run_in_thread(lambda: attempt(1)))
+
+        winner = None
+        pending = set(futures)
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in futures if f in done and f.exception() is None), None)
+        if winner is None:
+            futures[0].result()
+        for index, future in enumerate(futures):
+            if future is not winner:
+                cancels[index].set()
+                future.add_done_callback(charge_loser)
+        latency = time.perf_counter() - start
+        hedger.record_call(latency, winner is not futures[0])
+        result = dict(winner.result(), latency=latency)
+        if len(futures) > 1:
+            result["hedged"] = True
+        return result
+
+    def _mock_delay(self):
+        """Mock latency, with an occasional slow call when a tail is simulated."""
+        if self.mock_slow_rate and random.random() < self.mock_slow_rate:
+            return self.mock_latency * self.mock_slow_factor
+        return self.mock_latency
+
+    def _send(self, request, key=None):
+        start = time.perf_counter()
+        if self.backend == "mock":
+            response = mock_completion(request, self._mock_delay())
+        else:
+            response = self._openai.ChatCompletion.create(**request, **(key.credentials if key else {}))
+        latency = time.perf_counter() - start
+        usage = response.get("usage") or {}
+        return {
+            "content": response["choices"][0]["message"]["content"],
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "latency": latency,
+            "cached": False,
+        }
+
+    def _send_stream(self, request, labels, key=None, cancel=None):
+        start = time.perf_counter()
+        if self.backend == "mock":
+            source = chunks = mock_stream(request, self._mock_delay())
+        else:
+            source = self._openai.ChatCompletion.create(**request, stream=True, **(key.credentials if key else {}))
+            chunks = (chunk["choices"][0].get("delta", {}).get("content") or "" for chunk in source)
+        matcher = LabelMatcher(labels)
+        label = None
+        for chunk in chunks:
+            if cancel is not None and cancel.is_set():
+                break
+            label = matcher.feed(chunk)
+            if label is not None:
+                break
+        first_label_latency = time.perf_counter() - start if label is not None else None
+        stopped_early = label is not None
+        # Closing the stream drops the HTTP connection, so no further tokens are generated.
+        if hasattr(source, "close"):
+            source.close()
+        if label is None:
+            label = matcher.finish()
+            if label is not None:
+                first_label_latency = time.perf_counter() - start
+        latency = time.perf_counter() - start
+        # A stream closed because its hedged twin answered first says nothing about time to first label.
+        if cancel is None or not cancel.is_set():
+            self.stream_stats.record(first_label_latency, latency, stopped_early)
+        model = request.get("model", "gpt-4")
+        return {
+            "content": label if label is not None else matcher.text,
+            "prompt_tokens": Cost_planner.count_message_tokens(request["messages"], model),
+            "completion_tokens": Cost_planner.count_tokens(matcher.text, model),
+            "latency": latency,
+            "first_label_latency": first_label_latency,
+            "cached": False,
+        }
+
+
+def add_client_arguments(parser):
+    parser.add_argument("--backend", choices=["openai", "mock"], default="openai",
+                        help="'mock' answers offline with deterministic valid labels")
+    parser.add_argument("--mock-latency", type=float, default=0.0, help="simulated seconds per mock call")
+    parser.add_argument("--mock-slow-rate", type=float, default=0.0,
+                        help="fraction of mock calls that take --mock-slow-factor times longer (a latency tail)")
+    parser.add_argument("--mock-slow-factor", type=float, default=10.0)
+    parser.add_argument("--cache", help="SQLite response cache file; identical requests are answered from it")
+    parser.add_argument("--rpm", type=int, help="shared requests-per-minute limit")
+    parser.add_argument("--tpm", type=int, help="shared tokens-per-minute limit")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream label replies and stop at the first valid label (stores the bare label)")
+    parser.add_argument("--no-coalesce", action="store_true",
+                        help="send identical concurrent requests separately instead of sharing one call")
+    parser.add_argument("--key-pool", help="JSON list of API keys/endpoints with their own rpm/tpm (see Key_pool.py)")
+    parser.add_argument("--key-pool-share", type=float, default=1.0,
+                        help="fraction of each pooled key's limits this process may use")
+    parser.add_argument("--key-pool-retries", type=int, default=8,
+                        help="429s a call may meet on pooled keys before the last one is raised")
+    parser.add_argument("--hedge", action="store_true",
+                        help="send a duplicate of calls outstanding past the p95 latency of their kind; first reply wins")
+    parser.add_argument("--hedge-quantile", type=float, default=0.95, help="latency quantile that triggers a duplicate")
+    parser.add_argument("--hedge-max-rate", type=float, default=0.05, help="cap on duplicates as a fraction of calls")
+    parser.add_argument("--hedge-min-samples", type=int, default=20,
+                        help="latencies of a kind of call needed before it is hedged")
+
+
+def client_from_args(args):
+    cache = ResponseCache(args.cache) if args.cache else None
+    limiter = RateLimiter(args.rpm, args.tpm) if args.rpm or args.tpm else None
+    key_pool = Key_pool.KeyPool.from_file(args.key_pool, args.key_pool_share,
+                                             args.key_pool_retries) if args.key_pool else None
+    hedger = Hedger(args.hedge_quantile, args.hedge_max_rate, args.hedge_min_samples) if args.hedge else None
+    return LlmClient(backend=args.backend, mock_latency=args.mock_latency, cache=cache, rate_limiter=limiter,
+                     stream=args.stream, coalesce=not args.no_coalesce, key_pool=key_pool, hedger=hedger,
+                     mock_slow_rate=args.mock_slow_rate, mock_slow_factor=args.mock_slow_factor)
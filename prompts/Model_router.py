@@ -0,0 +1,278 @@
+"""Per-property model routing learned from evaluation runs on the gold set.
+
+Every script asks gpt-4 for every property, although some properties are much
+easier than others. This derives a routing table that picks, for each
+(strategy, property), the cheapest model whose accuracy against
+Human_annotated_dataset.csv meets a target. The evidence is read from the
+tables the evaluation tools already write in the working folder:
+- Parameter_sweep.py tables (parameter_sweep*.csv), one row per configuration
+  with per-property accuracies; only rows that keep the script's own
+  temperature, top_p and max_tokens are used, since routing only swaps the model;
+- Pareto_benchmark.py tables (pareto_benchmark*.csv), one row per
+  (strategy, property).
+Results for the same (strategy, property, model) are pooled. A model needs at
+least --min-n gold cells, and with --conservative its Wilson lower bound rather
+than its accuracy must reach the target. Models are ranked by the price of the
+mean tokens of a cell, so the ranking does not depend on which tool measured
+them. When no model reaches the target the most accurate one is used and the
+route is marked below target.
+
+The table is saved as JSON together with a fingerprint of its sources, and
+whenever a source changes or a new one appears it is derived again, both here
+and in runs that route with --routes (checked once a minute).
+
+    python Model_router.py --target 0.8 --target Agentivity=0.7
+    python Strategy_runner.py --strategy direct --routes model_routes.json
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import Cost_planner
+import Online_accuracy
+import Strategy_registry
+
+
+DEFAULT_ROUTES = "model_routes.json"
+DEFAULT_SOURCES = ["parameter_sweep*.csv", "pareto_benchmark*.csv"]
+DECODING_PARAMETERS = ("temperature", "top_p", "max_tokens")
+
+
+# === Evidence ===
+def fingerprint(patterns):
+    """Sorted (path, size, mtime) of every file matching the source patterns."""
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    return [[path, os.path.getsize(path), os.path.getmtime(path)] for path in paths]
+
+
+def evidence_rows(path):
+    """(strategy, property, model, n, correct, prompt_tokens, completion_tokens) records of one table."""
+    frame = pd.read_csv(path)
+    if {"strategy", "model"} - set(frame.columns):
+        return []
+    records = []
+    if "property" in frame.columns:
+        # Pareto_benchmark: per property, always the script's own parameters.
+        for _, row in frame[frame["property"].isin(Strategy_registry.META_PROPERTIES)].iterrows():
+            records.append((row["strategy"], row["property"], row["model"], int(row["n"]),
+                            round(row["accuracy"] * row["n"]), row["prompt_tokens"] / max(row["n"], 1),
+                            row["completion_tokens"] / max(row["n"], 1)))
+        return records
+    # Parameter_sweep: one row per configuration, the properties side by side.
+    for _, row in frame.iterrows():
+        try:
+            params = Strategy_registry.load_strategy(row["strategy"]).params
+        except KeyError:
+            continue
+        if any(p in row and row[p] != params[p] for p in DECODING_PARAMETERS):
+            continue
+        properties = [m for m in Strategy_registry.META_PROPERTIES if pd.notna(row.get(f"{m}_accuracy"))]
+        calls = max(row["calls"], 1)
+        for m in properties:
+            # Older tables have no per-property counts: every definition got one call per property.
+            n = int(row[f"{m}_n"]) if f"{m}_n" in row else calls // len(properties)
+            records.append((row["strategy"], m, row["model"], n, round(row[f"{m}_accuracy"] * n),
+                            row["prompt_tokens"] / calls, row["completion_tokens"] / calls))
+    return records
+
+
+def pooled_evidence(paths):
+    columns = ["strategy", "property", "model", "n", "correct", "prompt_tokens", "completion_tokens"]
+    frame = pd.DataFrame([record for path in paths for record in evidence_rows(path)], columns=columns)
+    frame["prompt_tokens"] *= frame["n"]
+    frame["completion_tokens"] *= frame["n"]
+    return frame.groupby(["strategy", "property", "model"], as_index=False).sum()
+
+
+# === Routing ===
+def derive_routes(evidence, targets, min_n=20, conservative=False):
+    """{strategy: {property: route}} from pooled evidence; targets maps property (or None) to accuracy."""
+    routes = {}
+    for (name, m), group in evidence[evidence["n"] >= min_n].groupby(["strategy", "property"]):
+        target = targets.get(m, targets[None])
+        # One token profile per cell, priced for each model.
+        prompt_tokens = group["prompt_tokens"].sum() / group["n"].sum()
+        completion_tokens = group["completion_tokens"].sum() / group["n"].sum()
+        candidates = []
+        for _, row in group.iterrows():
+            accuracy = row["correct"] / row["n"]
+            low, _ = Online_accuracy.wilson_interval(row["correct"], row["n"])
+            candidates.append({
+                "model": row["model"], "accuracy": round(accuracy, 4), "accuracy_low": round(low, 4),
+                "n": int(row["n"]),
+                "cost_per_cell_usd": float(Cost_planner.estimate_cost(row["model"], prompt_tokens, completion_tokens))})
+        score = "accuracy_low" if conservative else "accuracy"
+        passing = [c for c in candidates if c[score] >= target]
+        if passing:
+            best = min(passing, key=lambda c: (c["cost_per_cell_usd"], -c[score]))
+        else:
+            best = max(candidates, key=lambda c: (c[score], -c["cost_per_cell_usd"]))
+        routes.setdefault(name, {})[m] = dict(best, target=target, meets_target=bool(passing),
+                                              candidates=len(candidates))
+    return routes
+
+
+class ModelRouter:
+    """Routing table on disk, derived again whenever its evaluation sources change."""
+
+    def __init__(self, path=DEFAULT_ROUTES, sources=None, targets=None, min_n=20, conservative=False,
+                 check_interval=60.0):
+        self.path = path
+        # Absolute patterns, so runs started from another folder watch the same tables.
+        self.sources = [os.path.abspath(pattern) for pattern in sources or DEFAULT_SOURCES]
+        self.targets = dict(targets or {None: 0.8})
+        self.min_n = min_n
+        self.conservative = conservative
+        self.check_interval = check_interval
+        self.table = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, check_interval=60.0):
+        """Router with the settings a saved table was derived with."""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No routing table at {path}; derive one with Model_router.py first")
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        targets = {None if k == "*" else k: v for k, v in table["targets"].items()}
+        router = cls(path, table["sources"], targets, table["min_n"], table["conservative"], check_interval)
+        router.table = table
+        return router
+
+    def settings(self):
+        return {"sources": self.sources, "targets": {"*" if k is None else k: v for k, v in self.targets.items()},
+                "min_n": self.min_n, "conservative": self.conservative}
+
+    def refresh(self, force=False):
+        """Derive and save the table if it is missing, stale or was derived with other settings."""
+        with self._lock:
+            self._checked = time.monotonic()
+            if self.table is None and os.path.exists(self.path):
+                with open(self.path, encoding="utf-8") as f:
+                    self.table = json.load(f)
+            current = fingerprint(self.sources)
+            settings = self.settings()
+            if not force and self.table is not None and self.table.get("fingerprint") == current and all(
+                    self.table.get(k) == v for k, v in settings.items()):
+                return False
+            if not current and self.table is not None and self.table.get("routes"):
+                # The evaluation tables are gone; keep the routes learned from them.
+                return False
+            evidence = pooled_evidence([path for path, _, _ in current])
+            routes = derive_routes(evidence, self.targets, self.min_n, self.conservative)
+            self.table = dict(settings, fingerprint=current, derived_at=datetime.now().isoformat(timespec="seconds"),
+                              routes=routes)
+            self._write()
+            return True
+
+    def _write(self):
+        """Replace the table file atomically; each writer has its own temporary file, since the shards of a
+        Sharded_run may derive the table at the same time."""
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(self.path) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.table, f, indent=1)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def model_for(self, strategy_name, meta_property):
+        """Routed model, or None to keep the script's own."""
+        if self.table is None or time.monotonic() - self._checked > self.check_interval:
+            if self.refresh():
+                print(f"Routing table {self.path} re-derived from new evaluation results")
+        route = self.table["routes"].get(strategy_name, {}).get(meta_property)
+        return route["model"] if route else None
+
+
+class RoutedStrategy:
+    """A Strategy whose requests use the routed model of each property; everything else is the script's."""
+
+    def __init__(self, strategy, router):
+        self._strategy = strategy
+        self.router = router
+
+    def __getattr__(self, name):
+        return getattr(self._strategy, name)
+
+    def _route(self, request, meta_property):
+        model = self.router.model_for(self._strategy.name, meta_property)
+        if model:
+            request["model"] = model
+        return request
+
+    def render_label_request(self, definition, meta_property):
+        return self._route(self._strategy.render_label_request(definition, meta_property), meta_property)
+
+    def render_justification_request(self, definition, meta_property, label):
+        return self._route(self._strategy.render_justification_request(definition, meta_property, label),
+                           meta_property)
+
+    def describe(self):
+        models = {m: self.router.model_for(self._strategy.name, m) or self._strategy.params["model"]
+                  for m in self._strategy.meta_properties}
+        return "Routing " + ", ".join(f"{m} -> {model}" for m, model in models.items())
+
+
+def add_arguments(parser):
+    parser.add_argument("--routes", help="use the per-property models of this routing table (see Model_router.py)")
+
+
+def route_from_args(args, strategy):
+    """The strategy itself, or wrapped in its routes when --routes is given."""
+    if not getattr(args, "routes", None):
+        return strategy
+    routed = RoutedStrategy(strategy, ModelRouter.from_file(args.routes))
+    print(routed.describe())
+    return routed
+
+
+def parse_target(value):
+    """'0.8' for every property, or 'Agentivity=0.7' for one."""
+    name, _, number = value.rpartition("=")
+    if name and name not in Strategy_registry.META_PROPERTIES:
+        raise argparse.ArgumentTypeError(f"unknown property '{name}'")
+    return name or None, float(number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derive per-(strategy, property) model routes from evaluation runs.")
+    parser.add_argument("--target", type=parse_target, action="append",
+                        help="accuracy to reach: 0.8 for all properties, or Property=0.7 (repeatable; default 0.8)")
+    parser.add_argument("--sources", nargs="+", default=DEFAULT_SOURCES, help="evaluation tables (glob patterns)")
+    parser.add_argument("--min-n", type=int, default=20, help="gold cells a model needs to be considered")
+    parser.add_argument("--conservative", action="store_true", help="require the Wilson lower bound to reach the target")
+    parser.add_argument("--output", default=DEFAULT_ROUTES)
+    args = parser.parse_args()
+
+    targets = {None: 0.8}
+    targets.update(dict(args.target or []))
+    router = ModelRouter(args.output, args.sources, targets, args.min_n, args.conservative)
+    router.refresh(force=True)
+    sources = router.table["fingerprint"]
+    print(f"{len(sources)} evaluation tables: {', '.join(path for path, _, _ in sources) or 'none found'}")
+    rows = []
+    for name, routes in router.table["routes"].items():
+        default = Strategy_registry.load_strategy(name).params["model"]
+        for m, route in routes.items():
+            rows.append({"strategy": name, "property": m, "script_model": default, "routed_model": route["model"],
+                         "accuracy": route["accuracy"], "accuracy_low": route["accuracy_low"], "n": route["n"],
+                         "target": route["target"], "meets_target": route["meets_target"],
+                         "usd_per_1k_cells": route["cost_per_cell_usd"] * 1000})
+    if rows:
+        print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"Routing table saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Online accuracy tracking with sequential early stopping.
+
+Gold labels come from the input itself (`TRUE_<property>` columns, as in
+Military_Strategic_CoT_prompting.csv) or from a separate gold file such as
+Human_annotated_dataset.csv. Accuracy and Wilson confidence intervals are
+updated after every label. With a reference strategy (its output file, or a
+fixed accuracy), a one-sided sequential probability ratio test flags the
+running strategy as soon as it is significantly worse, and --early-stop ends
+the run there.
+
+    python Strategy_runner.py --strategy analogical --gold Human_annotated_dataset.csv \\
+        --reference 161_CoT_prompting.csv --early-stop
+"""
+import math
+
+import pandas as pd
+
+import Strategy_registry
+
+
+Z_95 = 1.959963984540054
+
+
+def wilson_interval(correct, n, z=Z_95):
+    if n == 0:
+        return 0.0, 1.0
+    p = correct / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def normalize_gold(value):
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower()
+    return value or None
+
+
+# === Gold and reference alignment ===
+def _merge_columns(strategy, df, other):
+    if strategy.id_column in other.columns and strategy.definition_column in other.columns:
+        return [strategy.id_column, strategy.definition_column]
+    if strategy.id_column in other.columns:
+        return [strategy.id_column]
+    raise ValueError(f"Cannot align: '{strategy.id_column}' not in {list(other.columns)}")
+
+
+def align_labels(strategy, df, other, columns):
+    """Return a frame indexed like df holding `columns` of `other` (renamed to property names)."""
+    other = other.copy()
+    if strategy.id_column not in other.columns and "EventType" in other.columns:
+        other = other.rename(columns={"EventType": strategy.id_column})
+    keys = _merge_columns(strategy, df, other)
+    other = other.drop_duplicates(subset=keys)
+    selected = other[keys + list(columns.values())].rename(columns={v: k for k, v in columns.items()})
+    merged = df[keys].reset_index().merge(selected, on=keys, how="left").set_index("index")
+    return merged[list(columns)].map(normalize_gold)
+
+
+def gold_columns(frame, meta_properties):
+    """Map each property to its gold column: TRUE_<property> if present, else <property>."""
+    columns = {}
+    for meta_property in meta_properties:
+        if f"TRUE_{meta_property}" in frame.columns:
+            columns[meta_property] = f"TRUE_{meta_property}"
+        elif meta_property in frame.columns:
+            columns[meta_property] = meta_property
+    return columns
+
+
+def prediction_columns(frame, meta_properties):
+    """Map each property to its prediction column: <property>_LLM if present, else <property>."""
+    columns = {}
+    for meta_property in meta_properties:
+        if f"{meta_property}_LLM" in frame.columns:
+            columns[meta_property] = f"{meta_property}_LLM"
+        elif meta_property in frame.columns:
+            columns[meta_property] = meta_property
+    return columns
+
+
+def load_gold(strategy, df, gold_file=None):
+    """Gold labels aligned to df, from gold_file or from TRUE_* columns of df itself."""
+    if gold_file:
+        gold = pd.read_csv(Strategy_registry.resolve_data_path(gold_file), encoding="ISO-8859-1")
+        return align_labels(strategy, df, gold, gold_columns(gold, strategy.meta_properties))
+    columns = {m: f"TRUE_{m}" for m in strategy.meta_properties if f"TRUE_{m}" in df.columns}
+    if not columns:
+        return None
+    return df[list(columns.values())].rename(columns={v: k for k, v in columns.items()}).map(normalize_gold)
+
+
+def load_reference(strategy, df, reference_file):
+    reference = Strategy_registry.read_output(Strategy_registry.resolve_data_path(reference_file))
+    return align_labels(strategy, df, reference, prediction_columns(reference, strategy.meta_properties))
+
+
+# === Sequential test ===
+class SequentialTest:
+    """One-sided SPRT for 'the running strategy is worse by at least delta'.
+
+    Paired against a reference output, only discordant cells carry information:
+    under H0 the running strategy loses half of them, under H1 it loses 0.5 + delta.
+    Against a fixed reference accuracy p, each cell is a Bernoulli trial with
+    H0: accuracy p and H1: accuracy p - delta.
+
+    The likelihood ratio is a martingale under H0, so stopping the first time it
+    exceeds 1 / alpha keeps the false-stop rate below alpha however long the run
+    continues; there is no lower boundary because 'not worse' never stops a run.
+    """
+
+    def __init__(self, alpha=0.05, delta=0.15, reference_accuracy=None):
+        self.reference_accuracy = reference_accuracy
+        if reference_accuracy is None:
+            self.p0, self.p1 = 0.5, min(0.5 + delta, 0.99)
+        else:
+            # Probability of an error under each hypothesis.
+            self.p0, self.p1 = 1 - reference_accuracy, min(1 - reference_accuracy + delta, 0.99)
+        self.upper = math.log(1 / alpha)
+        self.llr = 0.0
+        self.observations = 0
+        self.decision = None
+
+    def update(self, correct, reference_correct=None):
+        if self.decision is not None:
+            return self.decision
+        if self.reference_accuracy is None:
+            if reference_correct is None or correct == reference_correct:
+                return None
+            loss = reference_correct and not correct
+        else:
+            loss = not correct
+        self.observations += 1
+        if loss:
+            self.llr += math.log(self.p1 / self.p0)
+        else:
+            self.llr += math.log((1 - self.p1) / (1 - self.p0))
+        if self.llr >= self.upper:
+            self.decision = "worse"
+        return self.decision
+
+
+# === Tracker ===
+class OnlineAccuracy:
+    def __init__(self, meta_properties, gold, reference=None, test=None, early_stop=False, report_every=10):
+        self.meta_properties = meta_properties
+        self.gold = gold
+        self.reference = reference
+        self.test = test
+        self.early_stop = early_stop
+        self.report_every = report_every
+        self.n = {m: 0 for m in meta_properties}
+        self.correct = {m: 0 for m in meta_properties}
+        self.reference_correct = {m: 0 for m in meta_properties}
+        self.stopped = False
+        self._rows_done = 0
+
+    def update(self, i, meta_property, label):
+        gold_label = self.gold.at[i, meta_property] if meta_property in self.gold.columns else None
+        # Unannotated rows come out of DataFrame.map as NaN, not None.
+        if pd.isna(gold_label):
+            return None
+        is_correct = label == gold_label
+        self.n[meta_property] += 1
+        self.correct[meta_property] += int(is_correct)
+        reference_correct = None
+        if self.reference is not None and meta_property in self.reference.columns:
+            reference_correct = self.reference.at[i, meta_property] == gold_label
+            self.reference_correct[meta_property] += int(reference_correct)
+        if self.test is not None:
+            return self.test.update(is_correct, reference_correct)
+        return None
+
+    def __call__(self, i, row, meta_property, label):
+        """Strategy_runner on_result hook; returns True to stop the run."""
+        decision = self.update(i, meta_property, label)
+        if meta_property == self.meta_properties[-1]:
+            self._rows_done += 1
+            if self.report_every and self._rows_done % self.report_every == 0:
+                print(self.format_line())
+        if decision == "worse" and self.early_stop and not self.stopped:
+            print(f"[Accuracy] Significantly worse than reference after {self.test.observations} "
+                  f"informative cells (LLR {self.test.llr:.2f} >= {self.test.upper:.2f}); stopping.")
+            self.stopped = True
+        return self.stopped
+
+    def accuracy(self, meta_property):
+        n = self.n[meta_property]
+        return (self.correct[meta_property] / n if n else float("nan")), wilson_interval(self.correct[meta_property], n)
+
+    def format_line(self):
+        parts = []
+        for m in self.meta_properties:
+            acc, (low, high) = self.accuracy(m)
+            parts.append(f"{m} {acc:.3f} [{low:.3f}, {high:.3f}]")
+        line = f"[Accuracy] n={max(self.n.values())} " + " | ".join(parts)
+        if self.test is not None:
+            line += f" | SPRT LLR {self.test.llr:.2f} ({self.test.decision or 'not significantly worse'})"
+        return line
+
+    def summary(self):
+        rows = []
+        for m in self.meta_properties:
+            acc, (low, high) = self.accuracy(m)
+            row = {"property": m, "n": self.n[m], "accuracy": acc, "ci_low": low, "ci_high": high}
+            if self.reference is not None:
+                row["reference_accuracy"] = self.reference_correct[m] / self.n[m] if self.n[m] else float("nan")
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+# === Runner integration ===
+def add_arguments(parser):
+    group = parser.add_argument_group("online accuracy")
+    group.add_argument("--gold", help="gold label CSV (default: TRUE_<property> columns of the input, if any)")
+    group.add_argument("--reference", help="output CSV of a reference strategy to compare against")
+    group.add_argument("--reference-accuracy", type=float, help="fixed reference accuracy instead of a reference file")
+    group.add_argument("--early-stop", action="store_true", help="stop once significantly worse than the reference")
+    group.add_argument("--alpha", type=float, default=0.05, help="SPRT false-stop rate")
+    group.add_argument("--delta", type=float, default=0.15, help="accuracy gap (or discordant loss excess) to detect")
+    group.add_argument("--report-every", type=int, default=10, help="print running accuracy every N rows")
+
+
+def tracker_from_args(args, strategy, df):
+    """Build an OnlineAccuracy hook from runner arguments, or None when no gold is available."""
+    gold = load_gold(strategy, df, args.gold)
+    if gold is None:
+        if args.reference or args.reference_accuracy is not None or args.early_stop:
+            raise ValueError("A reference or --early-stop needs gold labels (--gold or TRUE_* input columns)")
+        return None
+    reference = load_reference(strategy, df, args.reference) if args.reference else None
+    test = None
+    if reference is not None or args.reference_accuracy is not None:
+        test = SequentialTest(args.alpha, args.delta,
+                              reference_accuracy=None if reference is not None else args.reference_accuracy)
+    return OnlineAccuracy(strategy.meta_properties, gold, reference, test, args.early_stop, args.report_every)
@@ -0,0 +1,198 @@
+"""Model and decoding-parameter sweep for the prompting strategies.
+
+Each strategy script hard-codes its model and decoding parameters. This tool
+evaluates a grid (or a random subset of it) over model, temperature, top_p and
+max_tokens for each strategy on the gold set. All configurations run
+concurrently under one shared rate limit and share one response cache, so
+identical requests (for example the same configuration listed twice, or an
+overlap with an earlier sweep) are paid for once. The output is an
+accuracy-vs-cost table with one row per configuration.
+
+    python Parameter_sweep.py --strategy direct --strategy cot --model gpt-4 --model gpt-4o-mini \\
+        --temperature 0 0.2 0.7 --top-p 0.6 1.0 --limit 40 --rpm 500 --tpm 30000 --concurrency 16
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import Cost_planner
+import Llm_client
+import Online_accuracy
+import Strategy_registry
+import Subsample_eval
+
+
+DEFAULT_CACHE = "response_cache.sqlite"
+SWEEP_PARAMETERS = ("model", "temperature", "top_p", "max_tokens")
+
+
+# === Configurations ===
+def build_configurations(strategy, grid, search="grid", samples=None, seed=0):
+    """Expand the grid for one strategy; parameters left out keep the script's own value."""
+    base = strategy.params
+    values = [grid.get(name) or [base[name]] for name in SWEEP_PARAMETERS]
+    configs = []
+    seen = set()
+    for combination in itertools.product(*values):
+        config = dict(zip(SWEEP_PARAMETERS, combination))
+        key = tuple(sorted(config.items()))
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    if search == "random" and samples and samples < len(configs):
+        configs = random.Random(seed).sample(configs, samples)
+    return configs
+
+
+def config_label(strategy, config):
+    return (f"{strategy.name} model={config['model']} T={config['temperature']} "
+            f"top_p={config['top_p']} max_tokens={config['max_tokens']}")
+
+
+# === Execution ===
+class SweepStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows = {}
+
+    def record(self, config_id, meta_property, correct, response):
+        with self._lock:
+            row = self.rows[config_id]
+            row["calls"] += 1
+            row[f"{meta_property}_n"] += 1
+            row[f"{meta_property}_correct"] += int(correct)
+            if response is None:
+                row["errors"] += 1
+                return
+            row["prompt_tokens"] += response["prompt_tokens"]
+            row["completion_tokens"] += response["completion_tokens"]
+            row["latency_total"] += response["latency"]
+            if response["cached"]:
+                row["cache_hits"] += 1
+            elif response.get("coalesced"):
+                row["coalesced"] += 1
+            else:
+                row["billed_prompt_tokens"] += response["prompt_tokens"]
+                row["billed_completion_tokens"] += response["completion_tokens"]
+
+
+def run_cell(client, strategy, config, definition, meta_property):
+    request = strategy.render_label_request(definition, meta_property)
+    request.update(config)
+    try:
+        response = client.complete(request, hedge_key=(strategy.name, meta_property, request.get("model")))
+    except Exception as e:
+        print(f"[Label:{meta_property}] Error for {config_label(strategy, config)}: {e}")
+        return "error", None
+    return strategy.parse_label(response["content"]), response
+
+
+def sweep(strategies, grid, client, gold_file, input_file=None, limit=None, concurrency=8, search="grid",
+          samples=None, seed=0):
+    stats = SweepStats()
+    jobs = []
+    for strategy in strategies:
+        df = strategy.load_definitions(input_file or gold_file)
+        gold = Online_accuracy.load_gold(strategy, df, gold_file).dropna(how="all")
+        order = Subsample_eval.stratified_order(gold, seed)
+        if limit:
+            order = order[:limit]
+        for config in build_configurations(strategy, grid, search, samples, seed):
+            config_id = len(stats.rows)
+            stats.rows[config_id] = dict(
+                {"strategy": strategy.name}, **config, calls=0, errors=0, cache_hits=0, coalesced=0, prompt_tokens=0,
+                completion_tokens=0, billed_prompt_tokens=0, billed_completion_tokens=0, latency_total=0.0,
+                **{f"{m}_{k}": 0 for m in strategy.meta_properties for k in ("n", "correct")})
+            for i in order:
+                definition = df.at[i, strategy.definition_column]
+                for meta_property in strategy.meta_properties:
+                    if isinstance(gold.at[i, meta_property], str):
+                        jobs.append((config_id, strategy, config, definition, meta_property, gold.at[i, meta_property]))
+
+    # Interleave configurations so an interrupted sweep still has data for every one of them.
+    jobs.sort(key=lambda job: (job[3], job[4], job[0]))
+    print(f"Sweeping {len(stats.rows)} configurations, {len(jobs)} calls at concurrency {concurrency}")
+    start = time.perf_counter()
+
+    def work(job):
+        config_id, strategy, config, definition, meta_property, gold_label = job
+        label, response = run_cell(client, strategy, config, definition, meta_property)
+        stats.record(config_id, meta_property, label == gold_label, response)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for done, _ in enumerate(pool.map(work, jobs), 1):
+            if done % 200 == 0:
+                print(f"  {done}/{len(jobs)} calls, {time.perf_counter() - start:.1f}s")
+
+    return summarize(stats.rows.values())
+
+
+def summarize(rows):
+    table = []
+    for row in rows:
+        properties = [k[:-2] for k in row if k.endswith("_n") and row[k]]
+        out = {k: row[k] for k in ("strategy",) + SWEEP_PARAMETERS}
+        for m in properties:
+            out[f"{m}_accuracy"] = row[f"{m}_correct"] / row[f"{m}_n"]
+            out[f"{m}_n"] = row[f"{m}_n"]
+        out["mean_accuracy"] = sum(out[f"{m}_accuracy"] for m in properties) / max(len(properties), 1)
+        out["calls"] = row["calls"]
+        out["errors"] = row["errors"]
+        out["cache_hits"] = row["cache_hits"]
+        out["coalesced"] = row["coalesced"]
+        out["prompt_tokens"] = row["prompt_tokens"]
+        out["completion_tokens"] = row["completion_tokens"]
+        out["cost_usd"] = Cost_planner.estimate_cost(row["model"], row["prompt_tokens"], row["completion_tokens"])
+        out["billed_cost_usd"] = Cost_planner.estimate_cost(
+            row["model"], row["billed_prompt_tokens"], row["billed_completion_tokens"])
+        out["cost_per_1k_definitions_usd"] = out["cost_usd"] / max(row["calls"], 1) * len(properties) * 1000
+        out["mean_latency_s"] = row["latency_total"] / max(row["calls"] - row["errors"], 1)
+        table.append(out)
+    return pd.DataFrame(table).sort_values(["mean_accuracy", "cost_usd"], ascending=[False, True])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep models and decoding parameters per strategy.")
+    parser.add_argument("--strategy", action="append", required=True, help="strategy name, repeatable")
+    parser.add_argument("--gold", default=Subsample_eval.DEFAULT_GOLD, help="gold label CSV (also the input by default)")
+    parser.add_argument("--input", help="dataset CSV when it differs from the gold file")
+    parser.add_argument("--model", action="append", help="model to try, repeatable (default: the script's)")
+    parser.add_argument("--temperature", type=float, nargs="+")
+    parser.add_argument("--top-p", type=float, nargs="+")
+    parser.add_argument("--max-tokens", type=int, nargs="+")
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--samples", type=int, help="configurations per strategy for --search random")
+    parser.add_argument("--limit", type=int, help="use a stratified sample of this many gold definitions")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="parameter_sweep.csv")
+    Llm_client.add_client_arguments(parser)
+    parser.set_defaults(cache=DEFAULT_CACHE)
+    args = parser.parse_args()
+
+    grid = {"model": args.model, "temperature": args.temperature, "top_p": args.top_p, "max_tokens": args.max_tokens}
+    strategies = [Strategy_registry.load_strategy(name) for name in args.strategy]
+    client = Llm_client.client_from_args(args)
+    table = sweep(strategies, grid, client, args.gold, args.input, args.limit, args.concurrency, args.search,
+                  args.samples, args.seed)
+    table.to_csv(args.output, index=False)
+    columns = ["strategy", *SWEEP_PARAMETERS, "mean_accuracy", "cost_usd", "billed_cost_usd", "cache_hits", "coalesced"]
+    print(table[columns].to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    if client.cache is not None:
+        print(f"Cache: {client.cache.hits} hits, {client.cache.misses} misses ({client.cache.path})")
+    if client.single_flight is not None:
+        print(client.single_flight.summary())
+    if client.key_pool is not None:
+        print(client.key_pool.summary())
+    if client.hedger is not None:
+        print(client.hedger.summary())
+    print(f"Sweep table saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Accuracy-vs-cost benchmark of the prompting strategies, with Pareto frontiers.
+
+Runs each strategy's own requests (label, plus justification where the script
+asks for one) over the gold set through Llm_client. A response cache (default
+response_cache.sqlite) or the mock backend makes reruns repeatable. For every
+strategy and property it measures calls, prompt and completion tokens, latency
+and gold accuracy, and prices the tokens with Cost_planner. Per property (and
+"all": mean accuracy, summed cost) it reports the strategies on the
+accuracy-vs-cost Pareto frontier: those no other strategy beats on accuracy
+without costing more. A new prompt variant (a script path passed to --strategy)
+is worth keeping only if it lands on the frontier.
+
+Cached replies still count their tokens, so costs are those of a live run.
+Latency is averaged over uncached calls; when every call was cached it is
+estimated from Cost_planner's latency model.
+
+    python Pareto_benchmark.py --rpm 500 --concurrency 16
+    python Pareto_benchmark.py --strategy direct --strategy cot --strategy my_variant.py --backend mock --plot pareto.svg
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import Cost_planner
+import Llm_client
+import Online_accuracy
+import Parameter_sweep
+import Strategy_registry
+import Subsample_eval
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+except ImportError:
+    plt = None
+
+
+DEFAULT_STRATEGIES = ["direct", "cot", "fewshot", "analogical", "metacognitive", "selfgenerated"]
+
+
+# === Measurement ===
+class BenchmarkStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cells = {}
+
+    def record(self, strategy, meta_property, correct, responses):
+        with self._lock:
+            cell = self.cells.setdefault((strategy.name, meta_property), {
+                "model": strategy.params["model"], "n": 0, "correct": 0, "calls": 0, "errors": 0, "cached": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "latency_total": 0.0, "latency_calls": 0})
+            cell["n"] += 1
+            cell["correct"] += int(correct)
+            for response in responses:
+                cell["calls"] += 1
+                if response is None:
+                    cell["errors"] += 1
+                    continue
+                cell["prompt_tokens"] += response["prompt_tokens"]
+                cell["completion_tokens"] += response["completion_tokens"]
+                if response.get("cached") or response.get("coalesced"):
+                    cell["cached"] += 1
+                else:
+                    cell["latency_total"] += response["latency"]
+                    cell["latency_calls"] += 1
+
+
+def run_cell(client, strategy, definition, meta_property):
+    """The script's calls for one cell: (label, [responses]); a failed call is None."""
+    label, response = Parameter_sweep.run_cell(client, strategy, {}, definition, meta_property)
+    responses = [response]
+    if strategy.uses_justification:
+        try:
+            request = strategy.render_justification_request(definition, meta_property, label)
+            responses.append(client.complete(request, hedge_key=(strategy.name, meta_property, "justification")))
+        except Exception as e:
+            print(f"[Justification:{meta_property}] Error for {strategy.name}: {e}")
+            responses.append(None)
+    return label, responses
+
+
+def benchmark(strategies, client, gold_file, limit=None, concurrency=8, seed=0):
+    stats = BenchmarkStats()
+    jobs = []
+    for strategy in strategies:
+        df = strategy.load_definitions(gold_file)
+        gold = Online_accuracy.load_gold(strategy, df, gold_file).dropna(how="all")
+        order = Subsample_eval.stratified_order(gold, seed)
+        if limit:
+            order = order[:limit]
+        for i in order:
+            for m in strategy.meta_properties:
+                if isinstance(gold.at[i, m], str):
+                    jobs.append((strategy, df.at[i, strategy.definition_column], m, gold.at[i, m]))
+    print(f"Benchmarking {len(strategies)} strategies: {len(jobs)} cells at concurrency {concurrency}")
+    start = time.perf_counter()
+
+    def work(job):
+        strategy, definition, m, gold_label = job
+        label, responses = run_cell(client, strategy, definition, m)
+        stats.record(strategy, m, label == gold_label, responses)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for done, _ in enumerate(pool.map(work, jobs), 1):
+            if done % 500 == 0:
+                print(f"  {done}/{len(jobs)} cells, {time.perf_counter() - start:.1f}s")
+    return measurements(stats.cells)
+
+
+def measurements(cells):
+    """One row per (strategy, property) plus an "all" row per strategy."""
+    rows = []
+    for (name, m), cell in cells.items():
+        calls = max(cell["calls"] - cell["errors"], 1)
+        if cell["latency_calls"]:
+            latency, source = cell["latency_total"] / cell["latency_calls"], "measured"
+        else:
+            latency = Cost_planner.estimate_latency(cell["model"], cell["completion_tokens"] / calls)
+            source = "estimated"
+        cost = Cost_planner.estimate_cost(cell["model"], cell["prompt_tokens"], cell["completion_tokens"])
+        rows.append({"strategy": name, "property": m, "model": cell["model"], "n": cell["n"],
+                     "accuracy": cell["correct"] / max(cell["n"], 1), "calls": cell["calls"],
+                     "errors": cell["errors"], "cached": cell["cached"], "prompt_tokens": cell["prompt_tokens"],
+                     "completion_tokens": cell["completion_tokens"], "cost_usd": cost,
+                     "cost_per_1k_definitions_usd": cost / max(cell["n"], 1) * 1000,
+                     "calls_per_definition": cell["calls"] / max(cell["n"], 1),
+                     "mean_latency_s": latency, "latency_source": source})
+    table = pd.DataFrame(rows)
+    totals = table.groupby("strategy").agg(
+        model=("model", "first"), n=("n", "max"), accuracy=("accuracy", "mean"), calls=("calls", "sum"),
+        errors=("errors", "sum"), cached=("cached", "sum"), prompt_tokens=("prompt_tokens", "sum"),
+        completion_tokens=("completion_tokens", "sum"), cost_usd=("cost_usd", "sum"),
+        cost_per_1k_definitions_usd=("cost_per_1k_definitions_usd", "sum"),
+        calls_per_definition=("calls_per_definition", "sum"), mean_latency_s=("mean_latency_s", "mean"),
+        latency_source=("latency_source", lambda s: "measured" if (s == "measured").all() else "estimated"))
+    totals = totals.reset_index().assign(property="all")
+    table = pd.concat([table, totals[table.columns]], ignore_index=True)
+    order = {m: k for k, m in enumerate(Strategy_registry.META_PROPERTIES + ["all"])}
+    return table.sort_values("property", key=lambda p: p.map(order).fillna(len(order)), kind="stable")
+
+
+# === Frontier ===
+def pareto_mask(cost, accuracy):
+    """True for points no other point dominates (cost <= and accuracy >=, one of them strictly)."""
+    cost = np.asarray(cost, dtype=float)[:, None]
+    accuracy = np.asarray(accuracy, dtype=float)[:, None]
+    dominated = ((cost.T <= cost) & (accuracy.T >= accuracy) & ((cost.T < cost) | (accuracy.T > accuracy))).any(axis=1)
+    return ~dominated
+
+
+def frontier_report(table):
+    report = {}
+    for m, group in table.groupby("property", sort=False):
+        group = group.sort_values("cost_per_1k_definitions_usd")
+        mask = pareto_mask(group["cost_per_1k_definitions_usd"], group["accuracy"])
+        points = group.assign(on_frontier=mask).to_dict(orient="records")
+        report[m] = {"frontier": group.loc[mask, "strategy"].tolist(), "points": points}
+    return report
+
+
+# === Plot ===
+def plot(report, path):
+    if plt is not None:
+        properties = list(report)
+        fig, axes = plt.subplots(1, len(properties), figsize=(4.2 * len(properties), 4), squeeze=False)
+        for ax, m in zip(axes[0], properties):
+            points = report[m]["points"]
+            frontier = [p for p in points if p["on_frontier"]]
+            ax.scatter([p["cost_per_1k_definitions_usd"] for p in points], [p["accuracy"] for p in points],
+                       c=["tab:red" if p["on_frontier"] else "tab:gray" for p in points])
+            ax.plot([p["cost_per_1k_definitions_usd"] for p in frontier], [p["accuracy"] for p in frontier],
+                    color="tab:red", linewidth=1)
+            for p in points:
+                ax.annotate(p["strategy"], (p["cost_per_1k_definitions_usd"], p["accuracy"]), fontsize=7)
+            ax.set_title(m)
+            ax.set_xlabel("USD per 1k definitions")
+        axes[0][0].set_ylabel("accuracy")
+        fig.tight_layout()
+        fig.savefig(path)
+        return True
+    if path.endswith(".svg"):
+        write_svg(report, path)
+        return True
+    return False
+
+
+def write_svg(report, path, width=300, height=260, margin=40):
+    """Dependency-free scatter per property, one panel each, frontier in red."""
+    parts = []
+    for k, (m, entry) in enumerate(report.items()):
+        points = entry["points"]
+        x0 = k * width
+        costs = [p["cost_per_1k_definitions_usd"] for p in points]
+        accuracies = [p["accuracy"] for p in points]
+        cx = lambda v: x0 + margin + (v - min(costs)) / ((max(costs) - min(costs)) or 1) * (width - 2 * margin)
+        cy = lambda v: height - margin - (v - min(accuracies)) / ((max(accuracies) - min(accuracies)) or 1) * (
+            height - 2 * margin)
+        parts.append(f'<text x="{x0 + width / 2}" y="16" text-anchor="middle" font-size="13">{m}</text>')
+        parts.append(f'<text x="{x0 + width / 2}" y="{height - 8}" text-anchor="middle" font-size="10">'
+                     f'USD per 1k definitions ({min(costs):.3g}-{max(costs):.3g})</text>')
+        parts.append(f'<text x="{x0 + 4}" y="{height / 2}" font-size="10">acc {min(accuracies):.2f}-'
+                     f'{max(accuracies):.2f}</text>')
+        frontier = [p for p in points if p["on_frontier"]]
+        line = " ".join(f"{cx(p['cost_per_1k_definitions_usd']):.1f},{cy(p['accuracy']):.1f}" for p in frontier)
+        parts.append(f'<polyline points="{line}" fill="none" stroke="#d62728"/>')
+        for p in points:
+            x, y = cx(p["cost_per_1k_definitions_usd"]), cy(p["accuracy"])
+            colour = "#d62728" if p["on_frontier"] else "#888888"
+            parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="4" fill="{colour}"/>')
+            parts.append(f'<text x="{x + 5:.1f}" y="{y - 5:.1f}" font-size="9">{p["strategy"]}</text>')
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width * len(report)}" height="{height}" '
+                f'font-family="sans-serif">\n' + "\n".join(parts) + "\n</svg>\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy-vs-cost Pareto benchmark of the prompting strategies.")
+    parser.add_argument("--strategy", action="append", help="strategy name or script path, repeatable "
+                        f"(default: {', '.join(DEFAULT_STRATEGIES)})")
+    parser.add_argument("--gold", default=Subsample_eval.DEFAULT_GOLD, help="gold label CSV, also the input")
+    parser.add_argument("--limit", type=int, help="stratified sample of this many definitions per strategy")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="pareto_benchmark.json")
+    parser.add_argument("--table", default="pareto_benchmark.csv", help="per strategy and property measurements")
+    parser.add_argument("--plot", help="plot file (any matplotlib format; .svg also works without matplotlib)")
+    Llm_client.add_client_arguments(parser)
+    parser.set_defaults(cache=Parameter_sweep.DEFAULT_CACHE)
+    args = parser.parse_args()
+
+    strategies = [Strategy_registry.load_strategy(name) for name in args.strategy or DEFAULT_STRATEGIES]
+    client = Llm_client.client_from_args(args)
+    table = benchmark(strategies, client, args.gold, args.limit, args.concurrency, args.seed)
+    table.to_csv(args.table, index=False)
+    report = frontier_report(table)
+    summary = {"gold": args.gold, "backend": args.backend, "properties": report}
+    if client.hedger is not None:
+        # Costs in the table are the winning replies'; the duplicates' extra cost is reported here.
+        summary["hedging"] = client.hedger.stats()
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, default=float)
+
+    for m, entry in report.items():
+        print(f"{m}: frontier {' < '.join(entry['frontier'])}")
+    columns = ["strategy", "accuracy", "cost_per_1k_definitions_usd", "calls_per_definition", "mean_latency_s"]
+    print(table[table["property"] == "all"][columns].sort_values("cost_per_1k_definitions_usd")
+          .to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    if client.hedger is not None:
+        print(client.hedger.summary())
+    print(f"Report saved to {args.output}, measurements to {args.table}")
+    if args.plot:
+        if plot(report, args.plot):
+            print(f"Plot saved to {args.plot}")
+        else:
+            print("matplotlib is not installed; use a .svg plot path or pip install matplotlib")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""Per-stage profiler for the classification scripts and Strategy_runner.
+
+Times every pipeline stage per row and property without editing the code it
+profiles: CSV load and dedup, prompt construction, the API call, response
+handling, the per-row `to_csv`, and `time.sleep`. Stage times are exclusive
+(a prompt built inside a query function is not also counted as query time).
+Optionally a sampling profiler runs alongside and writes folded stacks and an
+SVG flamegraph, each stack rooted at the stage it was sampled in.
+
+Strategy scripts run unmodified with the `openai` module answered by
+Llm_client (use --backend mock offline); inputs are resolved like the other
+tools and outputs can be redirected. Anything else (Strategy_runner.py, or any
+tool with a main()) runs with the arguments given after `--`.
+
+    python Pipeline_profiler.py Direct_prompting.py --backend mock --skip-sleep --output-dir /tmp/profile
+    python Pipeline_profiler.py --sample --flamegraph runner.svg Strategy_runner.py -- --strategy cot --backend mock
+"""
+import argparse
+import ast
+import os
+import sys
+import threading
+import time
+import types
+from collections import Counter, defaultdict
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+import Label_store
+import Llm_client
+import Strategy_registry
+import Strategy_runner
+
+
+# Stages that belong to a row (or the whole run) rather than to one property.
+ROW_STAGES = {"load", "save", "store"}
+
+
+# === Stage timing ===
+class StageTimer:
+    """Exclusive time per (row, property, stage), with a stage stack per thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.cells = defaultdict(float)
+        self.calls = Counter()
+        self.row = 0
+        self.meta_property = ""
+        self._last_definition = None
+        self.current_stage = {}
+        self.skipped_sleep = 0.0
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def enter_row(self, definition, meta_property):
+        if definition != self._last_definition:
+            if self._last_definition is not None:
+                self.row += 1
+            self._last_definition = definition
+        self.meta_property = meta_property
+
+    def wrap(self, stage, func, context=False):
+        """Time `func` as `stage`; with context, its (definition, meta_property) arguments set row and property."""
+        timer = self
+
+        def timed(*args, **kwargs):
+            if context:
+                timer.enter_row(*_query_context(args))
+            stack = timer._stack()
+            stack.append([stage, 0.0])
+            timer.current_stage[threading.get_ident()] = stage
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _, children = stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+                timer.current_stage[threading.get_ident()] = stack[-1][0] if stack else "loop"
+                with timer._lock:
+                    meta_property = "" if stage in ROW_STAGES else timer.meta_property
+                    timer.cells[(timer.row, meta_property, stage)] += elapsed - children
+                    timer.calls[stage] += 1
+
+        timed.__wrapped__ = func
+        return timed
+
+    def frame(self):
+        rows = [{"row": r, "property": m, "stage": s, "seconds": v} for (r, m, s), v in self.cells.items()]
+        return pd.DataFrame(rows, columns=["row", "property", "stage", "seconds"])
+
+    def breakdown(self, wall):
+        cells = self.frame()
+        table = cells.groupby("stage")["seconds"].sum().to_frame("seconds")
+        table.loc["other (loop, bookkeeping)"] = max(wall - table["seconds"].sum(), 0.0)
+        table["calls"] = [self.calls.get(stage, 0) for stage in table.index]
+        table["mean_ms"] = table["seconds"] / table["calls"].where(table["calls"] > 0) * 1000
+        table["share"] = table["seconds"] / wall if wall else 0.0
+        return table.sort_values("seconds", ascending=False)
+
+
+def _query_context(args):
+    """(definition, meta_property) from a query call: script functions take them first, runner ones last."""
+    strings = [a for a in args if isinstance(a, str)]
+    return (strings + ["", ""])[:2]
+
+
+# === Sampling profiler ===
+class SamplingProfiler:
+    """Samples the profiled thread's stack at a fixed interval and folds identical stacks."""
+
+    def __init__(self, timer, interval=0.005, thread_id=None):
+        self.timer = timer
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        # Event.wait, not time.sleep: the profiled run may have time.sleep patched.
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stage = self.timer.current_stage.get(self.thread_id, "loop")
+            self.stacks[";".join([f"[{stage}]"] + names[::-1])] += 1
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def write_svg(self, path, width=1200, row_height=16):
+        """A plain SVG flamegraph (hover a box for its frame and sample count)."""
+        tree = {"children": {}, "count": 0}
+        for stack, count in self.stacks.items():
+            node = tree
+            node["count"] += count
+            for name in stack.split(";"):
+                node = node["children"].setdefault(name, {"children": {}, "count": 0})
+                node["count"] += count
+        total = max(tree["count"], 1)
+        boxes = []
+
+        def place(node, x, depth):
+            for name, child in sorted(node["children"].items()):
+                w = child["count"] / total * width
+                if w >= 0.5:
+                    boxes.append((x, depth, w, name, child["count"]))
+                    place(child, x, depth + 1)
+                x += w
+
+        place(tree, 0.0, 0)
+        height = (max((b[1] for b in boxes), default=0) + 2) * row_height
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                    f'font-family="monospace" font-size="11">\n')
+            for x, depth, w, name, count in boxes:
+                y = height - (depth + 1) * row_height
+                hue = 10 + (sum(map(ord, name)) % 40)
+                label = escape(name)
+                f.write(f'<g><title>{label} ({count} samples, {count / total:.1%})</title>'
+                        f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" '
+                        f'fill="hsl({hue},90%,60%)"/>')
+                if w > 40:
+                    f.write(f'<text x="{x + 3:.1f}" y="{y + row_height - 4}">{escape(name[:int(w / 7)])}</text>')
+                f.write("</g>\n")
+            f.write("</svg>\n")
+
+
+# === Instrumentation ===
+class Patches:
+    """setattr with automatic restore."""
+
+    def __init__(self):
+        self._saved = []
+
+    def set(self, owner, name, value):
+        # Class attributes are saved raw so staticmethods come back as staticmethods.
+        original = owner.__dict__[name] if isinstance(owner, type) and name in owner.__dict__ else getattr(owner, name)
+        self._saved.append((owner, name, original))
+        setattr(owner, name, value)
+
+    def restore(self):
+        for owner, name, value in reversed(self._saved):
+            setattr(owner, name, value)
+        self._saved = []
+
+
+def instrument_common(timer, patches, skip_sleep=False, input_file=None, output_dir=None, limit=None):
+    """Stages shared by scripts and tools: CSV load and dedup, to_csv, sleep."""
+    read_csv = pd.read_csv
+    first_read = [True]
+
+    def load(path, *args, **kwargs):
+        if isinstance(path, str):
+            if first_read[0] and input_file:
+                path = input_file
+            path = Strategy_registry.resolve_data_path(path)
+        first_read[0] = False
+        return read_csv(path, *args, **kwargs)
+
+    to_csv = pd.DataFrame.to_csv
+
+    def save(df, path=None, *args, **kwargs):
+        if output_dir and isinstance(path, str):
+            path = os.path.join(output_dir, os.path.basename(path))
+        return to_csv(df, path, *args, **kwargs)
+
+    real_sleep = time.sleep
+
+    def pause(seconds):
+        if skip_sleep:
+            timer.skipped_sleep += seconds
+            return
+        real_sleep(seconds)
+
+    timed_pause = timer.wrap("sleep", pause)
+
+    def sleep(seconds):
+        # Simulated mock latency is part of the call it belongs to, never skipped.
+        if os.path.basename(sys._getframe(1).f_code.co_filename) == "Llm_client.py":
+            return real_sleep(seconds)
+        return timed_pause(seconds)
+
+    drop_duplicates = pd.DataFrame.drop_duplicates
+
+    def dedupe(df, *args, **kwargs):
+        result = drop_duplicates(df, *args, **kwargs)
+        return result.head(limit) if limit and result is not None else result
+
+    patches.set(pd, "read_csv", timer.wrap("load", load))
+    patches.set(pd.DataFrame, "drop_duplicates", timer.wrap("load", dedupe))
+    patches.set(pd.DataFrame, "to_csv", timer.wrap("save", save))
+    patches.set(time, "sleep", sleep)
+
+
+def instrument_tools(timer, patches):
+    """Stages of Strategy_runner and the tools built on it."""
+    Strategy = Strategy_registry.Strategy
+    patches.set(Strategy, "load_definitions", timer.wrap("load", Strategy.load_definitions))
+    patches.set(Strategy, "render_label_request", timer.wrap("prompt", Strategy.render_label_request))
+    patches.set(Strategy, "render_justification_request", timer.wrap("prompt", Strategy.render_justification_request))
+    patches.set(Strategy, "parse_label", staticmethod(timer.wrap("parse", Strategy.parse_label)))
+    patches.set(Strategy, "parse_justification", staticmethod(timer.wrap("parse", Strategy.parse_justification)))
+    patches.set(Llm_client.LlmClient, "complete", timer.wrap("network", Llm_client.LlmClient.complete))
+    patches.set(Llm_client.ResponseCache, "get", timer.wrap("cache", Llm_client.ResponseCache.get))
+    patches.set(Llm_client.RateLimiter, "acquire", timer.wrap("rate limit", Llm_client.RateLimiter.acquire))
+    patches.set(Label_store, "write_frame", timer.wrap("store", Label_store.write_frame))
+    patches.set(Strategy_runner, "query_label", timer.wrap("query", Strategy_runner.query_label, context=True))
+    patches.set(Strategy_runner, "query_justification",
+                timer.wrap("query", Strategy_runner.query_justification, context=True))
+
+
+def openai_stand_in(timer, client):
+    """An `openai` module whose ChatCompletion.create goes through an Llm_client backend."""
+    def create(**request):
+        result = client._send(request) if client.cache is None else client.complete(request)
+        return {"choices": [{"message": {"role": "assistant", "content": result["content"]}}],
+                "usage": {"prompt_tokens": result["prompt_tokens"], "completion_tokens": result["completion_tokens"]}}
+
+    return types.SimpleNamespace(ChatCompletion=types.SimpleNamespace(create=timer.wrap("network", create)),
+                                 api_key=None)
+
+
+def decorated_module(path, wrap_name="__profile_wrap__"):
+    """Compile a script with its construct_*/query_* functions wrapped right after their definitions."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    body = []
+    for node in tree.body:
+        body.append(node)
+        if isinstance(node, ast.FunctionDef):
+            if node.name.startswith("construct_"):
+                stage, context = "prompt", False
+            elif node.name.startswith("query_"):
+                stage, context = "query", True
+            else:
+                continue
+            call = ast.Call(func=ast.Name(wrap_name, ast.Load()),
+                            args=[ast.Constant(stage), ast.Name(node.name, ast.Load())],
+                            keywords=[ast.keyword("context", ast.Constant(context))])
+            body.append(ast.Assign(targets=[ast.Name(node.name, ast.Store())], value=call))
+    tree.body = body
+    return compile(ast.fix_missing_locations(tree), path, "exec")
+
+
+def run_target(target, timer, target_args, client=None):
+    path = target if os.path.exists(target) else os.path.join(Strategy_registry.PROMPTS_DIR, target)
+    code = decorated_module(path)
+    namespace = {"__name__": "__main__", "__file__": path, "__profile_wrap__": timer.wrap}
+    saved_argv, saved_openai = sys.argv, sys.modules.get("openai")
+    sys.argv = [path] + list(target_args)
+    if client is not None:
+        sys.modules["openai"] = openai_stand_in(timer, client)
+    try:
+        exec(code, namespace)
+    except SystemExit as e:
+        if e.code not in (0, None):
+            raise
+    finally:
+        sys.argv = saved_argv
+        if client is not None:
+            if saved_openai is None:
+                sys.modules.pop("openai", None)
+            else:
+                sys.modules["openai"] = saved_openai
+
+
+def is_strategy_script(target):
+    return os.path.basename(target) in Strategy_registry.STRATEGY_SCRIPTS.values()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each pipeline stage of a script or tool run.",
+                                     epilog="Arguments after -- are passed to the profiled tool.")
+    parser.add_argument("target", help="strategy script (e.g. Direct_prompting.py) or tool (e.g. Strategy_runner.py)")
+    parser.add_argument("--input", help="strategy scripts: read this dataset instead of the hard-coded one")
+    parser.add_argument("--output-dir", help="strategy scripts: write outputs here instead of the working directory")
+    parser.add_argument("--skip-sleep", action="store_true", help="record time.sleep calls without sleeping")
+    parser.add_argument("--limit", type=int, help="only the first N definitions after deduplication")
+    parser.add_argument("--report", default="profile_stages.csv", help="per row, property and stage seconds")
+    parser.add_argument("--sample", action="store_true", help="also run the sampling profiler")
+    parser.add_argument("--interval", type=float, default=0.005, help="sampling interval in seconds")
+    parser.add_argument("--folded", default="profile.folded", help="folded stacks (flamegraph.pl, speedscope)")
+    parser.add_argument("--flamegraph", default="profile.svg", help="SVG flamegraph")
+    Llm_client.add_client_arguments(parser)
+    argv = sys.argv[1:]
+    # Everything after "--" belongs to the profiled tool.
+    target_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+    timer = StageTimer()
+    patches = Patches()
+    client = Llm_client.client_from_args(args) if is_strategy_script(args.target) else None
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    instrument_common(timer, patches, args.skip_sleep, args.input, args.output_dir, args.limit)
+    instrument_tools(timer, patches)
+
+    start = time.perf_counter()
+    try:
+        if args.sample:
+            with SamplingProfiler(timer, args.interval) as sampler:
+                run_target(args.target, timer, target_args, client)
+        else:
+            run_target(args.target, timer, target_args, client)
+    finally:
+        wall = time.perf_counter() - start
+        patches.restore()
+
+    cells = timer.frame()
+    cells.to_csv(args.report, index=False)
+    print(f"\n=== Stage breakdown ({wall:.2f}s wall, {timer.row + 1} rows) ===")
+    print(timer.breakdown(wall).to_string(float_format=lambda v: f"{v:.4f}"))
+    by_property = cells[cells["property"] != ""].pivot_table(index="stage", columns="property", values="seconds",
+                                                            aggfunc="sum", fill_value=0.0)
+    if not by_property.empty:
+        print("\nSeconds per property:")
+        print(by_property.to_string(float_format=lambda v: f"{v:.4f}"))
+    if args.skip_sleep:
+        print(f"\ntime.sleep skipped: {timer.skipped_sleep:.1f}s requested")
+    print(f"\nPer-row stage times saved to {args.report}")
+    if args.sample:
+        sampler.write_folded(args.folded)
+        sampler.write_svg(args.flamegraph)
+        print(f"{sum(sampler.stacks.values())} samples: folded stacks in {args.folded}, flamegraph in {args.flamegraph}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Deterministic sharded execution of a prompting strategy.
+
+Deduplicated definitions are split into K shards by a stable hash of
+(EventType, Generic_Definition). Each shard runs as an independent worker,
+locally or on another node sharing the output directory, and `merge` rebuilds
+one output identical to a single-process Strategy_runner run.
+
+    # K local worker processes, then merge
+    python Sharded_run.py run --strategy cot --num-shards 8 --output 161_CoT_prompting.csv
+
+    # one shard per node over a shared filesystem, then merge anywhere
+    python Sharded_run.py worker --strategy cot --num-shards 8 --shard 3 --output /shared/161_CoT_prompting.csv
+    python Sharded_run.py merge --strategy cot --num-shards 8 --output /shared/161_CoT_prompting.csv
+"""
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import time
+
+import Llm_client
+import Model_router
+import Strategy_registry
+import Strategy_runner
+
+
+# === Partitioning ===
+def shard_of(event_type, definition, num_shards):
+    key = Strategy_runner.definition_key(event_type, definition)
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest()[:16], 16) % num_shards
+
+
+def shard_rows(strategy, df, shard, num_shards):
+    mask = [shard_of(e, d, num_shards) == shard
+            for e, d in zip(df[strategy.id_column], df[strategy.definition_column])]
+    return df[mask]
+
+
+def shard_path(output_file, shard, num_shards):
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}.shard-{shard:03d}-of-{num_shards:03d}{ext or '.csv'}"
+
+
+def done_marker(path):
+    return path + ".done"
+
+
+# === Worker ===
+def run_worker(strategy, input_file, output_file, shard, num_shards, client, sleep=1.0):
+    df = strategy.load_definitions(input_file)
+    part = shard_rows(strategy, df, shard, num_shards).copy()
+    path = shard_path(output_file, shard, num_shards)
+    print(f"[Shard {shard}/{num_shards}] {len(part)} of {len(df)} definitions -> {path}")
+    # Resume is always on: a restarted worker skips cells its shard file already holds.
+    Strategy_runner.run_strategy(strategy, part, client, path, sleep=sleep, resume=True)
+    with open(done_marker(path), "w") as f:
+        f.write(f"{len(part)}\n")
+    return path
+
+
+# === Merge ===
+def merge_shards(strategy, input_file, output_file, num_shards, allow_partial=False):
+    """Fill the deduplicated input with each shard's labels and write it in input order."""
+    df = strategy.load_definitions(input_file)
+    missing = [s for s in range(num_shards) if not os.path.exists(done_marker(shard_path(output_file, s, num_shards)))]
+    if missing and not allow_partial:
+        raise RuntimeError(f"Shards not finished: {missing}")
+
+    columns = strategy.meta_properties + [f"{m}Justification" for m in strategy.meta_properties]
+    if strategy.id_column != "EventType":
+        columns = ["EventType"] + columns
+    labels = {}
+    for shard in range(num_shards):
+        # An unfinished shard has its rows so far in the checkpoint next to its file.
+        for part in Strategy_runner.saved_outputs(shard_path(output_file, shard, num_shards)):
+            labels.update((Strategy_runner.row_key(strategy, row), row) for _, row in part.iterrows())
+
+    filled = 0
+    for i, row in df.iterrows():
+        source = labels.get(Strategy_runner.row_key(strategy, row))
+        if source is None:
+            continue
+        for col in columns:
+            if col in source.index:
+                df.at[i, col] = source[col]
+        filled += 1
+
+    df.to_csv(output_file, index=False)
+    print(f"Merged {filled} of {len(df)} definitions from {num_shards} shards into {output_file}")
+    return df
+
+
+# === Local launcher ===
+def worker_command(args, shard):
+    command = [sys.executable, os.path.abspath(__file__), "worker",
+               "--strategy", args.strategy, "--num-shards", str(args.num_shards), "--shard", str(shard),
+               "--output", args.output, "--sleep", str(args.sleep),
+               "--backend", args.backend, "--mock-latency", str(args.mock_latency)]
+    if args.mock_slow_rate:
+        command += ["--mock-slow-rate", str(args.mock_slow_rate), "--mock-slow-factor", str(args.mock_slow_factor)]
+    if args.input:
+        command += ["--input", args.input]
+    if args.cache:
+        command += ["--cache", args.cache]
+    if args.stream:
+        command += ["--stream"]
+    if args.no_coalesce:
+        command += ["--no-coalesce"]
+    if args.routes:
+        command += ["--routes", os.path.abspath(args.routes)]
+    if args.hedge:
+        command += ["--hedge", "--hedge-quantile", str(args.hedge_quantile), "--hedge-max-rate", str(args.hedge_max_rate),
+                    "--hedge-min-samples", str(args.hedge_min_samples)]
+    # Every worker has its own limiter and key pool, so split the budget between concurrent workers.
+    if args.key_pool:
+        command += ["--key-pool", args.key_pool, "--key-pool-share", str(args.key_pool_share / args.workers)]
+        command += ["--key-pool-retries", str(args.key_pool_retries)]
+    if args.rpm:
+        command += ["--rpm", str(max(1, args.rpm // args.workers))]
+    if args.tpm:
+        command += ["--tpm", str(max(1, args.tpm // args.workers))]
+    return command
+
+
+def run_local(args):
+    processes = {}
+    pending = list(range(args.num_shards))
+    failed = []
+    while pending or processes:
+        while pending and len(processes) < args.workers:
+            shard = pending.pop(0)
+            processes[shard] = subprocess.Popen(worker_command(args, shard))
+        # Refill whichever slot frees first, so one slow shard does not hold up the others.
+        finished = [(shard, process) for shard, process in processes.items() if process.poll() is not None]
+        if not finished:
+            time.sleep(0.1)
+        for shard, process in finished:
+            if process.returncode != 0:
+                failed.append(shard)
+            del processes[shard]
+    if failed:
+        print(f"Shards failed: {failed}. Re-run to resume them.")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a prompting strategy in deterministic shards.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("run", "worker", "merge"):
+        p = sub.add_parser(name)
+        Strategy_runner.add_run_arguments(p)
+        p.add_argument("--num-shards", type=int, required=True)
+        if name != "merge":
+            Model_router.add_arguments(p)
+        if name == "run":
+            p.add_argument("--workers", type=int, help="concurrent local processes (default: one per shard)")
+        if name == "worker":
+            p.add_argument("--shard", type=int, required=True)
+        if name == "merge":
+            p.add_argument("--allow-partial", action="store_true", help="merge even if some shards are unfinished")
+    args = parser.parse_args()
+
+    strategy = Strategy_registry.load_strategy(args.strategy)
+    args.output = args.output or strategy.output_file
+
+    if args.command == "worker":
+        if not 0 <= args.shard < args.num_shards:
+            parser.error("--shard must be in [0, --num-shards)")
+        run_worker(Model_router.route_from_args(args, strategy), args.input, args.output, args.shard, args.num_shards,
+                   Llm_client.client_from_args(args), sleep=args.sleep)
+    elif args.command == "merge":
+        merge_shards(strategy, args.input, args.output, args.num_shards, allow_partial=args.allow_partial)
+    else:
+        args.workers = args.workers or args.num_shards
+        run_local(args)
+        merge_shards(strategy, args.input, args.output, args.num_shards)
+
+
+if __name__ == "__main__":
+    main()
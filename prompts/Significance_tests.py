@@ -0,0 +1,156 @@
+"""Paired significance tests between strategy outputs on the gold set.
+
+For every pair of outputs and every property (plus "all", the mean over
+properties) this reports both accuracies and two paired tests on the same
+definitions:
+- paired bootstrap: definitions are resampled with replacement (10,000 times
+  by default). The same resamples are used for every output, so each resample
+  gives a paired difference in accuracy. Reported are its 95% percentile
+  interval and a two-sided p-value from the null-centred differences;
+- exact McNemar: a two-sided binomial test on the definitions exactly one of
+  the two outputs gets right (for "all", the cells exactly one gets right).
+Holm-adjusted McNemar p-values control the error over the pairs of each
+property. Votes outside the vocabulary count as wrong.
+
+The resampling is one matrix product: a (resamples x definitions) count matrix
+times each property's (outputs x definitions) correctness matrix, so the whole
+matrix of pairs and properties takes about a second.
+
+    python Significance_tests.py
+    python Significance_tests.py --outputs 161_CoT_prompting.csv 161_Direct_prompting.csv --resamples 100000
+"""
+import argparse
+import itertools
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+import Ensemble
+import Strategy_registry
+
+
+DEFAULT_OUTPUT = "significance_tests.csv"
+
+
+# === Tests ===
+def mcnemar_exact(only_a, only_b):
+    """Two-sided exact McNemar p-value from the discordant counts."""
+    n = only_a + only_b
+    if n == 0:
+        return 1.0
+    k = min(only_a, only_b)
+    tail = sum(math.comb(n, i) for i in range(k + 1)) / 2 ** n
+    return min(1.0, 2 * tail)
+
+
+def holm(p_values):
+    """Holm step-down adjustment of a family of p-values."""
+    p = np.asarray(p_values, dtype=float)
+    order = np.argsort(p)
+    adjusted = np.maximum.accumulate((len(p) - np.arange(len(p))) * p[order])
+    out = np.empty_like(p)
+    out[order] = np.minimum(adjusted, 1.0)
+    return out
+
+
+def bootstrap_weights(n, resamples, seed=0):
+    """(resamples, n) multiplicities of each definition in each bootstrap resample."""
+    rng = np.random.default_rng(seed)
+    return rng.multinomial(n, np.full(n, 1.0 / n), size=resamples).astype(np.float32)
+
+
+def resampled_accuracy(correct, mask, weights):
+    """(outputs, resamples) accuracy: correct (S, N) and mask (N,) of gold-labelled definitions."""
+    w = weights * mask
+    return (correct * mask).astype(np.float32) @ w.T / np.maximum(w.sum(axis=1), 1.0)
+
+
+def correctness(aligned):
+    """Per property: (S, N) bool correctness and (N,) mask of definitions with a gold label."""
+    table = {}
+    for m in aligned.meta_properties:
+        gold = aligned.gold.get(m)
+        if gold is None:
+            continue
+        mask = gold != Ensemble.INVALID
+        table[m] = ((aligned.votes[m] == gold) & mask, mask)
+    return table
+
+
+def pairwise_tests(aligned, resamples=10000, seed=0, confidence=0.95):
+    table = correctness(aligned)
+    if not table:
+        raise ValueError("No gold labels for any property")
+    n = len(aligned.event_types)
+    weights = bootstrap_weights(n, resamples, seed)
+    observed = {}
+    boot = {}
+    for m, (correct, mask) in table.items():
+        observed[m] = correct[:, mask].mean(axis=1)
+        boot[m] = resampled_accuracy(correct, mask, weights)
+    # "all": each resample's mean over properties, on the same resampled definitions.
+    observed["all"] = np.mean([observed[m] for m in table], axis=0)
+    boot["all"] = np.mean([boot[m] for m in table], axis=0)
+
+    pairs = list(itertools.combinations(range(len(aligned.names)), 2))
+    a_idx = np.array([a for a, _ in pairs])
+    b_idx = np.array([b for _, b in pairs])
+    alpha = (1 - confidence) / 2
+    rows = []
+    for m in list(table) + ["all"]:
+        diff = observed[m][a_idx] - observed[m][b_idx]
+        boot_diff = boot[m][a_idx] - boot[m][b_idx]
+        low, high = np.quantile(boot_diff, [alpha, 1 - alpha], axis=1)
+        # Two-sided p: how often the null-centred resampled difference is at least as extreme as observed.
+        p_boot = (np.abs(boot_diff - diff[:, None]) >= np.abs(diff)[:, None] - 1e-12).mean(axis=1)
+        if m == "all":
+            correct = np.concatenate([c[:, mask] for c, mask in table.values()], axis=1)
+        else:
+            correct = table[m][0][:, table[m][1]]
+        only_a = (correct[a_idx] & ~correct[b_idx]).sum(axis=1)
+        only_b = (~correct[a_idx] & correct[b_idx]).sum(axis=1)
+        p_mcnemar = np.array([mcnemar_exact(int(x), int(y)) for x, y in zip(only_a, only_b)])
+        for k, (a, b) in enumerate(pairs):
+            rows.append({"property": m, "strategy_a": aligned.names[a], "strategy_b": aligned.names[b],
+                         "n": correct.shape[1], "accuracy_a": observed[m][a], "accuracy_b": observed[m][b],
+                         "difference": diff[k], "ci_low": low[k], "ci_high": high[k], "p_bootstrap": p_boot[k],
+                         "only_a_correct": int(only_a[k]), "only_b_correct": int(only_b[k]),
+                         "p_mcnemar": p_mcnemar[k]})
+    result = pd.DataFrame(rows)
+    result["p_mcnemar_holm"] = result.groupby("property")["p_mcnemar"].transform(lambda p: holm(p.to_numpy()))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paired bootstrap and McNemar tests between strategy outputs.")
+    parser.add_argument("--outputs", nargs="+", help="label CSVs (default: every 161_* output in Prompt_output/)")
+    parser.add_argument("--gold", default=Ensemble.DEFAULT_GOLD)
+    parser.add_argument("--resamples", type=int, default=10000)
+    parser.add_argument("--confidence", type=float, default=0.95, help="bootstrap interval level")
+    parser.add_argument("--alpha", type=float, default=0.05, help="significance level for the summary")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    paths = [Strategy_registry.resolve_data_path(p) for p in args.outputs] if args.outputs else Ensemble.default_output_files()
+    aligned = Ensemble.load_aligned(paths, args.gold)
+    start = time.perf_counter()
+    result = pairwise_tests(aligned, args.resamples, args.seed, args.confidence)
+    elapsed = time.perf_counter() - start
+    result.to_csv(args.output, index=False)
+
+    print(f"{len(aligned.names)} outputs x {result['property'].nunique() - 1} properties (+ all), "
+          f"{len(aligned.event_types)} event types, {args.resamples} resamples: "
+          f"{len(result)} comparisons in {elapsed:.2f}s")
+    columns = ["property", "strategy_a", "strategy_b", "accuracy_a", "accuracy_b", "difference", "ci_low", "ci_high",
+               "p_bootstrap", "p_mcnemar", "p_mcnemar_holm"]
+    print(result[columns].to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    significant = result[result["p_mcnemar_holm"] < args.alpha]
+    print(f"{len(significant)} of {len(result)} differences significant at {args.alpha} (McNemar, Holm-adjusted); "
+          f"saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
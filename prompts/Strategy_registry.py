@@ -0,0 +1,233 @@
+"""Load the prompting strategies defined by the classification scripts.
+
+The scripts in this folder run their main loop at import time, so they cannot
+be imported directly. This module reads each script with `ast`, executes only
+its prompt tables and function definitions, and renders the exact chat
+requests the script would send, without touching the network.
+"""
+import ast
+import os
+import threading
+import types
+
+import pandas as pd
+
+
+PROMPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(PROMPTS_DIR)
+DATA_DIRS = [os.path.join(REPO_ROOT, "Prompt_output"), os.path.join(REPO_ROOT, "Annotated_data")]
+
+# === Strategy name -> script ===
+STRATEGY_SCRIPTS = {
+    "direct": "Direct_prompting.py",
+    "cot": "CoT_prompting.py",
+    "fewshot": "Few-shot-Prompting.py",
+    "analogical": "Analogical_prompting.py",
+    "metacognitive": "Meta-cognitive-prompting.py",
+    "military": "Military_Domain_Specific.py",
+    "selfgenerated": "Self_generated.py",
+}
+
+META_PROPERTIES = ["Cumulativity", "Homeomericity", "TemporalExtent", "Agentivity"]
+
+
+def resolve_data_path(filename):
+    """Find a data file the way a user running the scripts would expect."""
+    if os.path.exists(filename):
+        return filename
+    for data_dir in DATA_DIRS:
+        candidate = os.path.join(data_dir, os.path.basename(filename))
+        if os.path.exists(candidate):
+            return candidate
+    return filename
+
+
+def read_output(path):
+    """Read a label CSV as strings.
+
+    Outputs written by to_csv are UTF-8, while the input datasets are
+    ISO-8859-1; accept either.
+    """
+    try:
+        return pd.read_csv(path, keep_default_na=False, dtype=str)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, keep_default_na=False, dtype=str, encoding="ISO-8859-1")
+
+
+# === Recording stand-in for the openai module ===
+class _RecordingChatCompletion:
+    def __init__(self):
+        self._local = threading.local()
+
+    def create(self, **kwargs):
+        self._local.request = kwargs
+        return {"choices": [{"message": {"content": ""}}]}
+
+    def pop(self):
+        request = getattr(self._local, "request", None)
+        self._local.request = None
+        return request
+
+
+class Strategy:
+    def __init__(self, name, script_path):
+        self.name = name
+        self.script_path = script_path
+        with open(script_path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=script_path)
+
+        self._recorder = _RecordingChatCompletion()
+        self._namespace = {
+            "__name__": f"strategy_{name}",
+            "openai": types.SimpleNamespace(ChatCompletion=self._recorder, api_key=None),
+        }
+        self._load_definitions(tree)
+        self._parse_main_loop(tree)
+
+        self.meta_properties = self._namespace.get("meta_properties", META_PROPERTIES)
+        self.helper_blocks = self._namespace["helper_blocks"]
+        self.footer_blocks = self._namespace["footer_blocks"]
+        self._label_query = self._namespace[self.label_function]
+        self._justification_query = (
+            self._namespace[self.justification_function] if self.justification_function else None
+        )
+
+    def __repr__(self):
+        return f"Strategy({self.name!r})"
+
+    # --- script introspection ---
+    def _load_definitions(self, tree):
+        # Prompt tables are literals; every other module-level statement is run-time code.
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef):
+                exec(compile(ast.Module(body=[node], type_ignores=[]), self.script_path, "exec"), self._namespace)
+            elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) for t in node.targets):
+                try:
+                    value = ast.literal_eval(node.value)
+                except ValueError:
+                    continue
+                for target in node.targets:
+                    self._namespace[target.id] = value
+
+    def _parse_main_loop(self, tree):
+        self.input_file = None
+        self.output_file = None
+        self.dedupe_columns = None
+        self.id_column = "EventType"
+        self.definition_column = "Generic_Definition"
+        self.label_function = None
+        self.justification_function = None
+        self.uses_justification = False
+
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Attribute):
+                continue
+            if node.func.attr == "read_csv" and self.input_file is None:
+                self.input_file = ast.literal_eval(node.args[0])
+            elif node.func.attr == "to_csv":
+                self.output_file = ast.literal_eval(node.args[0])
+            elif node.func.attr == "drop_duplicates":
+                for keyword in node.keywords:
+                    if keyword.arg == "subset":
+                        self.dedupe_columns = ast.literal_eval(keyword.value)
+
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef):
+                if node.name.startswith("query_meta_property_label"):
+                    self.label_function = node.name
+                elif node.name.startswith("query_meta_property_justification"):
+                    self.justification_function = node.name
+            if not isinstance(node, ast.For):
+                continue
+            for inner in ast.walk(node):
+                if isinstance(inner, ast.Assign) and isinstance(inner.value, ast.Subscript):
+                    target = inner.targets[0]
+                    if isinstance(target, ast.Name) and target.id in ("event_type", "definition"):
+                        column = ast.literal_eval(inner.value.slice)
+                        if target.id == "event_type":
+                            self.id_column = column
+                        else:
+                            self.definition_column = column
+                elif isinstance(inner, ast.Call) and isinstance(inner.func, ast.Name):
+                    if inner.func.id.startswith("query_meta_property_justification"):
+                        self.uses_justification = True
+
+        if self.label_function is None:
+            raise ValueError(f"{self.script_path} defines no query_meta_property_label* function")
+        if self.dedupe_columns is None:
+            self.dedupe_columns = [self.id_column, self.definition_column]
+
+    # --- rendering ---
+    def _render(self, query, *args):
+        query(*args)
+        request = self._recorder.pop()
+        if request is None:
+            raise ValueError(f"[{self.name}] could not render a request for {args[1:]}")
+        return request
+
+    def render_label_request(self, definition, meta_property):
+        """Return the exact ChatCompletion.create kwargs the script sends for a label."""
+        return self._render(self._label_query, definition, meta_property)
+
+    def render_justification_request(self, definition, meta_property, label):
+        if self._justification_query is None:
+            raise ValueError(f"[{self.name}] has no justification query")
+        return self._render(self._justification_query, definition, meta_property, label)
+
+    @property
+    def params(self):
+        """Decoding parameters of the label query (model, max_tokens, temperature, top_p)."""
+        request = self.render_label_request("", self.meta_properties[0])
+        return {k: v for k, v in request.items() if k != "messages"}
+
+    # --- response handling, identical to the scripts ---
+    @staticmethod
+    def parse_label(content):
+        return content.strip().lower()
+
+    @staticmethod
+    def parse_justification(content):
+        return content.strip()
+
+    def allowed_labels(self, meta_property):
+        """Valid answers listed in the last line of the property's footer block."""
+        last_line = self.footer_blocks[meta_property].strip().splitlines()[-1]
+        return [label.strip() for label in last_line.lstrip("- ").split(",")]
+
+    # --- data ---
+    def load_definitions(self, path=None):
+        """Read and deduplicate the input CSV, adding empty output columns, as the script does."""
+        path = resolve_data_path(path or self.input_file)
+        df = pd.read_csv(path, encoding="ISO-8859-1")
+        df = df.drop_duplicates(subset=self.dedupe_columns)
+        for col in self.meta_properties + [f"{m}Justification" for m in self.meta_properties]:
+            if col not in df.columns:
+                df[col] = ""
+        return df
+
+
+_loaded = {}
+
+
+def load_strategy(name):
+    """Load a strategy by short name (see STRATEGY_SCRIPTS) or by script path."""
+    key = name.lower()
+    if key not in _loaded:
+        if key in STRATEGY_SCRIPTS:
+            _loaded[key] = Strategy(key, os.path.join(PROMPTS_DIR, STRATEGY_SCRIPTS[key]))
+        elif os.path.exists(name):
+            _loaded[key] = Strategy(os.path.splitext(os.path.basename(name))[0], name)
+        else:
+            raise KeyError(f"Unknown strategy '{name}'. Known: {', '.join(STRATEGY_SCRIPTS)}")
+    return _loaded[key]
+
+
+def strategy_names():
+    return list(STRATEGY_SCRIPTS)
+
+
+if __name__ == "__main__":
+    for strategy_name in strategy_names():
+        s = load_strategy(strategy_name)
+        print(f"{strategy_name:14s} {os.path.basename(s.script_path):30s} in={s.input_file} out={s.output_file} "
+              f"params={s.params} justification={s.uses_justification}")
@@ -0,0 +1,228 @@
+"""Run any prompting strategy over a dataset, as its script would.
+
+Same prompts, parameters, row order and output layout as the original script,
+with the input, output, backend and pacing configurable. Instead of rewriting
+the whole output after every row, each finished row is appended to a
+checkpoint file next to the output (<output>.partial), which --resume reads;
+the output itself is written once at the end.
+
+    python Strategy_runner.py --strategy cot --input 161_FrameNet.csv --output 161_CoT_prompting.csv
+    python Strategy_runner.py --strategy direct --backend mock --sleep 0 --output /tmp/direct.csv
+"""
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+
+import Label_store
+import Llm_client
+import Model_router
+import Online_accuracy
+import Strategy_registry
+
+
+# === Row identity ===
+def definition_key(event_type, definition):
+    return f"{event_type}\x1f{definition}"
+
+
+def row_key(strategy, row):
+    return definition_key(row[strategy.id_column], row[strategy.definition_column])
+
+
+def is_labelled(value):
+    return isinstance(value, str) and value != "" and value != "error"
+
+
+# === Queries, mirroring the scripts' error handling ===
+def query_label(strategy, client, definition, meta_property):
+    try:
+        request = strategy.render_label_request(definition, meta_property)
+        response = client.complete(request, labels=strategy.allowed_labels(meta_property),
+                                   hedge_key=(strategy.name, meta_property))
+        return strategy.parse_label(response["content"])
+    except Exception as e:
+        print(f"[Label:{meta_property}] Error for definition: {e}")
+        return "error"
+
+
+def query_justification(strategy, client, definition, meta_property, label):
+    try:
+        request = strategy.render_justification_request(definition, meta_property, label)
+        response = client.complete(request, hedge_key=(strategy.name, meta_property, "justification"))
+        return strategy.parse_justification(response["content"])
+    except Exception as e:
+        print(f"[Justification:{meta_property}] Error: {e}")
+        return "error"
+
+
+# === Resume ===
+def label_columns(strategy):
+    """Columns the run writes: the labels, and the justifications if the strategy asks for them."""
+    if strategy.uses_justification:
+        return strategy.meta_properties + [f"{m}Justification" for m in strategy.meta_properties]
+    return list(strategy.meta_properties)
+
+
+def checkpoint_path(output_file):
+    return output_file + ".partial"
+
+
+def saved_outputs(output_file):
+    """Previous output, then the checkpoint of an unfinished run, as frames (later ones are newer)."""
+    return [Strategy_registry.read_output(path) for path in (output_file, checkpoint_path(output_file))
+            if os.path.exists(path)]
+
+
+def merge_existing_labels(strategy, df, output_file):
+    """Copy labels from a previous (partial) output and its checkpoint into df, matching rows by key."""
+    merged = 0
+    for previous in saved_outputs(output_file):
+        previous.index = [row_key(strategy, row) for _, row in previous.iterrows()]
+        previous = previous[~previous.index.duplicated(keep="last")]
+        columns = [c for c in strategy.meta_properties + [f"{m}Justification" for m in strategy.meta_properties]
+                   if c in previous.columns]
+        for i, row in df.iterrows():
+            key = row_key(strategy, row)
+            if key not in previous.index:
+                continue
+            for col in columns:
+                value = previous.at[key, col]
+                # A row cut short by a crash reads as NaN.
+                if isinstance(value, str) and value != "":
+                    df.at[i, col] = value
+                    merged += 1
+    return merged
+
+
+class Checkpoint:
+    """Appends each finished row's cells to <output>.partial, so a save costs one row."""
+
+    def __init__(self, strategy, output_file, resume=False):
+        self.strategy = strategy
+        self.path = checkpoint_path(output_file)
+        self.columns = label_columns(strategy)
+        # A fresh run starts a fresh checkpoint; a resumed one has merged the old rows already.
+        append = resume and os.path.exists(self.path)
+        self._file = open(self.path, "a" if append else "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if not append:
+            self._writer.writerow([strategy.id_column, strategy.definition_column] + self.columns)
+
+    def write_row(self, row, store, justifications, position):
+        cells = [store.get(position, m) for m in self.strategy.meta_properties]
+        if self.strategy.uses_justification:
+            cells += [justifications.get(position, m) for m in self.strategy.meta_properties]
+        self._writer.writerow([row[self.strategy.id_column], row[self.strategy.definition_column]] + cells)
+        self._file.flush()
+
+    def close(self, remove=False):
+        self._file.close()
+        if remove:
+            os.remove(self.path)
+
+
+# === Main loop ===
+def save(strategy, df, store, justifications, processed, output_file, layout=None):
+    """Write the stores back into df, in the script's column layout, and save it."""
+    Label_store.write_frame(store, justifications if strategy.uses_justification else None, df, layout)
+    if processed.any():
+        # The scripts set df["EventType"] on each row they process.
+        df.loc[df.index[processed], "EventType"] = df.loc[df.index[processed], strategy.id_column]
+    df.to_csv(output_file, index=False)
+
+
+def run_strategy(strategy, df, client, output_file, sleep=1.0, resume=False, on_result=None):
+    """Label every (definition, property) of df in file order, checkpointing after each row.
+
+    Labels are held in a Label_store while the run is in progress; their
+    columns are dropped from df and written back, in their original place,
+    when the output is saved at the end. With resume, cells that already hold
+    a label (in df, output_file or its checkpoint) are kept and not queried
+    again. on_result(i, row, meta_property, label) is called after each label;
+    returning True stops the run after the current row.
+    """
+    if resume:
+        merged = merge_existing_labels(strategy, df, output_file)
+        print(f"Resumed {merged} cells from {output_file}")
+
+    store, justifications = Label_store.from_frame(strategy, df)
+    layout = list(df.columns)
+    df.drop(columns=[c for c in label_columns(strategy) if c in df.columns], inplace=True)
+    checkpoint = Checkpoint(strategy, output_file, resume)
+    processed = np.zeros(len(df), dtype=bool)
+    stop = False
+    for position, (i, row) in enumerate(df.iterrows()):
+        definition = row[strategy.definition_column]
+
+        if resume and all(store.is_labelled(position, m) for m in strategy.meta_properties):
+            continue
+        print(f"Processing definition: {definition}")
+
+        for meta_property in strategy.meta_properties:
+            if resume and store.is_labelled(position, meta_property):
+                continue
+            label = query_label(strategy, client, definition, meta_property)
+
+            processed[position] = True
+            store.set(position, meta_property, label)
+            if strategy.uses_justification:
+                justifications.set(position, meta_property, query_justification(
+                    strategy, client, definition, meta_property, label))
+
+            if on_result is not None and on_result(i, row, meta_property, label):
+                stop = True
+            if sleep:
+                time.sleep(sleep)
+
+        checkpoint.write_row(row, store, justifications, position)
+        if stop:
+            print("Run stopped early.")
+            break
+
+    save(strategy, df, store, justifications, processed, output_file, layout)
+    checkpoint.close(remove=True)
+    return df
+
+
+def add_run_arguments(parser):
+    parser.add_argument("--strategy", required=True,
+                        help=f"strategy name or script path ({', '.join(Strategy_registry.strategy_names())})")
+    parser.add_argument("--input", help="dataset CSV (defaults to the file the strategy script reads)")
+    parser.add_argument("--output", help="output CSV (defaults to the file the strategy script writes)")
+    parser.add_argument("--sleep", type=float, default=1.0, help="seconds to wait after each property, as the scripts do")
+    Llm_client.add_client_arguments(parser)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify meta-properties with a prompting strategy.")
+    add_run_arguments(parser)
+    parser.add_argument("--resume", action="store_true", help="keep labels already present in the input or output file")
+    Online_accuracy.add_arguments(parser)
+    Model_router.add_arguments(parser)
+    args = parser.parse_args()
+
+    strategy = Model_router.route_from_args(args, Strategy_registry.load_strategy(args.strategy))
+    df = strategy.load_definitions(args.input)
+    client = Llm_client.client_from_args(args)
+    tracker = Online_accuracy.tracker_from_args(args, strategy, df)
+    run_strategy(strategy, df, client, args.output or strategy.output_file, sleep=args.sleep, resume=args.resume,
+                 on_result=tracker)
+    print("Meta-property classification completed and saved.")
+    if client.stream:
+        print(client.stream_stats.summary())
+    if client.single_flight is not None and client.single_flight.hits:
+        print(client.single_flight.summary())
+    if client.key_pool is not None:
+        print(client.key_pool.summary())
+    if client.hedger is not None:
+        print(client.hedger.summary())
+    if tracker is not None:
+        print(tracker.format_line())
+        print(tracker.summary().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Stratified subsample evaluation of a prompting strategy.
+
+Instead of labelling every annotated definition, draw a stratified sample from
+the gold set (strata are the joint gold labels of the four properties), run the
+strategy on that sample only, and estimate per-property accuracy with
+confidence intervals. The sample grows until every interval is narrower than
+the target width, or the gold set is exhausted.
+
+    python Subsample_eval.py --strategy analogical --target-width 0.15
+"""
+import argparse
+import math
+import random
+from statistics import NormalDist
+
+import pandas as pd
+
+import Llm_client
+import Online_accuracy
+import Strategy_registry
+import Strategy_runner
+
+
+DEFAULT_GOLD = "Human_annotated_dataset.csv"
+
+
+# === Sampling ===
+def stratified_order(gold, seed=0):
+    """Order rows so that every prefix is close to a proportional stratified sample.
+
+    Within each stratum rows are shuffled; row k of a stratum of size n gets the
+    key (k + u) / n with u uniform in [0, 1), and rows are sorted by that key.
+    """
+    rng = random.Random(seed)
+    strata = gold.fillna("").astype(str).agg("|".join, axis=1)
+    keyed = []
+    for _, members in strata.groupby(strata).groups.items():
+        members = list(members)
+        rng.shuffle(members)
+        n = len(members)
+        keyed.extend(((k + rng.random()) / n, index) for k, index in enumerate(members))
+    keyed.sort()
+    return [index for _, index in keyed]
+
+
+# === Estimation ===
+def stratified_estimate(correct, gold_labels, population_labels, confidence=0.95):
+    """Accuracy of one property, post-stratified on its gold label, with a normal CI.
+
+    correct and gold_labels cover the sampled rows; population_labels covers the
+    whole gold set and gives the stratum weights and finite-population correction.
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    population = population_labels.value_counts()
+    total = population.sum()
+    estimate = 0.0
+    variance = 0.0
+    for label, size in population.items():
+        hits = correct[gold_labels == label]
+        n = len(hits)
+        weight = size / total
+        if n == 0:
+            # An unsampled stratum contributes its maximal uncertainty.
+            estimate += weight * 0.5
+            variance += weight ** 2 * 0.25
+            continue
+        p = hits.mean()
+        # Smoothed proportion keeps strata that are all right or all wrong from claiming zero variance.
+        p_var = (hits.sum() + 1) / (n + 2)
+        fpc = (size - n) / max(size - 1, 1)
+        estimate += weight * p
+        variance += weight ** 2 * p_var * (1 - p_var) / n * fpc
+    half_width = z * math.sqrt(variance)
+    return estimate, max(0.0, estimate - half_width), min(1.0, estimate + half_width)
+
+
+def evaluate_sample(strategy, df, gold, sample_index, confidence):
+    rows = []
+    for meta_property in strategy.meta_properties:
+        if meta_property not in gold.columns:
+            continue
+        labelled = gold[meta_property].notna()
+        sampled = [i for i in sample_index if labelled.at[i]]
+        correct = (df.loc[sampled, meta_property] == gold.loc[sampled, meta_property]).astype(float)
+        estimate, low, high = stratified_estimate(
+            correct.values, gold.loc[sampled, meta_property].values, gold.loc[labelled, meta_property], confidence)
+        rows.append({"property": meta_property, "n": len(sampled), "population": int(labelled.sum()),
+                     "accuracy": estimate, "ci_low": low, "ci_high": high, "width": high - low})
+    return pd.DataFrame(rows)
+
+
+# === Adaptive loop ===
+def next_sample_size(current, widest, target, step_factor, population):
+    # CI width shrinks roughly with 1 / sqrt(n).
+    needed = math.ceil(current * (widest / target) ** 2)
+    return min(population, max(current + 1, min(needed, int(current * step_factor))))
+
+
+def run(strategy, input_file, gold_file, client, output_file, initial=20, target_width=0.1, step_factor=2.0,
+        max_size=None, confidence=0.95, sleep=1.0, seed=0):
+    df = strategy.load_definitions(input_file or gold_file)
+    gold = Online_accuracy.load_gold(strategy, df, gold_file)
+    if gold is None:
+        raise ValueError("No gold labels: pass --gold or use an input with TRUE_<property> columns")
+    # The gold file may carry its labels under the property names; never treat those as predictions.
+    for col in strategy.meta_properties + [f"{m}Justification" for m in strategy.meta_properties]:
+        df[col] = ""
+
+    gold = gold.dropna(how="all")
+    order = stratified_order(gold, seed)
+    population = len(order) if max_size is None else min(max_size, len(order))
+    size = min(initial, population)
+    while True:
+        sample_index = order[:size]
+        print(f"=== Sample size {size} of {len(order)} ===")
+        part = df.loc[sample_index].copy()
+        part = Strategy_runner.run_strategy(strategy, part, client, output_file, sleep=sleep, resume=True)
+        df.loc[part.index, part.columns] = part
+        report = evaluate_sample(strategy, df, gold, sample_index, confidence)
+        print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        widest = report["width"].max()
+        if widest <= target_width:
+            print(f"Target width {target_width} reached with {size} definitions.")
+            return report
+        if size >= population:
+            print(f"Sample exhausted at {size} definitions; widest interval {widest:.3f} > {target_width}.")
+            return report
+        size = next_sample_size(size, widest, target_width, step_factor, population)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate a strategy's accuracy on a stratified gold subsample.")
+    Strategy_runner.add_run_arguments(parser)
+    parser.add_argument("--gold", default=DEFAULT_GOLD, help="gold label CSV (also the input unless --input is given)")
+    parser.add_argument("--initial", type=int, default=20, help="initial sample size")
+    parser.add_argument("--target-width", type=float, default=0.1, help="stop when every CI is narrower than this")
+    parser.add_argument("--step-factor", type=float, default=2.0, help="grow the sample by at most this factor per round")
+    parser.add_argument("--max-size", type=int, help="never label more definitions than this")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="write the final accuracy table to this CSV")
+    args = parser.parse_args()
+
+    strategy = Strategy_registry.load_strategy(args.strategy)
+    output = args.output or f"{strategy.name}_subsample.csv"
+    report = run(strategy, args.input, args.gold, Llm_client.client_from_args(args), output,
+                 initial=args.initial, target_width=args.target_width, step_factor=args.step_factor,
+                 max_size=args.max_size, confidence=args.confidence, sleep=args.sleep, seed=args.seed)
+    if args.report:
+        report.to_csv(args.report, index=False)
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
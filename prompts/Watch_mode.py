@@ -0,0 +1,385 @@
+"""Watch an input CSV (or a drop directory) and classify only new definitions.
+
+The input file is tailed: after the first pass only the bytes appended since
+the last poll are parsed, up to the last complete record, so a half-written row
+waits for the next poll. If the already-read part of the file changes (rewritten,
+truncated or edited in place), the whole file is read again. With --drop-dir
+every CSV file dropped in the directory is read once its size has settled.
+
+Rows are identified by a hash of EventType and definition. The hashes of
+classified rows are kept in a SQLite state file, seeded from the existing
+output, so a definition is classified once and an edited definition counts as
+new. New rows are classified as soon as they are seen, several at a time, and
+each finished row is appended to the output in the script's layout. Consumers
+should take the last row per EventType. A row with an "error" label is appended
+too and asked again at the next poll, up to three attempts. Rows that were read
+but are not classified yet (queued, in flight or waiting for a retry) are kept
+in the state file too and queued again when the watcher restarts, so stopping
+it never loses a row. Detection-to-append latency is reported as rows complete.
+
+    python Watch_mode.py --strategy cot --input 161_FrameNet.csv --output 161_CoT_prompting.csv --poll 2
+    python Watch_mode.py --strategy direct --drop-dir incoming/ --output live_direct.csv --concurrency 8
+    python Watch_mode.py --strategy direct --input new_rows.csv --output live_direct.csv --once
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import Llm_client
+import Model_router
+import Strategy_registry
+import Strategy_runner
+
+
+DEFAULT_STATE = "watch_state.sqlite"
+TAIL_CHECK_BYTES = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (hash TEXT PRIMARY KEY, event_type TEXT, source TEXT, classified_at REAL);
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, offset INTEGER, header BLOB, tail_hash TEXT,
+                                  content_hash TEXT, updated_at REAL);
+CREATE TABLE IF NOT EXISTS pending (hash TEXT PRIMARY KEY, source TEXT, row TEXT, attempts INTEGER, queued_at REAL);
+"""
+
+
+def row_hash(event_type, definition):
+    return hashlib.sha256(Strategy_runner.definition_key(event_type, definition).encode("utf-8")).hexdigest()
+
+
+# === State ===
+class WatchState:
+    """Hashes of classified rows, rows read but not classified yet, and the read position of each watched file."""
+
+    def __init__(self, path=DEFAULT_STATE):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def seen(self, hashes):
+        """The subset of hashes already classified."""
+        with self._lock:
+            found = set()
+            hashes = list(hashes)
+            for k in range(0, len(hashes), 500):
+                chunk = hashes[k:k + 500]
+                found.update(h for (h,) in self.conn.execute(
+                    f"SELECT hash FROM rows WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+            return found
+
+    def mark(self, items, source):
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)",
+                                  [(h, e, source, time.time()) for h, e in items])
+            self.conn.executemany("DELETE FROM pending WHERE hash = ?", [(h,) for h, _ in items])
+            self.conn.commit()
+
+    def add_pending(self, items):
+        """Record (hash, row, source) items as read but not classified."""
+        with self._lock:
+            self.conn.executemany("INSERT OR IGNORE INTO pending VALUES (?, ?, ?, 0, ?)",
+                                  [(h, source, json.dumps(row), time.time()) for h, row, source in items])
+            self.conn.commit()
+
+    def failed_attempt(self, h, max_attempts):
+        """Count a failed attempt; returns whether the row should be tried again (else it is dropped)."""
+        with self._lock:
+            self.conn.execute("UPDATE pending SET attempts = attempts + 1 WHERE hash = ?", (h,))
+            (attempts,) = self.conn.execute("SELECT attempts FROM pending WHERE hash = ?", (h,)).fetchone() or (
+                max_attempts,)
+            if attempts >= max_attempts:
+                self.conn.execute("DELETE FROM pending WHERE hash = ?", (h,))
+            self.conn.commit()
+            return attempts < max_attempts
+
+    def pending(self):
+        """(hash, row, source) of every row read but not classified, oldest first."""
+        with self._lock:
+            rows = self.conn.execute("SELECT hash, row, source FROM pending ORDER BY queued_at").fetchall()
+        return [(h, json.loads(row), source) for h, row, source in rows]
+
+    def file(self, path):
+        with self._lock:
+            row = self.conn.execute("SELECT offset, header, tail_hash, content_hash FROM files WHERE path = ?",
+                                    (path,)).fetchone()
+        return dict(zip(("offset", "header", "tail_hash", "content_hash"), row)) if row else None
+
+    def set_file(self, path, offset=0, header=b"", tail_hash="", content_hash=""):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                              (path, offset, header, tail_hash, content_hash, time.time()))
+            self.conn.commit()
+
+
+# === Reading ===
+def complete_records(data):
+    """Length of the prefix of data made of whole CSV records (a newline outside quotes ends a record)."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    outside_quotes = np.cumsum(raw == ord('"')) % 2 == 0
+    ends = np.flatnonzero((raw == ord("\n")) & outside_quotes)
+    return int(ends[-1]) + 1 if len(ends) else 0
+
+
+def parse_records(header, body):
+    if not body.strip():
+        return pd.DataFrame()
+    return pd.read_csv(io.BytesIO(header + body), encoding="ISO-8859-1", dtype=str, keep_default_na=False)
+
+
+def _tail_hash(data):
+    return hashlib.sha256(data[-TAIL_CHECK_BYTES:]).hexdigest()
+
+
+def read_appended(path, state):
+    """Rows appended to path since the last call (all rows on the first call or after a rewrite)."""
+    known = state.file(path)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if known and known["offset"] <= size:
+            start = max(known["offset"] - TAIL_CHECK_BYTES, 0)
+            f.seek(start)
+            previous = f.read(known["offset"] - start)
+            if _tail_hash(previous) == known["tail_hash"]:
+                if known["offset"] == size:
+                    return pd.DataFrame()
+                data = f.read(size - known["offset"])
+                end = complete_records(data)
+                state.set_file(path, known["offset"] + end, known["header"], _tail_hash(previous + data[:end]))
+                return parse_records(known["header"], data[:end])
+        # First read, or the part read before has changed: start over (seen rows are skipped by hash).
+        f.seek(0)
+        data = f.read(size)
+    end = complete_records(data)
+    header_end = data.find(b"\n") + 1
+    header = data[:header_end]
+    if not header:
+        return pd.DataFrame()
+    state.set_file(path, end, header, _tail_hash(data[:end]))
+    return parse_records(header, data[header_end:end])
+
+
+def read_drop_dir(directory, state, settle=1.0):
+    """Rows of drop files not read before; a file is read once it has not changed for `settle` seconds."""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv")), key=os.path.getmtime):
+        if time.time() - os.path.getmtime(path) < settle:
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        known = state.file(path)
+        if known and known["content_hash"] == digest:
+            continue
+        state.set_file(path, len(data), content_hash=digest)
+        frames.append(pd.read_csv(io.BytesIO(data), encoding="ISO-8859-1", dtype=str, keep_default_na=False))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# === Classification ===
+class Appender:
+    """Appends finished rows to the output CSV, keeping the column layout of its first line."""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.columns = list(Strategy_registry.read_output(path).columns)
+        else:
+            self.columns = columns
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(columns)
+
+    def append(self, row):
+        with self._lock, open(self.path, "a", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerow([row.get(c, "") for c in self.columns])
+
+
+class Watcher:
+    def __init__(self, strategy, client, state, output_file, concurrency=4, max_attempts=3):
+        self.strategy = strategy
+        self.client = client
+        self.state = state
+        self.output_file = output_file
+        self.appender = None
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+        self._pending = set()
+        self._retry = []
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.classified = 0
+
+    def seed(self):
+        """Mark the labelled rows of an existing output as classified."""
+        if not os.path.exists(self.output_file) or os.path.getsize(self.output_file) == 0:
+            return 0
+        previous = Strategy_registry.read_output(self.output_file)
+        items = []
+        for _, row in previous.iterrows():
+            if all(Strategy_runner.is_labelled(row.get(m)) for m in self.strategy.meta_properties):
+                items.append((row_hash(row[self.strategy.id_column], row[self.strategy.definition_column]),
+                              row[self.strategy.id_column]))
+        self.state.mark(items, self.output_file)
+        return len(items)
+
+    def _open_output(self, input_columns):
+        if self.appender is None:
+            columns = list(input_columns) + [c for m in self.strategy.meta_properties
+                                             for c in (m, f"{m}Justification") if c not in input_columns]
+            self.appender = Appender(self.output_file, columns)
+
+    def submit(self, df, source):
+        """Queue the rows of df that are neither classified nor in flight; returns how many."""
+        if df.empty:
+            return 0
+        strategy = self.strategy
+        df = df.drop_duplicates(subset=strategy.dedupe_columns)
+        hashes = [row_hash(e, d) for e, d in zip(df[strategy.id_column], df[strategy.definition_column])]
+        done = self.state.seen(hashes)
+        self._open_output(df.columns)
+        new = []
+        with self._lock:
+            for h, (_, row) in zip(hashes, df.iterrows()):
+                if h not in done and h not in self._pending:
+                    self._pending.add(h)
+                    new.append((h, row.to_dict(), source))
+        # Recorded before they are queued, so rows read but not yet classified survive a restart.
+        self.state.add_pending(new)
+        detected = time.perf_counter()
+        for h, row, source in new:
+            self._pool.submit(self._classify, h, row, source, detected)
+        return len(new)
+
+    def resume(self):
+        """Queue the rows an earlier run read but did not classify; returns how many."""
+        pending = self.state.pending()
+        if not pending:
+            return 0
+        self._open_output(pending[0][1])
+        with self._lock:
+            self._pending.update(h for h, _, _ in pending)
+        detected = time.perf_counter()
+        for h, row, source in pending:
+            self._pool.submit(self._classify, h, row, source, detected)
+        return len(pending)
+
+    def retry(self):
+        """Queue again the rows that came back with an "error" label; returns how many."""
+        with self._lock:
+            retry, self._retry = self._retry, []
+            self._pending.update(h for h, _, _ in retry)
+        detected = time.perf_counter()
+        for h, row, source in retry:
+            self._pool.submit(self._classify, h, row, source, detected)
+        return len(retry)
+
+    def _classify(self, h, row, source, detected):
+        strategy = self.strategy
+        definition = row[strategy.definition_column]
+        original = dict(row)
+        try:
+            for m in strategy.meta_properties:
+                row[m] = Strategy_runner.query_label(strategy, self.client, definition, m)
+                if strategy.uses_justification:
+                    row[f"{m}Justification"] = Strategy_runner.query_justification(
+                        strategy, self.client, definition, m, row[m])
+            row["EventType"] = row[strategy.id_column]
+            self.appender.append(row)
+            # Rows with an "error" label are appended but left unmarked and retried at the next poll.
+            if all(Strategy_runner.is_labelled(row[m]) for m in strategy.meta_properties):
+                self.state.mark([(h, row[strategy.id_column])], source)
+            elif self.state.failed_attempt(h, self.max_attempts):
+                with self._lock:
+                    self._retry.append((h, original, source))
+            with self._lock:
+                self.classified += 1
+                self.latencies.append(time.perf_counter() - detected)
+        finally:
+            with self._lock:
+                self._pending.discard(h)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._pending)
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self.latencies[-1000:])
+        if len(latencies) == 0:
+            return f"{self.classified} rows classified"
+        p50, p95 = np.percentile(latencies, [50, 95])
+        return (f"{self.classified} rows classified; detection to append p50 {p50:.2f}s, p95 {p95:.2f}s "
+                f"(last {len(latencies)})")
+
+    def close(self, cancel=False):
+        """Wait for the queued rows (or, with cancel, only for those already being classified; the others stay
+        pending in the state file)."""
+        self._pool.shutdown(wait=True, cancel_futures=cancel)
+
+
+def watch(watcher, input_file=None, drop_dir=None, poll=2.0, settle=1.0, once=False):
+    reported = 0
+    while True:
+        if input_file:
+            queued = watcher.submit(read_appended(input_file, watcher.state), input_file)
+        else:
+            queued = watcher.submit(read_drop_dir(drop_dir, watcher.state, 0.0 if once else settle), drop_dir)
+        queued += watcher.retry()
+        if queued:
+            print(f"Queued {queued} new or changed definitions")
+        if once:
+            return
+        if watcher.classified != reported and watcher.in_flight() == 0:
+            reported = watcher.classified
+            print(watcher.summary())
+        time.sleep(poll)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify definitions as they are appended to a file or dropped in a folder.")
+    parser.add_argument("--strategy", required=True,
+                        help=f"strategy name or script path ({', '.join(Strategy_registry.strategy_names())})")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="CSV file to tail")
+    source.add_argument("--drop-dir", help="directory of CSV drop files")
+    parser.add_argument("--output", help="output CSV results are appended to (default: the script's output)")
+    parser.add_argument("--state", default=DEFAULT_STATE, help="SQLite file of classified row hashes")
+    parser.add_argument("--poll", type=float, default=2.0, help="seconds between checks for new rows")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds a drop file must be unchanged")
+    parser.add_argument("--concurrency", type=int, default=4, help="definitions classified at once")
+    parser.add_argument("--once", action="store_true", help="classify what is there now and exit")
+    Llm_client.add_client_arguments(parser)
+    Model_router.add_arguments(parser)
+    args = parser.parse_args()
+
+    strategy = Model_router.route_from_args(args, Strategy_registry.load_strategy(args.strategy))
+    input_file = Strategy_registry.resolve_data_path(args.input) if args.input else None
+    watcher = Watcher(strategy, Llm_client.client_from_args(args), WatchState(args.state),
+                      args.output or strategy.output_file, args.concurrency)
+    print(f"{watcher.seed()} labelled rows already in {watcher.output_file}; watching {input_file or args.drop_dir}")
+    resumed = watcher.resume()
+    if resumed:
+        print(f"Queued {resumed} definitions read by an earlier run but not classified")
+    try:
+        watch(watcher, input_file, args.drop_dir, args.poll, args.settle, args.once)
+    except KeyboardInterrupt:
+        print("Stopping; finishing definitions in flight")
+        watcher.close(cancel=True)
+    finally:
+        watcher.close()
+        print(watcher.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""Crash-safe SQLite work queue for prompting runs.
+
+Every (strategy, definition, meta-property) is one task, moving through
+pending -> leased -> done | failed. Workers lease tasks for a limited time, so
+the tasks of a killed worker return to the queue when their lease expires.
+A label is committed in the same transaction that marks its task done, and
+done tasks are never leased again, so no completed call is paid for twice.
+
+    python Work_queue.py enqueue --strategy cot --input 161_FrameNet.csv
+    python Work_queue.py work --workers 4            # any number of processes may run this
+    python Work_queue.py status
+    python Work_queue.py export --strategy cot --input 161_FrameNet.csv --output 161_CoT_prompting.csv
+"""
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import Llm_client
+import Strategy_registry
+import Strategy_runner
+
+
+DEFAULT_DB = "work_queue.sqlite"
+STATES = ("pending", "leased", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    strategy TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    meta_property TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending' CHECK (state IN ('pending', 'leased', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    label TEXT,
+    justification TEXT,
+    last_error TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL,
+    UNIQUE (strategy, event_type, definition, meta_property)
+);
+CREATE INDEX IF NOT EXISTS tasks_by_state ON tasks (state, available_at, position);
+"""
+
+
+class WorkQueue:
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE.
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        return _Transaction(self.conn)
+
+    # --- producers ---
+    def enqueue(self, strategy, df):
+        """Add one task per (definition, property); existing tasks are left untouched."""
+        rows = [
+            (strategy.name, str(row[strategy.id_column]), str(row[strategy.definition_column]), meta_property,
+             position)
+            for position, (_, row) in enumerate(df.iterrows())
+            for meta_property in strategy.meta_properties
+        ]
+        with self._transaction():
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tasks (strategy, event_type, definition, meta_property, position) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+            added = self.conn.total_changes - before
+        return added
+
+    # --- workers ---
+    def lease(self, owner, lease_seconds=120.0, max_attempts=3, strategy=None, limit=1):
+        """Atomically take up to `limit` runnable tasks, reclaiming expired leases first."""
+        now = time.time()
+        with self._transaction():
+            self._reclaim_expired(now, max_attempts)
+            query = "SELECT * FROM tasks WHERE state = 'pending' AND available_at <= ?"
+            params = [now]
+            if strategy:
+                query += " AND strategy = ?"
+                params.append(strategy)
+            query += " ORDER BY strategy, position, id LIMIT ?"
+            params.append(limit)
+            tasks = self.conn.execute(query, params).fetchall()
+            for task in tasks:
+                self.conn.execute(
+                    "UPDATE tasks SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (owner, now + lease_seconds, now, task["id"]))
+        return [dict(task, attempts=task["attempts"] + 1) for task in tasks]
+
+    def extend(self, task_id, owner, lease_seconds=120.0):
+        cur = self.conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+            (time.time() + lease_seconds, task_id, owner))
+        return cur.rowcount == 1
+
+    def complete(self, task_id, label, justification=None, prompt_tokens=0, completion_tokens=0):
+        """Record a paid result. Accepted even if the lease expired, unless another worker finished first."""
+        cur = self.conn.execute(
+            "UPDATE tasks SET state = 'done', label = ?, justification = ?, prompt_tokens = ?, "
+            "completion_tokens = ?, lease_owner = NULL, lease_expires = NULL, last_error = NULL, updated_at = ? "
+            "WHERE id = ? AND state != 'done'",
+            (label, justification, prompt_tokens, completion_tokens, time.time(), task_id))
+        return cur.rowcount == 1
+
+    def fail(self, task_id, owner, error, max_attempts=3, backoff_seconds=5.0):
+        """Return a task to the queue with exponential backoff, or mark it failed after max_attempts."""
+        now = time.time()
+        with self._transaction():
+            task = self.conn.execute(
+                "SELECT attempts FROM tasks WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (task_id, owner)).fetchone()
+            if task is None:
+                return
+            if task["attempts"] >= max_attempts:
+                self.conn.execute(
+                    "UPDATE tasks SET state = 'failed', last_error = ?, lease_owner = NULL, lease_expires = NULL, "
+                    "updated_at = ? WHERE id = ?", (error, now, task_id))
+            else:
+                self.conn.execute(
+                    "UPDATE tasks SET state = 'pending', last_error = ?, lease_owner = NULL, lease_expires = NULL, "
+                    "available_at = ?, updated_at = ? WHERE id = ?",
+                    (error, now + backoff_seconds * 2 ** (task["attempts"] - 1), now, task_id))
+
+    def _reclaim_expired(self, now, max_attempts):
+        self.conn.execute(
+            "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "last_error = 'lease expired', lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE state = 'leased' AND lease_expires < ?", (max_attempts, now, now))
+
+    # --- maintenance ---
+    def requeue_failed(self, strategy=None):
+        query = "UPDATE tasks SET state = 'pending', attempts = 0, available_at = 0 WHERE state = 'failed'"
+        params = []
+        if strategy:
+            query += " AND strategy = ?"
+            params.append(strategy)
+        return self.conn.execute(query, params).rowcount
+
+    def status(self):
+        rows = self.conn.execute(
+            "SELECT strategy, state, COUNT(*) AS n, SUM(prompt_tokens) AS pt, SUM(completion_tokens) AS ct "
+            "FROM tasks GROUP BY strategy, state ORDER BY strategy, state").fetchall()
+        return [dict(row) for row in rows]
+
+    def results(self, strategy):
+        rows = self.conn.execute(
+            "SELECT event_type, definition, meta_property, state, label, justification FROM tasks "
+            "WHERE strategy = ?", (strategy,)).fetchall()
+        return [dict(row) for row in rows]
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# === Worker loop ===
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def run_worker(db_path, client, strategy=None, lease_seconds=120.0, max_attempts=3, sleep=1.0, idle_exit=True):
+    queue = WorkQueue(db_path)
+    owner = worker_id()
+    processed = 0
+    try:
+        while True:
+            tasks = queue.lease(owner, lease_seconds, max_attempts, strategy=strategy)
+            if not tasks:
+                if idle_exit and not queue.conn.execute(
+                        "SELECT 1 FROM tasks WHERE state IN ('pending', 'leased') LIMIT 1").fetchone():
+                    break
+                time.sleep(1.0)
+                continue
+            task = tasks[0]
+            s = Strategy_registry.load_strategy(task["strategy"])
+            try:
+                request = s.render_label_request(task["definition"], task["meta_property"])
+                response = client.complete(request)
+                label = s.parse_label(response["content"])
+                prompt_tokens, completion_tokens = response["prompt_tokens"], response["completion_tokens"]
+                justification = None
+                if s.uses_justification:
+                    queue.extend(task["id"], owner, lease_seconds)
+                    request = s.render_justification_request(task["definition"], task["meta_property"], label)
+                    response = client.complete(request)
+                    justification = s.parse_justification(response["content"])
+                    prompt_tokens += response["prompt_tokens"]
+                    completion_tokens += response["completion_tokens"]
+            except Exception as e:
+                print(f"[Label:{task['meta_property']}] Error for task {task['id']} "
+                      f"(attempt {task['attempts']}): {e}")
+                queue.fail(task["id"], owner, str(e), max_attempts)
+            else:
+                queue.complete(task["id"], label, justification, prompt_tokens, completion_tokens)
+                processed += 1
+            if sleep:
+                time.sleep(sleep)
+    finally:
+        queue.close()
+    return processed
+
+
+# === Export ===
+def export_results(db_path, strategy, input_file, output_file):
+    """Write done labels in the strategy script's output layout; failed cells become 'error'."""
+    queue = WorkQueue(db_path)
+    results = queue.results(strategy.name)
+    queue.close()
+    cells = {(Strategy_runner.definition_key(r["event_type"], r["definition"]), r["meta_property"]): r
+             for r in results}
+
+    df = strategy.load_definitions(input_file)
+    for i, row in df.iterrows():
+        key = Strategy_runner.definition_key(row[strategy.id_column], row[strategy.definition_column])
+        for meta_property in strategy.meta_properties:
+            cell = cells.get((key, meta_property))
+            if cell is None or cell["state"] not in ("done", "failed"):
+                continue
+            df.at[i, "EventType"] = row[strategy.id_column]
+            df.at[i, meta_property] = cell["label"] if cell["state"] == "done" else "error"
+            if cell["justification"] is not None:
+                df.at[i, f"{meta_property}Justification"] = cell["justification"]
+    df.to_csv(output_file, index=False)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable SQLite work queue for prompting runs.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="queue database file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("enqueue")
+    p.add_argument("--strategy", required=True, action="append")
+    p.add_argument("--input", help="dataset CSV (defaults to the file the strategy script reads)")
+
+    p = sub.add_parser("work")
+    p.add_argument("--strategy", help="only lease tasks of this strategy")
+    p.add_argument("--workers", type=int, default=1, help="worker threads in this process")
+    p.add_argument("--lease-seconds", type=float, default=120.0)
+    p.add_argument("--max-attempts", type=int, default=3)
+    p.add_argument("--sleep", type=float, default=1.0, help="seconds each worker waits between tasks")
+    p.add_argument("--wait", action="store_true", help="keep polling when the queue is empty")
+    Llm_client.add_client_arguments(p)
+
+    sub.add_parser("status")
+
+    p = sub.add_parser("requeue-failed")
+    p.add_argument("--strategy")
+
+    p = sub.add_parser("export")
+    p.add_argument("--strategy", required=True)
+    p.add_argument("--input", help="dataset CSV (defaults to the file the strategy script reads)")
+    p.add_argument("--output", help="output CSV (defaults to the file the strategy script writes)")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        queue = WorkQueue(args.db)
+        for name in args.strategy:
+            strategy = Strategy_registry.load_strategy(name)
+            added = queue.enqueue(strategy, strategy.load_definitions(args.input))
+            print(f"[{strategy.name}] {added} tasks added")
+        queue.close()
+    elif args.command == "work":
+        client = Llm_client.client_from_args(args)
+        strategy = Strategy_registry.load_strategy(args.strategy).name if args.strategy else None
+        threads = [threading.Thread(target=run_worker, args=(args.db, client, strategy, args.lease_seconds,
+                                                             args.max_attempts, args.sleep, not args.wait))
+                   for _ in range(args.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    elif args.command == "requeue-failed":
+        queue = WorkQueue(args.db)
+        print(f"{queue.requeue_failed(args.strategy)} failed tasks returned to pending")
+        queue.close()
+    elif args.command == "export":
+        strategy = Strategy_registry.load_strategy(args.strategy)
+        output = args.output or strategy.output_file
+        export_results(args.db, strategy, args.input, output)
+        print(f"Results saved to {output}")
+
+    if args.command in ("status", "enqueue", "work", "requeue-failed"):
+        queue = WorkQueue(args.db)
+        for row in queue.status():
+            print(f"  {row['strategy']:14s} {row['state']:8s} {row['n']:6d}  "
+                  f"tokens in={row['pt'] or 0} out={row['ct'] or 0}")
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
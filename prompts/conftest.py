@@ -0,0 +1,13 @@
+import pandas as pd
+import pytest
+
+import Strategy_registry
+
+
+@pytest.fixture
+def small_dataset(tmp_path):
+    """The first definitions of the gold set, in the scripts' input layout (ISO-8859-1)."""
+    gold = pd.read_csv(Strategy_registry.resolve_data_path("Human_annotated_dataset.csv"), encoding="ISO-8859-1")
+    path = tmp_path / "dataset.csv"
+    gold[["EventType", "Generic_Definition"]].head(12).to_csv(path, index=False, encoding="ISO-8859-1")
+    return str(path)
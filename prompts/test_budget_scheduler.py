@@ -0,0 +1,85 @@
+import random
+import time
+
+import pandas as pd
+
+import Budget_scheduler
+import Llm_client
+import Strategy_registry
+
+
+class FailingClient:
+    """Every call fails, as an API outage would."""
+
+    def complete(self, request, labels=None, hedge_key=None):
+        raise RuntimeError("service unavailable")
+
+
+def write_dataset(path, strategy):
+    labelled = {m: strategy.allowed_labels(m)[0] for m in strategy.meta_properties}
+    rows = [
+        dict({"EventType": "Arrest", "Generic_Definition": "An event where an Authority takes a Suspect into custody."},
+             **labelled, **{f"{m}Confidence": 0.1 for m in strategy.meta_properties}),
+        dict({"EventType": "Arriving", "Generic_Definition": "An event where a Theme reaches a Goal."},
+             **{m: "" for m in strategy.meta_properties}),
+    ]
+    pd.DataFrame(rows).to_csv(path, index=False, encoding="ISO-8859-1")
+    return labelled
+
+
+def test_failed_requery_keeps_existing_labels(tmp_path):
+    strategy = Strategy_registry.load_strategy("direct")
+    dataset = tmp_path / "dataset.csv"
+    output = tmp_path / "output.csv"
+    labelled = write_dataset(dataset, strategy)
+    df = strategy.load_definitions(str(dataset))
+
+    cells = Budget_scheduler.run_scheduled(strategy, df, FailingClient(), str(output), max_concurrency=2,
+                                           report_file=str(tmp_path / "report.csv"))
+
+    assert set(cells["reason"]) == {"unlabelled", "doubt"}
+    assert (cells["status"] == "error").all()
+    saved = Strategy_registry.read_output(str(output)).set_index("EventType")
+    for m, label in labelled.items():
+        # The doubted cell had a label: the failed re-query must not replace it.
+        assert saved.at["Arrest", m] == label
+        # The empty cell records the failure, so a later run retries it.
+        assert saved.at["Arriving", m] == "error"
+
+
+def test_spend_includes_hedged_duplicates():
+    random.seed(0)
+    # Hedge past the median, so the simulated 20% of slow calls are duplicated up to the cap.
+    hedger = Llm_client.Hedger(quantile=0.5, max_rate=0.2, min_samples=5)
+    client = Llm_client.LlmClient("mock", mock_latency=0.002, mock_slow_rate=0.2, mock_slow_factor=20, hedger=hedger)
+    metered = Budget_scheduler.MeteredClient(client)
+    strategy = Strategy_registry.load_strategy("direct")
+    request = strategy.render_label_request("An event where a Theme reaches a Goal.", strategy.meta_properties[0])
+    for k in range(60):
+        # Distinct requests, so none is coalesced with another.
+        metered.complete(dict(request, user=str(k)), hedge_key="kind")
+    time.sleep(0.5)  # losing duplicates finish in the background
+
+    assert 0 < hedger.hedges <= 0.2 * hedger.calls
+    assert metered.hedge_cost == hedger.extra_cost > 0
+    assert metered.spent == metered.reply_cost + hedger.extra_cost
+    assert metered.reserve_factor() == 1.2
+
+
+def test_disagreement_is_matched_per_definition(tmp_path, capsys):
+    strategy = Strategy_registry.load_strategy("direct")
+    m = strategy.meta_properties[0]
+    df = pd.DataFrame({"EventType": ["Expressing publicly", "Expressing publicly"],
+                       "Generic_Definition": ["A Communicator speaks up.", "A Communicator writes publicly."]})
+    cells = pd.DataFrame({"position": [0, 1], "EventType": df["EventType"], "Generic_Definition": df["Generic_Definition"],
+                          "property": [m, m], "disagreement": [0.9, 0.1]})
+    cells_file = tmp_path / "cells.csv"
+    cells.to_csv(cells_file, index=False)
+
+    doubt = Budget_scheduler.doubt_table(strategy, df, str(cells_file))
+    assert list(doubt[:, 0]) == [0.9, 0.1]
+
+    # A cells file from before definitions were written can only match on EventType, and says so.
+    cells.drop(columns="Generic_Definition").to_csv(cells_file, index=False)
+    Budget_scheduler.doubt_table(strategy, df, str(cells_file))
+    assert "share one disagreement index" in capsys.readouterr().out
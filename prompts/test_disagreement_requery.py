@@ -0,0 +1,18 @@
+import Disagreement_requery
+import Ensemble
+
+
+def aligned_split_vote():
+    """Three outputs voting a, a, b on one cell."""
+    vocabulary = ["a", "b"]
+    votes = {"prop": Ensemble.encode(["a", "a", "b"], vocabulary).reshape(3, 1)}
+    return Ensemble.AlignedLabels(["x", "y", "z"], ["Event"], ["A definition."], votes, {}, {"prop": vocabulary})
+
+
+def test_answer_weight_zero_leaves_the_majority():
+    aligned = aligned_split_vote()
+    answers = {(0, "prop"): ["b"]}
+
+    assert Disagreement_requery.apply_answers(aligned, answers)["prop"][0] == "b"
+    assert Disagreement_requery.apply_answers(aligned, answers, weight=0)["prop"][0] == "a"
+    assert Disagreement_requery.apply_answers(aligned, answers, weight=0.5)["prop"][0] == "a"
@@ -0,0 +1,83 @@
+import pytest
+
+import Key_pool
+
+
+class ApiError(Exception):
+    def __init__(self, http_status, code=None):
+        super().__init__(f"HTTP {http_status}")
+        self.http_status = http_status
+        self.code = code
+
+
+def pool(*names, **kwargs):
+    return Key_pool.KeyPool([Key_pool.PoolKey(name, rpm=600) for name in names], **kwargs)
+
+
+def test_rate_limited_call_moves_to_another_key():
+    keys = pool("a", "b", cooldown=60.0)
+    sent = []
+
+    def send(key):
+        sent.append(key.name)
+        if key.name == sent[0] and len(sent) == 1:
+            raise ApiError(429)
+        return {"content": key.name}
+
+    result = keys.call(send)
+    assert len(sent) == 2 and sent[0] != sent[1]
+    assert result["content"] == sent[1]
+    assert sum(key.rate_limited for key in keys.keys) == 1
+
+
+def test_failed_key_is_benched_and_others_keep_serving():
+    keys = pool("bad", "good")
+
+    def send(key):
+        if key.name == "bad":
+            raise ApiError(401)
+        return {"content": key.name}
+
+    assert [keys.call(send)["content"] for _ in range(3)] == ["good"] * 3
+    bad = keys.keys[0]
+    assert bad.auth_failed and bad.auth_errors <= 1
+
+
+def test_every_key_failing_authentication_raises():
+    keys = pool("a", "b")
+
+    def send(key):
+        raise ApiError(403)
+
+    with pytest.raises(ApiError):
+        keys.call(send)
+    with pytest.raises(RuntimeError):
+        keys.call(send)
+
+
+def test_repeated_rate_limits_raise_the_last_error():
+    keys = pool("a", "b", cooldown=0.001, max_cooldown=0.001, max_retries=3)
+    errors = []
+
+    def send(key):
+        errors.append(ApiError(429))
+        raise errors[-1]
+
+    with pytest.raises(ApiError) as raised:
+        keys.call(send)
+    assert len(errors) == 4
+    assert raised.value is errors[-1]
+
+
+def test_exhausted_quota_is_not_retried_as_a_rate_limit():
+    keys = pool("a", cooldown=0.001, max_cooldown=0.001)
+    calls = []
+
+    def send(key):
+        calls.append(key.name)
+        raise ApiError(429, code="insufficient_quota")
+
+    with pytest.raises(ApiError):
+        keys.call(send)
+    assert calls == ["a"]
+    assert keys.keys[0].auth_failed
@@ -0,0 +1,56 @@
+import argparse
+
+import Llm_client
+
+
+CUMULATIVITY = ["cumulative", "anti-cumulative"]
+
+
+def stream(text, labels=CUMULATIVITY):
+    """(label, characters read) as _send_stream would get it, feeding one character at a time."""
+    matcher = Llm_client.LabelMatcher(labels)
+    for k, character in enumerate(text):
+        label = matcher.feed(character)
+        if label is not None:
+            return label, k + 1
+    return matcher.finish(), len(text)
+
+
+def test_stream_stops_at_first_complete_label():
+    label, read = stream("cumulative. The event adds up over time.")
+    assert label == "cumulative"
+    assert read == len("cumulative.")
+
+
+def test_longest_form_wins():
+    assert stream("anti-cumulative")[0] == "anti-cumulative"
+
+
+def test_negated_label_gives_the_opposite():
+    assert stream("This is not cumulative. Answer: anti-cumulative")[0] == "anti-cumulative"
+
+
+def test_abstention_is_not_cut_short():
+    assert stream("Neither cumulative nor anti-cumulative applies.")[0] is None
+    assert stream("It cannot be determined whether this is cumulative.")[0] is None
+
+
+def test_hedger_keeps_duplicates_under_the_cap():
+    hedger = Llm_client.Hedger(max_rate=0.1, min_samples=1)
+    hedger.record_latency("kind", 0.01)
+    allowed = 0
+    for _ in range(200):
+        hedger.delay("kind")
+        allowed += hedger.allow()
+    assert allowed == hedger.hedges == 20
+
+
+def test_tpm_alone_builds_a_token_limiter():
+    parser = argparse.ArgumentParser()
+    Llm_client.add_client_arguments(parser)
+    client = Llm_client.client_from_args(parser.parse_args(["--backend", "mock", "--tpm", "600"]))
+    limiter = client.rate_limiter
+    assert limiter is not None and limiter.rpm is None
+    # Requests are unlimited; tokens run out after the first bucketful.
+    assert limiter.try_acquire(500)
+    assert not limiter.try_acquire(500)
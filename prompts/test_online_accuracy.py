@@ -0,0 +1,26 @@
+import pandas as pd
+
+import Online_accuracy
+import Strategy_registry
+
+
+def test_rows_without_gold_are_not_scored(tmp_path):
+    strategy = Strategy_registry.load_strategy("direct")
+    m = strategy.meta_properties[0]
+    label = strategy.allowed_labels(m)[0]
+    df = pd.DataFrame({"EventType": ["A", "B", "C"], "Generic_Definition": ["a", "b", "c"]})
+    gold_file = tmp_path / "gold.csv"
+    # Only row A is annotated; B has an empty cell and C is missing from the gold file.
+    pd.DataFrame({"EventType": ["A", "B"], "Generic_Definition": ["a", "b"], m: [label, ""]}).to_csv(
+        gold_file, index=False, encoding="ISO-8859-1")
+
+    gold = Online_accuracy.load_gold(strategy, df, str(gold_file))
+    test = Online_accuracy.SequentialTest(reference_accuracy=0.9)
+    tracker = Online_accuracy.OnlineAccuracy([m], gold, test=test, early_stop=True)
+    for i, row in df.iterrows():
+        tracker(i, row, m, label)
+
+    assert tracker.n[m] == 1
+    assert tracker.correct[m] == 1
+    assert test.observations == 1
+    assert not tracker.stopped
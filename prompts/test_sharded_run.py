@@ -0,0 +1,34 @@
+import sys
+import time
+from types import SimpleNamespace
+
+import Llm_client
+import Sharded_run
+import Strategy_registry
+import Strategy_runner
+
+
+def test_merged_shards_equal_a_single_run(small_dataset, tmp_path):
+    strategy = Strategy_registry.load_strategy("direct")
+    single = str(tmp_path / "single.csv")
+    Strategy_runner.run_strategy(strategy, strategy.load_definitions(small_dataset), Llm_client.LlmClient("mock"),
+                                 single, sleep=0)
+
+    sharded = str(tmp_path / "sharded.csv")
+    for shard in range(3):
+        Sharded_run.run_worker(strategy, small_dataset, sharded, shard, 3, Llm_client.LlmClient("mock"), sleep=0)
+    Sharded_run.merge_shards(strategy, small_dataset, sharded, 3)
+
+    with open(single, "rb") as a, open(sharded, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_local_launcher_refills_the_first_free_slot(monkeypatch):
+    # Shard 0 is slow; the other four must run in the second slot meanwhile.
+    durations = [1.0, 0.25, 0.25, 0.25, 0.25]
+    monkeypatch.setattr(Sharded_run, "worker_command",
+                        lambda args, shard: [sys.executable, "-c", f"import time; time.sleep({durations[shard]})"])
+    start = time.perf_counter()
+    Sharded_run.run_local(SimpleNamespace(num_shards=len(durations), workers=2))
+    # Waiting on the oldest process first would take about 1.5 s.
+    assert time.perf_counter() - start < 1.35
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+import Llm_client
+import Strategy_registry
+import Strategy_runner
+
+
+class KilledClient:
+    """The mock backend, killed (as by Ctrl-C) once it has answered `calls` requests."""
+
+    def __init__(self, calls=None):
+        self.client = Llm_client.LlmClient("mock")
+        self.calls = calls
+        self.answered = 0
+
+    def complete(self, request, labels=None, hedge_key=None):
+        if self.calls is not None and self.answered == self.calls:
+            raise KeyboardInterrupt
+        self.answered += 1
+        return self.client.complete(request, labels=labels, hedge_key=hedge_key)
+
+
+def test_killed_run_resumes_to_the_same_output(small_dataset, tmp_path):
+    strategy = Strategy_registry.load_strategy("direct")
+    properties = len(strategy.meta_properties)
+    complete = str(tmp_path / "complete.csv")
+    Strategy_runner.run_strategy(strategy, strategy.load_definitions(small_dataset), KilledClient(), complete, sleep=0)
+
+    output = str(tmp_path / "output.csv")
+    # Killed halfway through the sixth row: five rows are checkpointed, the output is not written yet.
+    with pytest.raises(KeyboardInterrupt):
+        Strategy_runner.run_strategy(strategy, strategy.load_definitions(small_dataset),
+                                     KilledClient(calls=5 * properties + 1), output, sleep=0)
+    assert not os.path.exists(output)
+    assert len(Strategy_registry.read_output(Strategy_runner.checkpoint_path(output))) == 5
+
+    resumed = KilledClient()
+    Strategy_runner.run_strategy(strategy, strategy.load_definitions(small_dataset), resumed, output,
+                                 sleep=0, resume=True)
+
+    assert resumed.answered == 7 * properties
+    assert not os.path.exists(Strategy_runner.checkpoint_path(output))
+    with open(complete, "rb") as a, open(output, "rb") as b:
+        assert a.read() == b.read()
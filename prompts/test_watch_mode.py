@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pandas as pd
+
+import Llm_client
+import Strategy_registry
+import Watch_mode
+
+
+HEADER = b"EventType,Generic_Definition\n"
+
+
+def test_only_appended_rows_are_read(tmp_path):
+    state = Watch_mode.WatchState(str(tmp_path / "state.sqlite"))
+    path = tmp_path / "input.csv"
+    path.write_bytes(HEADER + b"A,first\nB,second\n")
+    assert list(Watch_mode.read_appended(str(path), state)["EventType"]) == ["A", "B"]
+    assert Watch_mode.read_appended(str(path), state).empty
+
+    # A half-written record waits for the poll that completes it.
+    with open(path, "ab") as f:
+        f.write(b'C,third\nD,"fourth, still')
+    assert list(Watch_mode.read_appended(str(path), state)["EventType"]) == ["C"]
+    with open(path, "ab") as f:
+        f.write(b' being written"\n')
+    assert list(Watch_mode.read_appended(str(path), state)["Generic_Definition"]) == ["fourth, still being written"]
+
+    # Editing a row already read means the file is read again from the top.
+    path.write_bytes(path.read_bytes().replace(b"A,first", b"A,FIRST"))
+    assert list(Watch_mode.read_appended(str(path), state)["EventType"]) == ["A", "B", "C", "D"]
+
+
+class GatedClient:
+    """The mock backend, holding every call until the gate opens."""
+
+    def __init__(self):
+        self.client = Llm_client.LlmClient("mock")
+        self.gate = threading.Event()
+
+    def complete(self, request, labels=None, hedge_key=None):
+        self.gate.wait()
+        return self.client.complete(request, labels=labels, hedge_key=hedge_key)
+
+
+def test_rows_not_classified_survive_a_restart(small_dataset, tmp_path):
+    strategy = Strategy_registry.load_strategy("direct")
+    rows = pd.read_csv(small_dataset, encoding="ISO-8859-1", dtype=str).head(3)
+    state_file = str(tmp_path / "state.sqlite")
+    output = str(tmp_path / "output.csv")
+
+    client = GatedClient()
+    watcher = Watch_mode.Watcher(strategy, client, Watch_mode.WatchState(state_file), output, concurrency=1)
+    assert watcher.submit(rows, "input.csv") == 3
+    # Stop while the first row is being classified: the two queued rows are cancelled.
+    stopping = threading.Thread(target=watcher.close, kwargs={"cancel": True})
+    stopping.start()
+    time.sleep(0.2)
+    client.gate.set()
+    stopping.join()
+    assert watcher.classified == 1
+
+    restarted = Watch_mode.Watcher(strategy, Llm_client.LlmClient("mock"), Watch_mode.WatchState(state_file), output)
+    assert restarted.resume() == 2
+    restarted.close()
+
+    assert restarted.state.pending() == []
+    saved = Strategy_registry.read_output(output)
+    assert sorted(saved["EventType"]) == sorted(rows["EventType"])